@@ -0,0 +1,149 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Benchmarks collation on the host followed by a copy of the batch to the device,
+against moving the unpadded feature context to the device and collating there.
+Runs on a synthetic homodimer per model size, or on the complex in `--fasta`.
+
+    python benchmarks/collate.py [--device cuda:0] [--fasta input.fasta]
+"""
+
+from pathlib import Path
+from typing import Any
+
+import torch
+import typer
+from torch import Tensor
+
+from chai_lab.chai1 import _load_chains_from_fasta, _make_feature_context
+from chai_lab.chai1 import feature_factory as default_feature_factory
+from chai_lab.data.collate.collate import Collate
+from chai_lab.data.collate.utils import AVAILABLE_MODEL_SIZES
+from chai_lab.data.dataset.all_atom_feature_context import AllAtomFeatureContext
+from chai_lab.utils.profiling import InferenceReport
+from chai_lab.utils.tensor_utils import move_data_to_device, set_seed
+
+
+def _tensor_bytes(x: Any) -> int:
+    """Bytes of the distinct storages a (nested) structure holds."""
+    storages: dict[int, int] = {}
+
+    def visit(y: Any):
+        if isinstance(y, Tensor):
+            storage = y.untyped_storage()
+            storages[storage.data_ptr()] = storage.nbytes()
+        elif isinstance(y, dict):
+            for v in y.values():
+                visit(v)
+        elif isinstance(y, (list, tuple)):
+            for v in y:
+                visit(v)
+        elif hasattr(y, "__dataclass_fields__"):
+            for name in y.__dataclass_fields__:
+                visit(getattr(y, name))
+
+    visit(x)
+    return sum(storages.values())
+
+
+def _synthetic_fasta(n_tokens: int, path: Path) -> Path:
+    # two copies of a chain filling 90% of the model size
+    sequence = ("MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ" * n_tokens)[: int(n_tokens * 0.45)]
+    path.write_text(
+        f">protein|name=A\n{sequence}\n>protein|name=B\n{sequence}\n", encoding="utf-8"
+    )
+    return path
+
+
+def main(
+    device: str = "cuda:0" if torch.cuda.is_available() else "cpu",
+    fasta: Path | None = None,
+    max_tokens: int = 1024,
+    repeats: int = 3,
+    tmp_dir: Path = Path("/tmp"),
+):
+    torch_device = torch.device(device)
+    collators = dict(
+        host=Collate(
+            feature_factory=default_feature_factory,
+            num_key_atoms=128,
+            num_query_atoms=32,
+        ),
+        device=Collate(
+            feature_factory=default_feature_factory,
+            num_key_atoms=128,
+            num_query_atoms=32,
+            device=torch_device,
+        ),
+    )
+
+    def collate(name: str, context: AllAtomFeatureContext) -> dict[str, Any]:
+        set_seed([0])
+        batch = collators[name]([context])
+        # a no-op for batches collated on the device
+        return move_data_to_device(batch, device=torch_device)
+
+    fastas = (
+        [fasta]
+        if fasta is not None
+        else [
+            _synthetic_fasta(n_tokens, tmp_dir / f"collate_benchmark_{n_tokens}.fasta")
+            for n_tokens in AVAILABLE_MODEL_SIZES
+            if n_tokens <= max_tokens
+        ]
+    )
+
+    print(
+        f"{'tokens':>6} {'host':>10} {'device':>10} {'speedup':>8} "
+        f"{'copied host':>12} {'copied device':>14} {'identical':>9}"
+    )
+    for path in fastas:
+        chains = _load_chains_from_fasta(path)
+        context = _make_feature_context(
+            chains, use_esm_embeddings=False, device=torch_device
+        )
+
+        batches = {name: collate(name, context) for name in collators}
+        identical = all(
+            torch.equal(
+                batches["host"]["features"][k].cpu(),
+                batches["device"]["features"][k].cpu(),
+            )
+            for k in batches["host"]["features"]
+        )
+        copied = dict(
+            host=_tensor_bytes(batches["host"]),
+            # the unpadded contexts, without the per-chain metadata
+            device=_tensor_bytes(
+                [
+                    context.structure_context,
+                    context.msa_context,
+                    context.main_msa_context,
+                    context.template_context,
+                    context.embedding_context,
+                ]
+            ),
+        )
+        del batches
+
+        seconds = {}
+        for name in collators:
+            report = InferenceReport(torch_device)
+            for _ in range(repeats):
+                with report.stage(name):
+                    collate(name, context)
+            seconds[name] = report.stages[name].seconds / repeats
+
+        print(
+            f"{context.structure_context.num_tokens:>6} "
+            f"{seconds['host'] * 1e3:>8.0f}ms {seconds['device'] * 1e3:>8.0f}ms "
+            f"{seconds['host'] / seconds['device']:>7.1f}x "
+            f"{copied['host'] / 2**20:>8.0f} MiB {copied['device'] / 2**20:>10.0f} MiB "
+            f"{'yes' if identical else 'no':>9}"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,93 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Benchmarks the fused relative position encodings against the separate generators
+at each model size, on a synthetic complex of a few chains.
+
+    python benchmarks/relative_position.py [--device cuda:0] [--repeats 5]
+"""
+
+import torch
+import typer
+
+from chai_lab.data.collate.utils import AVAILABLE_MODEL_SIZES
+from chai_lab.data.features.generators.base import FeatureGenerator
+from chai_lab.data.features.generators.relative_chain import RelativeChain
+from chai_lab.data.features.generators.relative_entity import RelativeEntity
+from chai_lab.data.features.generators.relative_position import (
+    FusedRelativePositions,
+)
+from chai_lab.data.features.generators.relative_sep import RelativeSequenceSeparation
+from chai_lab.data.features.generators.relative_token import RelativeTokenSeparation
+from chai_lab.data.features.memo import FeatureMemo
+from chai_lab.utils.profiling import InferenceReport
+
+
+def _batch(n_tokens: int, device: torch.device, n_chains: int = 4) -> dict:
+    # equal chains, half of them copies, one token per residue; padded by 10%
+    n = int(n_tokens * 0.9)
+    asym_id = torch.arange(n) * n_chains // n + 1
+    inputs = dict(
+        token_residue_index=torch.arange(n) - (asym_id - 1) * n // n_chains,
+        token_index=torch.arange(n),
+        token_asym_id=asym_id,
+        token_entity_id=(asym_id + 1) // 2,
+        token_sym_id=(asym_id + 1) % 2 + 1,
+    )
+    padded = {
+        k: torch.zeros(1, n_tokens, dtype=torch.int32, device=device) for k in inputs
+    }
+    for k, v in inputs.items():
+        padded[k][0, :n] = v
+    return dict(inputs=padded)
+
+
+def main(device: str = "cpu", repeats: int = 5):
+    torch_device = torch.device(device)
+    sequence_separation = RelativeSequenceSeparation(sep_bins=None)
+    token_separation = RelativeTokenSeparation(r_max=32)
+    chain, entity = RelativeChain(), RelativeEntity()
+    fused = FusedRelativePositions(sequence_separation, token_separation, chain, entity)
+    separate: dict[str, FeatureGenerator] = dict(
+        sequence_separation=sequence_separation,
+        token_separation=token_separation,
+        chain=chain,
+        entity=entity,
+    )
+    fused_gens = [getattr(fused, key) for key in separate]
+
+    def run(gens, batch):
+        with FeatureMemo().activate():
+            return [gen.generate(batch) for gen in gens]
+
+    print(f"{'tokens':>6} {'separate':>12} {'fused':>12} {'speedup':>8}")
+    for n_tokens in AVAILABLE_MODEL_SIZES:
+        batch = _batch(n_tokens, torch_device)
+        for expected, actual in zip(
+            run(separate.values(), batch), run(fused_gens, batch)
+        ):
+            assert torch.equal(expected, actual)
+
+        seconds = {}
+        peaks = {}
+        for name, gens in [("separate", separate.values()), ("fused", fused_gens)]:
+            report = InferenceReport(torch_device)
+            for _ in range(repeats):
+                with report.stage(name):
+                    run(gens, batch)
+            seconds[name] = report.stages[name].seconds / repeats
+            peaks[name] = report.stages[name].peak_memory_bytes or 0
+
+        print(
+            f"{n_tokens:>6} {seconds['separate'] * 1e3:>10.1f}ms "
+            f"{seconds['fused'] * 1e3:>10.1f}ms "
+            f"{seconds['separate'] / seconds['fused']:>7.1f}x"
+            f"  (peak {report.memory_kind}: {peaks['separate'] / 2**20:.0f} MiB "
+            f"-> {peaks['fused'] / 2**20:.0f} MiB)"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,96 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Benchmarks assembling the token spans of a chain from per-residue spans, against
+gathering them from the residue templates in one pass, on synthetic protein and
+DNA chains; also reports the time to tokenize the whole chain.
+
+    python benchmarks/tokenization.py [--repeats 5]
+"""
+
+import time
+from dataclasses import fields
+from typing import Callable
+
+import torch
+import typer
+
+from chai_lab.data.dataset.inference_dataset import (
+    Input,
+    raw_inputs_to_entitites_data,
+)
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+    TokenSpan,
+)
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+
+_PROTEIN = "MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQAPILSRVGDGTQDNLSGAEKAVQVKVKALPDAQFEVV"
+
+
+def _seconds(fn: Callable[[], object], repeats: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def _assert_equal(expected: TokenSpan, actual: TokenSpan):
+    for field in fields(expected):
+        x, y = getattr(expected, field.name), getattr(actual, field.name)
+        if isinstance(x, torch.Tensor):
+            assert x.dtype == y.dtype and torch.equal(x, y), field.name
+        else:
+            assert x == y, field.name
+
+
+def main(repeats: int = 5):
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    chains = [
+        (EntityType.PROTEIN, (_PROTEIN * 100)[:n_residues])
+        for n_residues in [100, 500, 1000, 2000]
+    ] + [(EntityType.DNA, ("ACGT" * 100)[:200])]
+
+    print(
+        f"{'chain':>14} {'per residue':>12} {'vectorized':>12} {'speedup':>8} "
+        f"{'whole chain':>12}"
+    )
+    for entity_type, sequence in chains:
+        [entity] = raw_inputs_to_entitites_data(
+            [Input(sequence, entity_type=entity_type.value, entity_name="A")],
+            identifier="benchmark",
+        )
+
+        def per_residue() -> TokenSpan:
+            spans = [
+                tokenizer.tokenize_residue(residue, entity_type)
+                for residue in entity.residues
+            ]
+            return TokenSpan.concatenate([s for s in spans if s is not None])
+
+        def vectorized() -> TokenSpan:
+            tokens = tokenizer._tokenize_standard_residues(entity.residues, entity_type)
+            assert tokens is not None
+            return tokens
+
+        _assert_equal(per_residue(), vectorized())
+        seconds = dict(
+            per_residue=_seconds(per_residue, repeats),
+            vectorized=_seconds(vectorized, repeats),
+            whole_chain=_seconds(lambda: tokenizer._tokenize_entity(entity), repeats),
+        )
+        print(
+            f"{entity_type.name.lower():>8} {len(sequence):>5} "
+            f"{seconds['per_residue'] * 1e3:>10.1f}ms "
+            f"{seconds['vectorized'] * 1e3:>10.1f}ms "
+            f"{seconds['per_residue'] / seconds['vectorized']:>7.1f}x "
+            f"{seconds['whole_chain'] * 1e3:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -3,10 +3,18 @@
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
 
+import functools
+import itertools
+import logging
 import math
-from collections import Counter
+import threading
+import weakref
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import Executor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Iterator
 
 import numpy as np
 import torch
@@ -16,7 +24,12 @@ from torch import Tensor
 from tqdm import tqdm
 
 from chai_lab.data.collate.collate import Collate
-from chai_lab.data.collate.utils import AVAILABLE_MODEL_SIZES
+from chai_lab.data.collate.utils import (
+    AVAILABLE_MODEL_SIZES,
+    get_pad_sizes,
+    model_pad_sizes,
+    pad_size,
+)
 from chai_lab.data.dataset.all_atom_feature_context import (
     MAX_MSA_DEPTH,
     MAX_NUM_TEMPLATES,
@@ -25,11 +38,20 @@ from chai_lab.data.dataset.all_atom_feature_context import (
 from chai_lab.data.dataset.constraints.constraint_context import ConstraintContext
 from chai_lab.data.dataset.embeddings.embedding_context import EmbeddingContext
 from chai_lab.data.dataset.embeddings.esm import get_esm_embedding_context
-from chai_lab.data.dataset.inference_dataset import load_chains_from_raw, read_inputs
+from chai_lab.data.dataset.inference_dataset import (
+    load_chains_from_raw,
+    make_tokenizer_pool,
+    read_inputs,
+)
 from chai_lab.data.dataset.msas.msa_context import MSAContext
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+)
 from chai_lab.data.dataset.structure.all_atom_structure_context import (
     AllAtomStructureContext,
 )
+from chai_lab.data.dataset.structure.chain import Chain
+from chai_lab.data.dataset.structure.entity_cache import EntityCache
 from chai_lab.data.dataset.templates.context import TemplateContext
 from chai_lab.data.features.feature_factory import FeatureFactory
 from chai_lab.data.features.feature_type import FeatureType
@@ -57,6 +79,9 @@ from chai_lab.data.features.generators.msa import (
 from chai_lab.data.features.generators.ref_pos import RefPos
 from chai_lab.data.features.generators.relative_chain import RelativeChain
 from chai_lab.data.features.generators.relative_entity import RelativeEntity
+from chai_lab.data.features.generators.relative_position import (
+    FusedRelativePositions,
+)
 from chai_lab.data.features.generators.relative_sep import RelativeSequenceSeparation
 from chai_lab.data.features.generators.relative_token import RelativeTokenSeparation
 from chai_lab.data.features.generators.residue_type import ResidueType
@@ -78,15 +103,20 @@ from chai_lab.data.features.generators.token_pair_pocket_restraint import (
     TokenPairPocketRestraint,
 )
 from chai_lab.data.io.cif_utils import outputs_to_cif
+from chai_lab.model.diffusion_samplers import DiffusionSampler, EDMSampler
 from chai_lab.model.diffusion_schedules import InferenceNoiseSchedule
-from chai_lab.model.utils import center_random_augmentation
+from chai_lab.model.trunk_cache import TrunkCache, TrunkOutputs
 from chai_lab.ranking.frames import get_frames_and_mask
 from chai_lab.ranking.rank import SampleRanking, get_scores, rank
 from chai_lab.utils.paths import chai1_component
 from chai_lab.utils.plot import plot_msa
+from chai_lab.utils.profiling import InferenceReport, active_report, record_stage
+from chai_lab.utils.static_cache import diagonal_mask, static_cached
 from chai_lab.utils.tensor_utils import move_data_to_device, set_seed, und_self
 from chai_lab.utils.typing import Float, typecheck
 
+logger = logging.getLogger(__name__)
+
 
 class UnsupportedInputError(RuntimeError):
     pass
@@ -98,14 +128,24 @@ def load_exported(comp_key: str, device: torch.device) -> torch.nn.Module:
     return exported_program.module().to(device)
 
 
+# signature shared by `load_exported` and anything that caches its results
+ComponentLoader = Callable[[str, torch.device], torch.nn.Module]
+
+
 # %%
 # Create feature factory
 
+relative_positions = FusedRelativePositions(
+    sequence_separation=RelativeSequenceSeparation(sep_bins=None),
+    token_separation=RelativeTokenSeparation(r_max=32),
+    chain=RelativeChain(),
+    entity=RelativeEntity(),
+)
 feature_generators = dict(
-    RelativeSequenceSeparation=RelativeSequenceSeparation(sep_bins=None),
-    RelativeTokenSeparation=RelativeTokenSeparation(r_max=32),
-    RelativeEntity=RelativeEntity(),
-    RelativeChain=RelativeChain(),
+    RelativeSequenceSeparation=relative_positions.sequence_separation,
+    RelativeTokenSeparation=relative_positions.token_separation,
+    RelativeEntity=relative_positions.entity,
+    RelativeChain=relative_positions.chain,
     ResidueType=ResidueType(
         min_corrupt_prob=0.0,
         max_corrupt_prob=0.0,
@@ -172,6 +212,76 @@ feature_generators = dict(
 )
 feature_factory = FeatureFactory(feature_generators)
 
+# Inputs read after collation: by the model and trunk cache, ranking and the CIF
+# writer. Collation drops inputs read neither here nor by the feature generators.
+_MODEL_INPUT_KEYS = frozenset(
+    [
+        "atom_exists_mask",
+        "atom_ref_element",
+        "atom_ref_mask",
+        "atom_ref_name_chars",
+        "atom_token_index",
+        "atom_within_token_index",
+        "msa_mask",
+        "template_mask",
+        "token_asym_id",
+        "token_backbone_frame_index",
+        "token_backbone_frame_mask",
+        "token_centre_atom_index",
+        "token_entity_id",
+        "token_entity_type",
+        "token_exists_mask",
+        "token_ref_atom_index",
+        "token_residue_index",
+        "token_residue_name",
+    ]
+)
+
+# One-hot and outer-sum features are generated in the smallest integer dtype that
+# holds their classes; the exported feature embedder was traced with these.
+_FEATURE_EMBEDDING_DTYPES: dict[str, torch.dtype] = dict(
+    RelativeSequenceSeparation=torch.long,
+    RelativeTokenSeparation=torch.int32,
+    RelativeEntity=torch.long,
+    RelativeChain=torch.long,
+    ResidueType=torch.long,
+    BlockedAtomPairDistogram=torch.long,
+    AtomRefElement=torch.int32,
+    AtomNameOneHot=torch.int32,
+    TemplateResType=torch.uint8,
+    TemplateDistogram=torch.long,
+    DockingConstraintGenerator=torch.long,
+    TokenBFactor=torch.long,
+    TokenPLDDT=torch.long,
+    IsDistillation=torch.uint8,
+    MSAOneHot=torch.uint8,
+    MSADataSource=torch.uint8,
+)
+
+
+def _features_for_embedding(features: dict[str, Tensor]) -> dict[str, Tensor]:
+    """Widens features to the traced dtypes, on the device they were moved to.
+
+    Constant features are broadcast views; they are materialized here too.
+    """
+    return {
+        name: feature.to(
+            dtype=_FEATURE_EMBEDDING_DTYPES.get(name, feature.dtype)
+        ).contiguous()
+        for name, feature in features.items()
+    }
+
+
+def _make_collator(device: torch.device | None = None) -> Collate:
+    return Collate(
+        feature_factory=feature_factory,
+        num_key_atoms=128,
+        num_query_atoms=32,
+        device=device,
+        model_input_keys=_MODEL_INPUT_KEYS,
+    )
+
+
 # %%
 # Config
 
@@ -185,6 +295,22 @@ class DiffusionConfig:
     second_order: bool = True
 
 
+def default_diffusion_sampler() -> DiffusionSampler:
+    return EDMSampler(
+        noise_schedule=InferenceNoiseSchedule(
+            s_max=DiffusionConfig.S_tmax,
+            s_min=4e-4,
+            p=7.0,
+            sigma_data=DiffusionConfig.sigma_data,
+        ),
+        S_churn=DiffusionConfig.S_churn,
+        S_tmin=DiffusionConfig.S_tmin,
+        S_tmax=DiffusionConfig.S_tmax,
+        S_noise=DiffusionConfig.S_noise,
+        second_order=DiffusionConfig.second_order,
+    )
+
+
 # %%
 # Input validation
 
@@ -238,26 +364,51 @@ class StructureCandidates:
     # Predicted local distance difference test (pLDDT)
     plddt: Float[Tensor, "candidate num_tokens"]
 
+    # trunk recycles actually run, fewer than requested if the trunk converged
+    num_trunk_recycles: int
+
+    # wall time and peak memory per stage of the run
+    report: InferenceReport
+
     def __post_init__(self):
         assert len(self.cif_paths) == len(self.ranking_data)
         assert len(self.cif_paths) == len(self.pae)
 
+    def sorted(self) -> "StructureCandidates":
+        """Candidates ordered by decreasing aggregate score."""
+        order = sorted(
+            range(len(self.cif_paths)),
+            key=lambda i: self.ranking_data[i].aggregate_score.item(),
+            reverse=True,
+        )
+        return StructureCandidates(
+            cif_paths=[self.cif_paths[i] for i in order],
+            ranking_data=[self.ranking_data[i] for i in order],
+            msa_coverage_plot_path=self.msa_coverage_plot_path,
+            pae=self.pae[order],
+            pde=self.pde[order],
+            plddt=self.plddt[order],
+            num_trunk_recycles=self.num_trunk_recycles,
+            report=self.report,
+        )
 
-@torch.no_grad()
-def run_inference(
+
+@dataclass(frozen=True)
+class InferenceJob:
+    # one complex to fold, see `run_inference_many`
+    fasta_file: Path
+    output_dir: Path
+
+
+def _load_chains_from_fasta(
     fasta_file: Path,
-    *,
-    output_dir: Path,
-    use_esm_embeddings: bool = True,
-    # expose some params for easy tweaking
-    num_trunk_recycles: int = 3,
-    num_diffn_timesteps: int = 200,
-    seed: int | None = None,
-    device: torch.device | None = None,
-) -> StructureCandidates:
-    # Prepare inputs
+    tokenizer: AllAtomResidueTokenizer | None = None,
+    entity_cache: EntityCache | None = None,
+    tokenizer_pool: Executor | None = None,
+) -> list[Chain]:
     assert fasta_file.exists(), fasta_file
-    fasta_inputs = read_inputs(fasta_file, length_limit=None)
+    with record_stage("parse_inputs"):
+        fasta_inputs = read_inputs(fasta_file, length_limit=None)
 
     assert len(fasta_inputs) > 0, "No inputs found in fasta file"
 
@@ -267,41 +418,67 @@ def run_inference(
                 f"{name=} used more than once in inputs. Each entity must have a unique name"
             )
 
+    with record_stage("tokenize"):
+        return load_chains_from_raw(
+            fasta_inputs,
+            tokenizer=tokenizer,
+            entity_cache=entity_cache,
+            tokenizer_pool=tokenizer_pool,
+        )
+
+
+@contextmanager
+def _maybe_tokenizer_pool(num_workers: int) -> Iterator[Executor | None]:
+    if num_workers <= 0:
+        yield None
+        return
+    with make_tokenizer_pool(num_workers) as pool:
+        yield pool
+
+
+def _make_feature_context(
+    chains: list[Chain],
+    *,
+    use_esm_embeddings: bool,
+    device: torch.device | None,
+    constraint_context: ConstraintContext | None = None,
+) -> AllAtomFeatureContext:
     # Load structure context
-    chains = load_chains_from_raw(fasta_inputs)
     merged_context = AllAtomStructureContext.merge(
         [c.structure_context for c in chains]
     )
     n_actual_tokens = merged_context.num_tokens
     raise_if_too_many_tokens(n_actual_tokens)
 
-    # Load MSAs
+    # Load MSAs; empty, collation pads them to MAX_MSA_DEPTH
     msa_context = MSAContext.create_empty(
         n_tokens=n_actual_tokens,
-        depth=MAX_MSA_DEPTH,
+        depth=0,
     )
     main_msa_context = MSAContext.create_empty(
         n_tokens=n_actual_tokens,
-        depth=MAX_MSA_DEPTH,
+        depth=0,
     )
 
-    # Load templates
+    # Load templates; none, collation pads them to MAX_NUM_TEMPLATES
     template_context = TemplateContext.empty(
         n_tokens=n_actual_tokens,
-        n_templates=MAX_NUM_TEMPLATES,
+        n_templates=0,
     )
 
     # Load ESM embeddings
     if use_esm_embeddings:
-        embedding_context = get_esm_embedding_context(chains, device=device)
+        with record_stage("esm_embeddings"):
+            embedding_context = get_esm_embedding_context(chains, device=device)
     else:
         embedding_context = EmbeddingContext.empty(n_tokens=n_actual_tokens)
 
     # Constraints
-    constraint_context = ConstraintContext.empty()
+    if constraint_context is None:
+        constraint_context = ConstraintContext.empty()
 
     # Build final feature context
-    feature_context = AllAtomFeatureContext(
+    return AllAtomFeatureContext(
         chains=chains,
         structure_context=merged_context,
         msa_context=msa_context,
@@ -311,18 +488,304 @@ def run_inference(
         constraint_context=constraint_context,
     )
 
-    return run_folding_on_context(
-        feature_context,
-        output_dir=output_dir,
-        num_trunk_recycles=num_trunk_recycles,
-        num_diffn_timesteps=num_diffn_timesteps,
-        seed=seed,
-        device=device,
+
+@torch.no_grad()
+def run_inference(
+    fasta_file: Path,
+    *,
+    output_dir: Path,
+    use_esm_embeddings: bool = True,
+    # expose some params for easy tweaking
+    num_trunk_recycles: int = 3,
+    trunk_convergence_tol: float | None = None,
+    num_diffn_timesteps: int = 200,
+    num_samples: int = 5,
+    seed: int | None = None,
+    device: torch.device | None = None,
+    component_loader: ComponentLoader = load_exported,
+    trunk_cache_dir: Path | None = None,
+    write_report: bool = False,
+    collate_on_device: bool = False,
+    entity_cache: EntityCache | None = None,
+    # starting processes costs more than tokenizing a job, pass a pool kept
+    # between calls (see make_tokenizer_pool) rather than one per call
+    tokenizer_pool: Executor | None = None,
+) -> StructureCandidates:
+    report = InferenceReport(device if device is not None else torch.device("cuda:0"))
+    with report.activate():
+        # Prepare inputs
+        chains = _load_chains_from_fasta(
+            fasta_file, entity_cache=entity_cache, tokenizer_pool=tokenizer_pool
+        )
+        feature_context = _make_feature_context(
+            chains,
+            use_esm_embeddings=use_esm_embeddings,
+            device=device,
+        )
+
+        return run_folding_on_context(
+            feature_context,
+            output_dir=output_dir,
+            num_trunk_recycles=num_trunk_recycles,
+            trunk_convergence_tol=trunk_convergence_tol,
+            num_diffn_timesteps=num_diffn_timesteps,
+            num_samples=num_samples,
+            seed=seed,
+            device=device,
+            component_loader=component_loader,
+            trunk_cache_dir=trunk_cache_dir,
+            write_report=write_report,
+            collate_on_device=collate_on_device,
+        )
+
+
+@torch.no_grad()
+def run_inference_many(
+    inputs: list[InferenceJob],
+    *,
+    use_esm_embeddings: bool = True,
+    # expose some params for easy tweaking
+    num_trunk_recycles: int = 3,
+    trunk_convergence_tol: float | None = None,
+    num_diffn_timesteps: int = 200,
+    num_samples: int = 5,
+    seed: int | None = None,
+    device: torch.device | None = None,
+    component_loader: ComponentLoader | None = None,
+    trunk_cache_dir: Path | None = None,
+    write_report: bool = False,
+    collate_on_device: bool = False,
+    entity_cache: EntityCache | None = None,
+    num_tokenizer_workers: int = 0,
+) -> list[StructureCandidates]:
+    """
+    Fold many complexes, loading the exported components of each model size once.
+
+    All jobs are tokenized first and grouped by the model size they pad to;
+    each group is then streamed through the same loaded components.
+    MSA, template and ESM contexts are only built right before a job is folded,
+    so memory does not grow with the number of jobs.
+    Returns one StructureCandidates per job, in the order of `inputs`.
+
+    By default each group's components are dropped once the group is done;
+    pass `component_loader` (e.g. `Chai1Session.load_exported`) to manage them
+    yourself. Entities shared between jobs are tokenized once when an
+    `entity_cache` is given; with `num_tokenizer_workers`, the chains of each job
+    are tokenized concurrently by that many processes.
+    """
+    if device is None:
+        device = torch.device("cuda:0")
+
+    # one report per job, tokenization is recorded in the job's report
+    reports = [InferenceReport(device) for _ in inputs]
+    chains_per_job: list[list[Chain]] = []
+    with _maybe_tokenizer_pool(num_tokenizer_workers) as tokenizer_pool:
+        for job, report in zip(inputs, reports, strict=True):
+            with report.activate():
+                chains_per_job.append(
+                    _load_chains_from_fasta(
+                        job.fasta_file,
+                        entity_cache=entity_cache,
+                        tokenizer_pool=tokenizer_pool,
+                    )
+                )
+
+    job_indices_per_model_size: dict[int, list[int]] = defaultdict(list)
+    for job_idx, chains in enumerate(chains_per_job):
+        merged_context = AllAtomStructureContext.merge(
+            [c.structure_context for c in chains]
+        )
+        raise_if_too_many_tokens(merged_context.num_tokens)
+        model_size = get_pad_sizes([merged_context]).n_tokens
+        job_indices_per_model_size[model_size].append(job_idx)
+
+    results: dict[int, StructureCandidates] = {}
+    for model_size, job_indices in sorted(job_indices_per_model_size.items()):
+        # components are loaded on first use and shared by the whole group
+        group_loader = component_loader or functools.cache(load_exported)
+        for job_idx in job_indices:
+            with reports[job_idx].activate():
+                feature_context = _make_feature_context(
+                    chains_per_job[job_idx],
+                    use_esm_embeddings=use_esm_embeddings,
+                    device=device,
+                )
+                results[job_idx] = run_folding_on_context(
+                    feature_context,
+                    output_dir=inputs[job_idx].output_dir,
+                    num_trunk_recycles=num_trunk_recycles,
+                    trunk_convergence_tol=trunk_convergence_tol,
+                    num_diffn_timesteps=num_diffn_timesteps,
+                    num_samples=num_samples,
+                    seed=seed,
+                    device=device,
+                    component_loader=group_loader,
+                    trunk_cache_dir=trunk_cache_dir,
+                    write_report=write_report,
+                    collate_on_device=collate_on_device,
+                )
+            # drop the chains, the job is done
+            chains_per_job[job_idx] = []
+        # release this model size before loading the next one
+        del group_loader
+        torch.cuda.empty_cache()
+
+    return [results[job_idx] for job_idx in range(len(inputs))]
+
+
+def _build_bin_centers(
+    min_bin: float, max_bin: float, no_bins: int, device: torch.device
+) -> Tensor:
+    return torch.linspace(min_bin, max_bin, 2 * no_bins + 1)[1::2].to(device)
+
+
+def _bin_centers(
+    min_bin: float,
+    max_bin: float,
+    no_bins: int,
+    device: torch.device = torch.device("cpu"),
+) -> Tensor:
+    """Shared between calls, see chai_lab.utils.static_cache."""
+    return static_cached(
+        _build_bin_centers, min_bin, max_bin, no_bins, torch.device(device)
     )
 
 
-def _bin_centers(min_bin: float, max_bin: float, no_bins: int) -> Tensor:
-    return torch.linspace(min_bin, max_bin, 2 * no_bins + 1)[1::2]
+def _relative_change(
+    new: Float[Tensor, "1 n ..."],
+    old: Float[Tensor, "1 n ..."],
+    n_tokens: int,
+    chunk_size: int = 128,
+) -> float:
+    """||new - old|| / ||old|| over the first n_tokens (i.e. non-padding) tokens.
+
+    Computed in row chunks so that pair representations are never upcast in full.
+    """
+    diff_sq, old_sq = 0.0, 0.0
+    for start in range(0, n_tokens, chunk_size):
+        rows = slice(start, min(start + chunk_size, n_tokens))
+        new_chunk = new[:, rows].float()
+        old_chunk = old[:, rows].float()
+        if new.ndim == 4:  # pair representation, also drop padded columns
+            new_chunk = new_chunk[:, :, :n_tokens]
+            old_chunk = old_chunk[:, :, :n_tokens]
+        diff_sq += (new_chunk - old_chunk).square().sum().item()
+        old_sq += old_chunk.square().sum().item()
+    return math.sqrt(diff_sq / max(old_sq, 1e-12))
+
+
+# exported confidence heads that were found to only take a single sample
+_unbatchable_confidence_heads: "weakref.WeakSet[torch.nn.Module]" = weakref.WeakSet()
+
+
+def _is_shape_specialization_error(e: RuntimeError) -> bool:
+    # raised by the input checks of exported programs, see torch._export.utils
+    return str(e).startswith("Expected input at") and ".shape[" in str(e)
+
+
+def _run_confidence_head(
+    confidence_head: torch.nn.Module,
+    atom_coords: Float[Tensor, "s a 3"],
+    **inputs: Tensor,
+) -> tuple[Tensor, ...]:
+    """Scores a batch of samples that share all inputs but their coordinates.
+
+    The samples go through the head in one call if the exported graph accepts a
+    batch of them; heads specialized to a single sample are run once per sample.
+    """
+    num_samples = atom_coords.shape[0]
+    if num_samples > 1 and confidence_head not in _unbatchable_confidence_heads:
+        try:
+            return confidence_head.forward(
+                atom_coords=atom_coords,
+                **{
+                    name: x.expand(num_samples, *x.shape[1:])
+                    for name, x in inputs.items()
+                },
+            )
+        except torch.cuda.OutOfMemoryError:
+            # single samples may still fit; the next call tries a batch again
+            logger.info("Out of memory scoring a batch of samples, scoring one by one")
+            torch.cuda.empty_cache()
+        except RuntimeError as e:
+            if not _is_shape_specialization_error(e):
+                raise
+            logger.info(f"Confidence head rejected a batch of samples: {e}")
+            _unbatchable_confidence_heads.add(confidence_head)
+
+    outputs = [
+        confidence_head.forward(atom_coords=atom_coords[s : s + 1], **inputs)
+        for s in range(num_samples)
+    ]
+    return tuple(torch.cat(x, dim=0) for x in zip(*outputs, strict=True))
+
+
+def _rank_samples(
+    atom_pos: Float[Tensor, "s a 3"],
+    *,
+    inputs: dict[str, Tensor],
+    plddt_logits: Float[Tensor, "s a lddt_bins"],
+    pae_logits: Float[Tensor, "s n n pae_bins"],
+    max_chunk_elements: int = 2**28,
+) -> list[SampleRanking]:
+    """Ranks all samples, as many per call as fit in `max_chunk_elements`."""
+    num_samples, num_atoms, _ = atom_pos.shape
+    _, num_tokens, _, num_pae_bins = pae_logits.shape
+    num_chains = inputs["token_asym_id"].unique().numel()
+    # largest intermediates: atom pair clashes and per chain expected pair TMs
+    elements_per_sample = max(num_atoms**2, num_chains * num_tokens**2 * num_pae_bins)
+    chunk_size = max(1, max_chunk_elements // elements_per_sample)
+
+    lddt_bin_centers = _bin_centers(
+        0, 1, plddt_logits.shape[-1], device=plddt_logits.device
+    )
+    pae_bin_centers = _bin_centers(0.0, 32.0, num_pae_bins, device=pae_logits.device)
+
+    ranking_data: list[SampleRanking] = []
+    for start in range(0, num_samples, chunk_size):
+        coords = atom_pos[start : start + chunk_size]
+        # inputs are shared by all samples
+        chunk_inputs = {
+            name: repeat(inputs[name], "1 ... -> s ...", s=coords.shape[0])
+            for name in [
+                "token_asym_id",
+                "token_residue_index",
+                "token_backbone_frame_mask",
+                "token_centre_atom_index",
+                "token_exists_mask",
+                "token_entity_type",
+                "token_backbone_frame_index",
+                "atom_exists_mask",
+                "atom_token_index",
+            ]
+        }
+        _, valid_frames_mask = get_frames_and_mask(
+            coords,
+            chunk_inputs["token_asym_id"],
+            chunk_inputs["token_residue_index"],
+            chunk_inputs["token_backbone_frame_mask"],
+            chunk_inputs["token_centre_atom_index"],
+            chunk_inputs["token_exists_mask"],
+            chunk_inputs["atom_exists_mask"],
+            chunk_inputs["token_backbone_frame_index"],
+            chunk_inputs["atom_token_index"],
+        )
+        ranking_outputs = rank(
+            coords,
+            atom_mask=chunk_inputs["atom_exists_mask"],
+            atom_token_index=chunk_inputs["atom_token_index"],
+            token_exists_mask=chunk_inputs["token_exists_mask"],
+            token_asym_id=chunk_inputs["token_asym_id"],
+            token_entity_type=chunk_inputs["token_entity_type"],
+            token_valid_frames_mask=valid_frames_mask,
+            lddt_logits=plddt_logits[start : start + chunk_size],
+            lddt_bin_centers=lddt_bin_centers,
+            pae_logits=pae_logits[start : start + chunk_size],
+            pae_bin_centers=pae_bin_centers,
+        )
+        ranking_data.extend(ranking_outputs.split_samples())
+
+    return ranking_data
 
 
 @torch.no_grad()
@@ -332,13 +795,47 @@ def run_folding_on_context(
     output_dir: Path,
     # expose some params for easy tweaking
     num_trunk_recycles: int = 3,
+    trunk_convergence_tol: float | None = None,
     num_diffn_timesteps: int = 200,
+    num_samples: int = 5,
+    diffusion_sampler: DiffusionSampler | None = None,
     seed: int | None = None,
     device: torch.device | None = None,
+    component_loader: ComponentLoader = load_exported,
+    trunk_cache_dir: Path | None = None,
+    write_report: bool = False,
+    collate_on_device: bool = False,
 ) -> StructureCandidates:
     """
     Function for in-depth explorations.
     User completely controls folding inputs.
+
+    `num_samples` candidates are drawn from a single trunk pass; the diffusion
+    module is run as many times as needed to produce them.
+
+    If `trunk_convergence_tol` is set, recycling stops early once the relative
+    change of both trunk representations between consecutive recycles drops below
+    it. The number of recycles run is reported in the result.
+
+    `diffusion_sampler` defaults to the EDM sampler configured by DiffusionConfig;
+    see chai_lab.model.diffusion_samplers for cheaper alternatives.
+
+    If `trunk_cache_dir` is set, embedding and trunk outputs are stored there and
+    reused by later calls with identical features, model size and recycling
+    settings, which then go straight to diffusion.
+
+    `component_loader` is called for each exported model component; pass a caching
+    loader to reuse components across calls.
+
+    With `collate_on_device`, the unpadded feature context is moved to `device`
+    before collation, and padding and feature generation run there instead of on
+    the CPU. Generators then draw random numbers from the device's generator, so
+    seeded runs differ between the two modes.
+
+    Wall time and peak memory of each stage are recorded in `report` of the result,
+    which also holds earlier stages (parsing, tokenization, ESM) when called
+    through `run_inference`. With `write_report`, it is also saved as report.json
+    in `output_dir`.
     """
     # Set seed
     if seed is not None:
@@ -347,6 +844,8 @@ def run_folding_on_context(
     if device is None:
         device = torch.device("cuda:0")
 
+    report = active_report() or InferenceReport(device)
+
     # Clear memory
     torch.cuda.empty_cache()
 
@@ -356,6 +855,7 @@ def run_folding_on_context(
 
     n_actual_tokens = feature_context.structure_context.num_tokens
     raise_if_too_many_tokens(n_actual_tokens)
+    assert num_samples > 0, num_samples
     raise_if_too_many_templates(feature_context.template_context.num_templates)
     raise_if_msa_too_deep(feature_context.msa_context.depth)
     raise_if_msa_too_deep(feature_context.main_msa_context.depth)
@@ -365,19 +865,41 @@ def run_folding_on_context(
     ##
 
     # Collate inputs into batch
-    collator = Collate(
-        feature_factory=feature_factory,
-        num_key_atoms=128,
-        num_query_atoms=32,
-    )
+    collator = _make_collator(device if collate_on_device else None)
 
     feature_contexts = [feature_context]
     batch_size = len(feature_contexts)
-    batch = collator(feature_contexts)
-    batch = move_data_to_device(batch, device=device)
+    with report.activate(), report.stage("collate"):
+        batch = collator(feature_contexts)
+
+    # Model is size-specific
+    model_size = pad_size(n_actual_tokens, AVAILABLE_MODEL_SIZES)
+    num_diffn_samples = 5  # Fixed at export time
+    num_diffn_rounds = math.ceil(num_samples / num_diffn_samples)
+    report.metadata.update(
+        n_tokens=n_actual_tokens,
+        n_atoms=feature_context.structure_context.num_atoms,
+        model_size=model_size,
+        num_samples=num_samples,
+        num_diffn_timesteps=num_diffn_timesteps,
+        num_diffn_rounds=num_diffn_rounds,
+    )
+
+    trunk_cache = TrunkCache(trunk_cache_dir) if trunk_cache_dir is not None else None
+    if trunk_cache is not None:
+        # hashed before moving to the device, unless collated there
+        trunk_cache_key = trunk_cache.key(
+            batch,
+            model_size=model_size,
+            num_trunk_recycles=num_trunk_recycles,
+            trunk_convergence_tol=trunk_convergence_tol,
+        )
+
+    with report.stage("move_to_device"):
+        batch = move_data_to_device(batch, device=device)
 
     # Get features and inputs from batch
-    features = {name: feature for name, feature in batch["features"].items()}
+    features = _features_for_embedding(batch["features"])
     inputs = batch["inputs"]
     block_indices_h = inputs["block_atom_pair_q_idces"]
     block_indices_w = inputs["block_atom_pair_kv_idces"]
@@ -394,82 +916,156 @@ def run_folding_on_context(
     block_atom_pair_mask = inputs["block_atom_pair_mask"]
 
     ##
-    ## Load exported models
+    ## Embed the features and run the trunk, unless its outputs are cached
     ##
 
-    # Model is size-specific
-    model_size = min(x for x in AVAILABLE_MODEL_SIZES if n_actual_tokens <= x)
+    def _load_component(component: str) -> torch.nn.Module:
+        with report.stage(f"load_{component}"):
+            return component_loader(f"{model_size}/{component}.pt2", device)
 
-    feature_embedding = load_exported(f"{model_size}/feature_embedding.pt2", device)
-    token_input_embedder = load_exported(
-        f"{model_size}/token_input_embedder.pt2", device
-    )
-    trunk = load_exported(f"{model_size}/trunk.pt2", device)
-    diffusion_module = load_exported(f"{model_size}/diffusion_module.pt2", device)
-    confidence_head = load_exported(f"{model_size}/confidence_head.pt2", device)
+    def _run_trunk() -> TrunkOutputs:
+        feature_embedding = _load_component("feature_embedding")
+        token_input_embedder = _load_component("token_input_embedder")
+        trunk = _load_component("trunk")
 
-    ##
-    ## Run the features through the feature embedder
-    ##
+        ##
+        ## Run the features through the feature embedder
+        ##
 
-    embedded_features = feature_embedding.forward(**features)
-    token_single_input_feats = embedded_features["TOKEN"]
-    token_pair_input_feats, token_pair_structure_input_feats = embedded_features[
-        "TOKEN_PAIR"
-    ].chunk(2, dim=-1)
-    atom_single_input_feats, atom_single_structure_input_feats = embedded_features[
-        "ATOM"
-    ].chunk(2, dim=-1)
-    block_atom_pair_input_feats, block_atom_pair_structure_input_feats = (
-        embedded_features["ATOM_PAIR"].chunk(2, dim=-1)
-    )
-    template_input_feats = embedded_features["TEMPLATES"]
-    msa_input_feats = embedded_features["MSA"]
+        with report.stage("feature_embedding"):
+            embedded_features = feature_embedding.forward(**features)
+        token_single_input_feats = embedded_features["TOKEN"]
+        token_pair_input_feats, token_pair_structure_input_feats = embedded_features[
+            "TOKEN_PAIR"
+        ].chunk(2, dim=-1)
+        atom_single_input_feats, atom_single_structure_input_feats = embedded_features[
+            "ATOM"
+        ].chunk(2, dim=-1)
+        block_atom_pair_input_feats, block_atom_pair_structure_input_feats = (
+            embedded_features["ATOM_PAIR"].chunk(2, dim=-1)
+        )
+        template_input_feats = embedded_features["TEMPLATES"]
+        msa_input_feats = embedded_features["MSA"]
 
-    ##
-    ## Run the inputs through the token input embedder
-    ##
+        ##
+        ## Run the inputs through the token input embedder
+        ##
 
-    token_input_embedder_outputs: tuple[Tensor, ...] = token_input_embedder.forward(
-        token_single_input_feats=token_single_input_feats,
-        token_pair_input_feats=token_pair_input_feats,
-        atom_single_input_feats=atom_single_input_feats,
-        block_atom_pair_feat=block_atom_pair_input_feats,
-        block_atom_pair_mask=block_atom_pair_mask,
-        block_indices_h=block_indices_h,
-        block_indices_w=block_indices_w,
-        atom_single_mask=atom_single_mask,
-        atom_token_indices=atom_token_indices,
-    )
-    token_single_initial_repr, token_single_structure_input, token_pair_initial_repr = (
-        token_input_embedder_outputs
-    )
+        with report.stage("token_input_embedding"):
+            token_input_embedder_outputs: tuple[Tensor, ...] = (
+                token_input_embedder.forward(
+                    token_single_input_feats=token_single_input_feats,
+                    token_pair_input_feats=token_pair_input_feats,
+                    atom_single_input_feats=atom_single_input_feats,
+                    block_atom_pair_feat=block_atom_pair_input_feats,
+                    block_atom_pair_mask=block_atom_pair_mask,
+                    block_indices_h=block_indices_h,
+                    block_indices_w=block_indices_w,
+                    atom_single_mask=atom_single_mask,
+                    atom_token_indices=atom_token_indices,
+                )
+            )
+        (
+            token_single_initial_repr,
+            token_single_structure_input,
+            token_pair_initial_repr,
+        ) = token_input_embedder_outputs
 
-    ##
-    ## Run the input representations through the trunk
-    ##
+        ##
+        ## Run the input representations through the trunk
+        ##
 
-    # Recycle the representations by feeding the output back into the trunk as input for
-    # the subsequent recycle
-    token_single_trunk_repr = token_single_initial_repr
-    token_pair_trunk_repr = token_pair_initial_repr
-    for _ in tqdm(range(num_trunk_recycles), desc="Trunk recycles"):
-        (token_single_trunk_repr, token_pair_trunk_repr) = trunk.forward(
-            token_single_trunk_initial_repr=token_single_initial_repr,
-            token_pair_trunk_initial_repr=token_pair_initial_repr,
-            token_single_trunk_repr=token_single_trunk_repr,  # recycled
-            token_pair_trunk_repr=token_pair_trunk_repr,  # recycled
-            msa_input_feats=msa_input_feats,
-            msa_mask=msa_mask,
-            template_input_feats=template_input_feats,
-            template_input_masks=template_input_masks,
-            token_single_mask=token_single_mask,
-            token_pair_mask=token_pair_mask,
+        # Recycle the representations by feeding the output back into the trunk as input for
+        # the subsequent recycle
+        token_single_trunk_repr = token_single_initial_repr
+        token_pair_trunk_repr = token_pair_initial_repr
+        num_trunk_recycles_used = 0
+        for recycle_idx in tqdm(range(num_trunk_recycles), desc="Trunk recycles"):
+            # only hold on to the previous outputs if we need them for comparison
+            prev_trunk_reprs = (
+                (token_single_trunk_repr, token_pair_trunk_repr)
+                if trunk_convergence_tol is not None
+                else None
+            )
+            with report.stage(f"trunk_recycle_{recycle_idx}"):
+                (token_single_trunk_repr, token_pair_trunk_repr) = trunk.forward(
+                    token_single_trunk_initial_repr=token_single_initial_repr,
+                    token_pair_trunk_initial_repr=token_pair_initial_repr,
+                    token_single_trunk_repr=token_single_trunk_repr,  # recycled
+                    token_pair_trunk_repr=token_pair_trunk_repr,  # recycled
+                    msa_input_feats=msa_input_feats,
+                    msa_mask=msa_mask,
+                    template_input_feats=template_input_feats,
+                    template_input_masks=template_input_masks,
+                    token_single_mask=token_single_mask,
+                    token_pair_mask=token_pair_mask,
+                )
+            num_trunk_recycles_used += 1
+
+            # the first recycle is compared against the initial representations,
+            # which are not trunk outputs, so never stop after it
+            if (
+                trunk_convergence_tol is not None
+                and prev_trunk_reprs is not None
+                and recycle_idx > 0
+            ):
+                prev_single_trunk_repr, prev_pair_trunk_repr = prev_trunk_reprs
+                change = max(
+                    _relative_change(
+                        token_single_trunk_repr, prev_single_trunk_repr, n_actual_tokens
+                    ),
+                    _relative_change(
+                        token_pair_trunk_repr, prev_pair_trunk_repr, n_actual_tokens
+                    ),
+                )
+                if change < trunk_convergence_tol:
+                    logger.info(
+                        f"Trunk converged after {num_trunk_recycles_used} recycles "
+                        f"(relative change {change:.2e})"
+                    )
+                    break
+        prev_trunk_reprs = None
+
+        return TrunkOutputs(
+            token_single_initial_repr=token_single_initial_repr,
+            token_single_structure_input=token_single_structure_input,
+            token_pair_initial_repr=token_pair_initial_repr,
+            token_single_trunk_repr=token_single_trunk_repr,
+            token_pair_trunk_repr=token_pair_trunk_repr,
+            token_pair_structure_input_feats=token_pair_structure_input_feats,
+            atom_single_structure_input_feats=atom_single_structure_input_feats,
+            block_atom_pair_structure_input_feats=block_atom_pair_structure_input_feats,
+            num_trunk_recycles=num_trunk_recycles_used,
         )
-    # We won't be using the trunk anymore; remove it from memory
-    del trunk
+
+    trunk_outputs = None
+    if trunk_cache is not None:
+        with report.stage("trunk_cache_load"):
+            trunk_outputs = trunk_cache.load(trunk_cache_key, device)
+    if trunk_outputs is None:
+        trunk_outputs = _run_trunk()
+        if trunk_cache is not None:
+            with report.stage("trunk_cache_save"):
+                trunk_cache.save(trunk_cache_key, trunk_outputs)
+    # We won't be using the trunk anymore; make sure it is released
     torch.cuda.empty_cache()
 
+    token_single_initial_repr = trunk_outputs.token_single_initial_repr
+    token_single_structure_input = trunk_outputs.token_single_structure_input
+    token_single_trunk_repr = trunk_outputs.token_single_trunk_repr
+    token_pair_trunk_repr = trunk_outputs.token_pair_trunk_repr
+    token_pair_structure_input_feats = trunk_outputs.token_pair_structure_input_feats
+    atom_single_structure_input_feats = trunk_outputs.atom_single_structure_input_feats
+    block_atom_pair_structure_input_feats = (
+        trunk_outputs.block_atom_pair_structure_input_feats
+    )
+    num_trunk_recycles_used = trunk_outputs.num_trunk_recycles
+    report.metadata["num_trunk_recycles"] = num_trunk_recycles_used
+    del trunk_outputs
+
+    diffusion_module = _load_component("diffusion_module")
+    confidence_head = _load_component("confidence_head")
+
     ##
     ## Denoise the trunk representation by passing it through the diffusion module
     ##
@@ -496,69 +1092,26 @@ def run_folding_on_context(
             atom_token_indices=atom_token_indices,
         )
 
-    num_diffn_samples = 5  # Fixed at export time
-    inference_noise_schedule = InferenceNoiseSchedule(
-        s_max=DiffusionConfig.S_tmax,
-        s_min=4e-4,
-        p=7.0,
-        sigma_data=DiffusionConfig.sigma_data,
-    )
-    sigmas = inference_noise_schedule.get_schedule(
-        device=device, num_timesteps=num_diffn_timesteps
-    )
-    gammas = torch.where(
-        (sigmas >= DiffusionConfig.S_tmin) & (sigmas <= DiffusionConfig.S_tmax),
-        min(DiffusionConfig.S_churn / num_diffn_timesteps, math.sqrt(2) - 1),
-        0.0,
-    )
+    if diffusion_sampler is None:
+        diffusion_sampler = default_diffusion_sampler()
 
-    sigmas_and_gammas = list(zip(sigmas[:-1], sigmas[1:], gammas[:-1]))
-
-    # Initial atom positions
-    _, num_atoms = atom_single_mask.shape
-    atom_pos = sigmas[0] * torch.randn(
-        batch_size * num_diffn_samples, num_atoms, 3, device=device
-    )
-
-    for sigma_curr, sigma_next, gamma_curr in tqdm(
-        sigmas_and_gammas, desc="Diffusion steps"
-    ):
-        # Center coords
-        atom_pos = center_random_augmentation(
-            atom_pos,
+    def _sample_diffusion_round() -> Tensor:
+        return diffusion_sampler.sample(
+            denoise=lambda atom_pos, sigma: _denoise(
+                atom_pos, sigma=sigma, s=num_diffn_samples
+            ),
             atom_single_mask=repeat(
-                atom_single_mask,
-                "b a -> (b s) a",
-                s=num_diffn_samples,
+                atom_single_mask, "b a -> (b s) a", s=num_diffn_samples
             ),
+            num_timesteps=num_diffn_timesteps,
         )
 
-        # Alg 2. lines 4-6
-        noise = DiffusionConfig.S_noise * torch.randn(
-            atom_pos.shape, device=atom_pos.device
-        )
-        sigma_hat = sigma_curr + gamma_curr * sigma_curr
-        atom_pos_noise = (sigma_hat**2 - sigma_curr**2).clamp_min(1e-6).sqrt()
-        atom_pos_hat = atom_pos + noise * atom_pos_noise
-
-        # Lines 7-8
-        denoised_pos = _denoise(
-            atom_pos=atom_pos_hat,
-            sigma=sigma_hat,
-            s=num_diffn_samples,
-        )
-        d_i = (atom_pos_hat - denoised_pos) / sigma_hat
-        atom_pos = atom_pos_hat + (sigma_next - sigma_hat) * d_i
-
-        # Lines 9-11
-        if sigma_next != 0 and DiffusionConfig.second_order:  # second order update
-            denoised_pos = _denoise(
-                atom_pos,
-                sigma=sigma_next,
-                s=num_diffn_samples,
-            )
-            d_i_prime = (atom_pos - denoised_pos) / sigma_next
-            atom_pos = atom_pos + (sigma_next - sigma_hat) * ((d_i_prime + d_i) / 2)
+    # The diffusion module produces a fixed number of samples per call;
+    # larger requests are served by extra rounds on top of the same trunk outputs
+    with report.stage("diffusion"):
+        atom_pos = torch.cat(
+            [_sample_diffusion_round() for _ in range(num_diffn_rounds)]
+        )[:num_samples]
 
     # We won't be running diffusion anymore
     del diffusion_module
@@ -568,28 +1121,31 @@ def run_folding_on_context(
     ## Run the confidence model
     ##
 
-    confidence_outputs: list[tuple[Tensor, ...]] = [
-        confidence_head.forward(
-            token_single_input_repr=token_single_initial_repr,
-            token_single_trunk_repr=token_single_trunk_repr,
-            token_pair_trunk_repr=token_pair_trunk_repr,
-            token_single_mask=token_single_mask,
-            atom_single_mask=atom_single_mask,
-            atom_coords=atom_pos[s : s + 1],
-            token_reference_atom_index=token_reference_atom_index,
-            atom_token_index=atom_token_indices,
-            atom_within_token_index=atom_within_token_index,
-        )
-        for s in range(num_diffn_samples)
-    ]
+    with report.stage("confidence"):
+        # samples are scored in batches of the size the diffusion module draws
+        confidence_outputs: list[tuple[Tensor, ...]] = [
+            _run_confidence_head(
+                confidence_head,
+                atom_coords=atom_pos[start : start + num_diffn_samples],
+                token_single_input_repr=token_single_initial_repr,
+                token_single_trunk_repr=token_single_trunk_repr,
+                token_pair_trunk_repr=token_pair_trunk_repr,
+                token_single_mask=token_single_mask,
+                atom_single_mask=atom_single_mask,
+                token_reference_atom_index=token_reference_atom_index,
+                atom_token_index=atom_token_indices,
+                atom_within_token_index=atom_within_token_index,
+            )
+            for start in range(0, num_samples, num_diffn_samples)
+        ]
 
     pae_logits, pde_logits, plddt_logits = [
-        torch.cat(single_sample, dim=0)
-        for single_sample in zip(*confidence_outputs, strict=True)
+        torch.cat(sample_batches, dim=0)
+        for sample_batches in zip(*confidence_outputs, strict=True)
     ]
 
-    assert atom_pos.shape[0] == num_diffn_samples
-    assert pae_logits.shape[0] == num_diffn_samples
+    assert atom_pos.shape[0] == num_samples
+    assert pae_logits.shape[0] == num_samples
 
     def softmax_einsum_and_cpu(
         logits: Tensor, bin_mean: Tensor, pattern: str
@@ -644,78 +1200,60 @@ def run_folding_on_context(
     output_dir.mkdir(parents=True, exist_ok=True)
 
     if feature_context.msa_context.mask.any():
-        msa_plot_path = plot_msa(
-            input_tokens=feature_context.structure_context.token_residue_type,
-            msa_tokens=feature_context.msa_context.tokens,
-            out_fname=output_dir / "msa_depth.pdf",
-        )
+        with report.stage("write_outputs"):
+            msa_plot_path = plot_msa(
+                input_tokens=feature_context.structure_context.token_residue_type,
+                msa_tokens=feature_context.msa_context.tokens,
+                out_fname=output_dir / "msa_depth.pdf",
+            )
     else:
         msa_plot_path = None
 
-    cif_paths: list[Path] = []
-    ranking_data: list[SampleRanking] = []
-
-    for idx in range(num_diffn_samples):
-        ##
-        ## Compute ranking scores
-        ##
-
-        _, valid_frames_mask = get_frames_and_mask(
-            atom_pos[idx : idx + 1],
-            inputs["token_asym_id"],
-            inputs["token_residue_index"],
-            inputs["token_backbone_frame_mask"],
-            inputs["token_centre_atom_index"],
-            inputs["token_exists_mask"],
-            inputs["atom_exists_mask"],
-            inputs["token_backbone_frame_index"],
-            inputs["atom_token_index"],
-        )
+    ##
+    ## Compute ranking scores
+    ##
 
-        ranking_outputs = rank(
-            atom_pos[idx : idx + 1],
-            atom_mask=inputs["atom_exists_mask"],
-            atom_token_index=inputs["atom_token_index"],
-            token_exists_mask=inputs["token_exists_mask"],
-            token_asym_id=inputs["token_asym_id"],
-            token_entity_type=inputs["token_entity_type"],
-            token_valid_frames_mask=valid_frames_mask,
-            lddt_logits=plddt_logits[idx : idx + 1],
-            lddt_bin_centers=_bin_centers(0, 1, plddt_logits.shape[-1]).to(
-                plddt_logits.device
-            ),
-            pae_logits=pae_logits[idx : idx + 1],
-            pae_bin_centers=_bin_centers(0.0, 32.0, 64).to(pae_logits.device),
+    with report.stage("ranking"):
+        ranking_data = _rank_samples(
+            atom_pos,
+            inputs=inputs,
+            plddt_logits=plddt_logits,
+            pae_logits=pae_logits,
         )
 
-        ranking_data.append(ranking_outputs)
+    cif_paths: list[Path] = []
 
+    for idx, ranking_outputs in enumerate(ranking_data):
         ##
         ## Write output files
         ##
 
-        cif_out_path = output_dir.joinpath(f"pred.model_idx_{idx}.cif")
-        aggregate_score = ranking_outputs.aggregate_score.item()
-        print(f"Score={aggregate_score:.3f}, writing output to {cif_out_path}   ")
-
-        # use 0-100 scale for pLDDT in pdb outputs
-        scaled_plddt_scores_per_atom = 100 * plddt_scores_atom[idx : idx + 1]
-
-        outputs_to_cif(
-            coords=atom_pos[idx : idx + 1],
-            bfactors=scaled_plddt_scores_per_atom,
-            output_batch=inputs,
-            write_path=cif_out_path,
-            entity_names={
-                c.entity_data.entity_id: c.entity_data.entity_name
-                for c in feature_context.chains
-            },
-        )
-        cif_paths.append(cif_out_path)
+        with report.stage("write_outputs"):
+            cif_out_path = output_dir.joinpath(f"pred.model_idx_{idx}.cif")
+            aggregate_score = ranking_outputs.aggregate_score.item()
+            print(f"Score={aggregate_score:.3f}, writing output to {cif_out_path}   ")
+
+            # use 0-100 scale for pLDDT in pdb outputs
+            scaled_plddt_scores_per_atom = 100 * plddt_scores_atom[idx : idx + 1]
+
+            outputs_to_cif(
+                coords=atom_pos[idx : idx + 1],
+                bfactors=scaled_plddt_scores_per_atom,
+                output_batch=inputs,
+                write_path=cif_out_path,
+                entity_names={
+                    c.entity_data.entity_id: c.entity_data.entity_name
+                    for c in feature_context.chains
+                },
+            )
+            cif_paths.append(cif_out_path)
 
-        scores_out_path = output_dir.joinpath(f"scores.model_idx_{idx}.npz")
+            scores_out_path = output_dir.joinpath(f"scores.model_idx_{idx}.npz")
 
-        np.savez(scores_out_path, **get_scores(ranking_outputs))
+            np.savez(scores_out_path, **get_scores(ranking_outputs))
+
+    if write_report:
+        report.write_json(output_dir / "report.json")
 
     return StructureCandidates(
         cif_paths=cif_paths,
@@ -724,4 +1262,114 @@ def run_folding_on_context(
         pae=pae_scores,
         pde=pde_scores,
         plddt=plddt_scores,
+        num_trunk_recycles=num_trunk_recycles_used,
+        report=report,
     )
+
+
+def prewarm_static_cache(
+    device: torch.device,
+    model_sizes: list[int] = AVAILABLE_MODEL_SIZES,
+    num_diffn_timesteps: int = 200,
+    diffusion_sampler: DiffusionSampler | None = None,
+) -> None:
+    """
+    Builds the tensors shared by all folds of the given model sizes, see
+    chai_lab.utils.static_cache, so the first fold of each size does not pay for
+    them; e.g. at server start. Host-side ones, for collation on the host, too.
+    """
+    if diffusion_sampler is None:
+        diffusion_sampler = default_diffusion_sampler()
+    collator = _make_collator()
+    for d in {torch.device("cpu"), torch.device(device)}:
+        for model_size in model_sizes:
+            collator.block_atom_pair_indices(model_pad_sizes(model_size).n_atoms, d)
+            diagonal_mask(model_size, d)
+        _bin_centers(0.0, 32.0, 64, device=d)
+    diffusion_sampler.get_sigmas_and_gammas(num_diffn_timesteps, torch.device(device))
+
+
+# %%
+# Session
+
+
+def _module_nbytes(module: torch.nn.Module) -> int:
+    """
+    Bytes of the parameters, buffers and tensor constants of `module`. Exported
+    programs lift their constants to buffers or, depending on the torch version,
+    to plain tensor attributes; both are counted, each tensor once.
+    """
+    tensors = {id(t): t for t in itertools.chain(module.parameters(), module.buffers())}
+    for submodule in module.modules():
+        for value in vars(submodule).values():
+            if isinstance(value, Tensor):
+                tensors[id(value)] = value
+    return sum(t.nbytes for t in tensors.values())
+
+
+class Chai1Session:
+    """
+    Keeps exported model components loaded between folds.
+
+    Components are cached per (model size, component, device). Once the
+    parameters, buffers and constants of the cached components exceed `max_bytes`,
+    the least recently used ones are dropped; `None` means no limit. The budget is
+    approximate: activations and allocator overhead while running a component are
+    not counted.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self._components: OrderedDict[
+            tuple[int, str, torch.device], tuple[torch.nn.Module, int]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def cached_bytes(self) -> int:
+        return sum(nbytes for _, nbytes in self._components.values())
+
+    def load_exported(self, comp_key: str, device: torch.device) -> torch.nn.Module:
+        # comp_key looks like "256/trunk.pt2"
+        model_size, component = comp_key.split("/")
+        key = (int(model_size), component.removesuffix(".pt2"), torch.device(device))
+
+        with self._lock:
+            if key in self._components:
+                self._components.move_to_end(key)
+                module, _ = self._components[key]
+                return module
+
+            module = load_exported(comp_key, device)
+            self._components[key] = (module, _module_nbytes(module))
+            self._evict()
+            return module
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        # never evict the most recent component, it is about to be used
+        while self.cached_bytes > self.max_bytes and len(self._components) > 1:
+            oldest, _ = self._components.popitem(last=False)
+            logger.info(f"Evicted {oldest} from Chai1Session")
+        torch.cuda.empty_cache()
+
+    def clear(self):
+        with self._lock:
+            self._components.clear()
+        torch.cuda.empty_cache()
+
+    def run_inference(self, fasta_file: Path, **kwargs) -> StructureCandidates:
+        return run_inference(fasta_file, component_loader=self.load_exported, **kwargs)
+
+    def run_inference_many(
+        self, inputs: list[InferenceJob], **kwargs
+    ) -> list[StructureCandidates]:
+        return run_inference_many(inputs, component_loader=self.load_exported, **kwargs)
+
+    def run_folding_on_context(
+        self, feature_context: AllAtomFeatureContext, **kwargs
+    ) -> StructureCandidates:
+        return run_folding_on_context(
+            feature_context, component_loader=self.load_exported, **kwargs
+        )
@@ -16,15 +16,33 @@ from chai_lab.model.utils import (
     get_qkv_indices_for_blocks,
 )
 from chai_lab.utils.dict import list_dict_to_dict_list
+from chai_lab.utils.static_cache import static_cached
+from chai_lab.utils.tensor_utils import max_pad_spec, pad_and_stack
 
 logger = logging.getLogger(__name__)
 
 
 @dataclasses.dataclass(frozen=True)
 class Collate:
+    """
+    Pads and stacks feature contexts into a batch and generates its features.
+
+    By default this happens on the device the contexts are on, typically the CPU,
+    and the batch is moved to the model's device afterwards. With `device` set,
+    the unpadded contexts are moved there first, so padding and feature
+    generation run on that device and only the compact contexts cross the bus.
+
+    With `model_input_keys`, the inputs read after collation (by the model, ranking
+    and output writers), the batch only holds those and the inputs the feature
+    generators declare, and only those are padded. Without it, or if any
+    generator does not declare its inputs, the batch holds all.
+    """
+
     feature_factory: FeatureFactory
     num_query_atoms: int
     num_key_atoms: int
+    device: torch.device | None = None
+    model_input_keys: frozenset[str] | None = None
 
     def __call__(
         self,
@@ -34,28 +52,70 @@ class Collate:
         prepared_batch = self._post_collate(raw_batch)
         return prepared_batch
 
+    @property
+    def input_keys(self) -> frozenset[str] | None:
+        """Inputs the batch holds, None for all"""
+        feature_keys = self.feature_factory.input_keys
+        if self.model_input_keys is None or feature_keys is None:
+            return None
+        # read by _post_collate
+        return (
+            self.model_input_keys | feature_keys | {"atom_exists_mask", "atom_ref_mask"}
+        )
+
+    def block_atom_pair_indices(
+        self, n_atoms: int, device: torch.device
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Query and key/value atom indices of the local attention blocks, and the
+        mask of unwrapped key/value indices; the same for every batch of a bucket,
+        see chai_lab.utils.static_cache.
+        """
+        return static_cached(
+            get_qkv_indices_for_blocks,
+            n_atoms,
+            self.num_query_atoms,
+            self.num_key_atoms,
+            torch.device(device),
+        )
+
     def _collate(
         self,
         feature_contexts: list[AllAtomFeatureContext],
     ) -> dict[str, Any]:
+        if self.device is not None:
+            feature_contexts = [c.to(self.device) for c in feature_contexts]
+
         # Get the pad sizes, finding the max number of tokens/atoms/bonds in the batch.
         pad_sizes = get_pad_sizes([p.structure_context for p in feature_contexts])
 
-        # Pad each feature context to the max sizes
-        padded_feature_contexts = [
-            feature_context.pad(
-                n_tokens=pad_sizes.n_tokens,
-                n_atoms=pad_sizes.n_atoms,
-            )
-            for feature_context in feature_contexts
+        # Convert all the unpadded input data into dicts, for each feature context
+        input_keys = self.input_keys
+        inputs_per_context = [e.to_dict(keys=input_keys) for e in feature_contexts]
+
+        # Stack the dict inputs into a single batch dict, across all feature contexts.
+        # Padded inputs are allocated once at the padded batch shape and each
+        # context's data copied in, rather than padded per context and stacked.
+        # contexts may pad other dims to their own sizes (e.g. MSA depth), so take
+        # the largest of each
+        specs_per_context = [
+            c.pad_spec(n_tokens=pad_sizes.n_tokens, n_atoms=pad_sizes.n_atoms)
+            for c in feature_contexts
         ]
-
-        # Convert all the input data into dicts, for each feature context
-        inputs_per_context = [e.to_dict() for e in padded_feature_contexts]
-
-        # Stack the dict inputs into a single batch dict, across all feature contexts
+        pad_specs = {
+            k: max_pad_spec([specs[k] for specs in specs_per_context if k in specs])
+            for k in set().union(*specs_per_context)
+        }
         batched_inputs = {
-            k: (torch.stack(v, dim=0) if isinstance(v[0], torch.Tensor) else v)
+            k: (
+                (
+                    pad_and_stack(v, pad_specs[k])
+                    if k in pad_specs
+                    else torch.stack(v, dim=0)
+                )
+                if isinstance(v[0], torch.Tensor)
+                else v
+            )
             for k, v in list_dict_to_dict_list(inputs_per_context).items()
         }
 
@@ -73,11 +133,8 @@ class Collate:
 
         # prepare atom pair block data:
         atom_exists_mask = raw_b_i["atom_exists_mask"]
-        block_q_atom_idces, block_kv_atom_idces, kv_mask = get_qkv_indices_for_blocks(
-            atom_exists_mask.shape[1],
-            self.num_query_atoms,
-            self.num_key_atoms,
-            atom_exists_mask.device,
+        block_q_atom_idces, block_kv_atom_idces, kv_mask = self.block_atom_pair_indices(
+            atom_exists_mask.shape[1], atom_exists_mask.device
         )
         block_atom_pair_mask = get_block_atom_pair_mask(
             atom_single_mask=raw_b_i["atom_ref_mask"],
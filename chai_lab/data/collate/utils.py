@@ -27,12 +27,16 @@ def pad_size(max_in_batch: int, allowed_sizes: list[int]) -> int:
     return min(n for n in allowed_sizes if n >= max_in_batch)
 
 
+def model_pad_sizes(n_tokens: int) -> PadSizes:
+    """Pad sizes of the model taking n_tokens"""
+    return PadSizes(n_tokens=n_tokens, n_atoms=23 * n_tokens)
+
+
 def get_pad_sizes(contexts: list[AllAtomStructureContext]) -> PadSizes:
     max_n_tokens = max(context.num_tokens for context in contexts)
-    n_tokens = pad_size(max_n_tokens, AVAILABLE_MODEL_SIZES)
+    pad_sizes = model_pad_sizes(pad_size(max_n_tokens, AVAILABLE_MODEL_SIZES))
 
     max_n_atoms = max(context.num_atoms for context in contexts)
-    n_atoms = 23 * n_tokens
-    assert max_n_atoms <= n_atoms
+    assert max_n_atoms <= pad_sizes.n_atoms
 
-    return PadSizes(n_tokens=n_tokens, n_atoms=n_atoms)
+    return pad_sizes
@@ -2,9 +2,13 @@
 # This source code is licensed under the Chai Discovery Community License
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
+import dataclasses
 import logging
 from dataclasses import dataclass
-from typing import Any, Final
+from typing import Any, Collection, Final
+
+import torch
+from torch import Tensor
 
 from chai_lab.data.dataset.constraints.constraint_context import ConstraintContext
 from chai_lab.data.dataset.embeddings.embedding_context import EmbeddingContext
@@ -14,12 +18,37 @@ from chai_lab.data.dataset.structure.all_atom_structure_context import (
 )
 from chai_lab.data.dataset.structure.chain import Chain
 from chai_lab.data.dataset.templates.context import TemplateContext
+from chai_lab.utils.tensor_utils import PadSpec
 
 logger = logging.getLogger(__name__)
 
 MAX_MSA_DEPTH: Final[int] = 16_384
 MAX_NUM_TEMPLATES: Final[int] = 4
 
+# batch inputs taken from the fields of the MSA contexts, see to_dict
+_MSA_INPUTS = dict(
+    msa_tokens="tokens",
+    msa_mask="mask",
+    msa_deletion_matrix="deletion_matrix",
+    msa_species="species",
+    msa_sequence_source="sequence_source",
+)
+_MAIN_MSA_INPUTS = dict(
+    main_msa_tokens="tokens",
+    main_msa_mask="mask",
+    main_msa_deletion_matrix="deletion_matrix",
+)
+
+
+def _context_to_device(context: Any, device: torch.device) -> Any:
+    """Copy of a context dataclass with its tensor fields on `device`."""
+    moved = {
+        field.name: value.to(device)
+        for field in dataclasses.fields(context)
+        if isinstance(value := getattr(context, field.name), Tensor)
+    }
+    return dataclasses.replace(context, **moved)
+
 
 @dataclass
 class AllAtomFeatureContext:
@@ -75,22 +104,69 @@ class AllAtomFeatureContext:
             constraint_context=self.constraint_context.pad(max_tokens=n_tokens),
         )
 
-    def to_dict(self) -> dict[str, Any]:
-        msa_context_dict = dict(
-            msa_tokens=self.msa_context.tokens,
-            msa_mask=self.msa_context.mask,
-            msa_deletion_matrix=self.msa_context.deletion_matrix,
-            msa_species=self.msa_context.species,
-            msa_sequence_source=self.msa_context.sequence_source,
-            main_msa_tokens=self.main_msa_context.tokens,
-            main_msa_mask=self.main_msa_context.mask,
-            main_msa_deletion_matrix=self.main_msa_context.deletion_matrix,
-            paired_msa_depth=self.msa_context.paired_msa_depth,
+    def pad_spec(self, n_tokens: int, n_atoms: int) -> dict[str, PadSpec]:
+        """
+        Padded shape and pad value of the batch inputs `pad` pads, keyed as in
+        `to_dict`. Inputs missing here are unchanged by padding.
+        """
+        msa_specs = self.msa_context.pad_spec(
+            max_num_tokens=n_tokens, max_msa_depth=MAX_MSA_DEPTH
+        )
+        main_msa_specs = self.main_msa_context.pad_spec(
+            max_num_tokens=n_tokens, max_msa_depth=MAX_MSA_DEPTH
         )
         return {
+            **self.structure_context.pad_spec(n_tokens=n_tokens, n_atoms=n_atoms),
+            **{key: msa_specs[field] for key, field in _MSA_INPUTS.items()},
+            **{key: main_msa_specs[field] for key, field in _MAIN_MSA_INPUTS.items()},
+            **self.template_context.pad_spec(
+                max_tokens=n_tokens, max_templates=MAX_NUM_TEMPLATES
+            ),
+            **(
+                self.embedding_context.pad_spec(max_tokens=n_tokens)
+                if self.embedding_context is not None
+                else {}
+            ),
+        }
+
+    def to(self, device: torch.device) -> "AllAtomFeatureContext":
+        """Copy with the (unpadded) contexts on `device`."""
+        return AllAtomFeatureContext(
+            chains=self.chains,
+            structure_context=_context_to_device(self.structure_context, device),
+            msa_context=_context_to_device(self.msa_context, device),
+            main_msa_context=_context_to_device(self.main_msa_context, device),
+            template_context=_context_to_device(self.template_context, device),
+            embedding_context=(
+                _context_to_device(self.embedding_context, device)
+                if self.embedding_context is not None
+                else None
+            ),
+            # constraints hold no tensors
+            constraint_context=self.constraint_context,
+        )
+
+    def to_dict(self, keys: Collection[str] | None = None) -> dict[str, Any]:
+        """Batch inputs of this context; with `keys`, only those."""
+        msa_context_dict = {
+            **{
+                key: getattr(self.msa_context, field)
+                for key, field in _MSA_INPUTS.items()
+            },
+            **{
+                key: getattr(self.main_msa_context, field)
+                for key, field in _MAIN_MSA_INPUTS.items()
+            },
+        }
+        if keys is None or "paired_msa_depth" in keys:
+            msa_context_dict["paired_msa_depth"] = self.msa_context.paired_msa_depth
+        inputs = {
             **self.structure_context.to_dict(),
             **msa_context_dict,
             **self.template_context.to_dict(),
             **(self.embedding_context.to_dict() if self.embedding_context else {}),
             **self.constraint_context.to_dict(),
         }
+        if keys is None:
+            return inputs
+        return {k: v for k, v in inputs.items() if k in keys}
@@ -2,11 +2,12 @@
 # This source code is licensed under the Chai Discovery Community License
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, fields
 
 import torch
 from torch import Tensor
 
+from chai_lab.utils.tensor_utils import PadSpec, pad_to_spec
 from chai_lab.utils.typing import Float, typecheck
 
 
@@ -25,24 +26,19 @@ class EmbeddingContext:
         (num_tokens, _) = self.esm_embeddings.shape
         return num_tokens
 
-    def pad(self, max_tokens: int) -> "EmbeddingContext":
+    def pad_spec(self, max_tokens: int) -> dict[str, PadSpec]:
         assert self.num_tokens <= max_tokens
+        (_, d_emb) = self.esm_embeddings.shape
+        return dict(esm_embeddings=PadSpec((max_tokens, d_emb), 0))
 
-        pad_dims_token = (0, max_tokens - self.num_tokens)
-        pad_dims_emb = (0, 0)
-
-        padded_embeddings = torch.nn.functional.pad(
-            self.esm_embeddings,
-            pad_dims_emb + pad_dims_token,
-            value=0,
-        )
-
+    def pad(self, max_tokens: int) -> "EmbeddingContext":
+        specs = self.pad_spec(max_tokens)
         return EmbeddingContext(
-            esm_embeddings=padded_embeddings,
+            esm_embeddings=pad_to_spec(self.esm_embeddings, specs["esm_embeddings"]),
         )
 
     def to_dict(self) -> dict[str, torch.Tensor]:
-        return asdict(self)
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
     @classmethod
     def empty(cls, n_tokens: int, d_emb: int = 2560) -> "EmbeddingContext":
@@ -3,12 +3,16 @@
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
 import logging
+import multiprocessing
 import string
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import Hashable
 
 import gemmi
+import torch
 
 from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
     AllAtomResidueTokenizer,
@@ -18,6 +22,7 @@ from chai_lab.data.dataset.structure.all_atom_structure_context import (
     AllAtomStructureContext,
 )
 from chai_lab.data.dataset.structure.chain import Chain
+from chai_lab.data.dataset.structure.entity_cache import EntityCache
 from chai_lab.data.parsing.fasta import get_residue_name, read_fasta
 from chai_lab.data.parsing.input_validation import (
     constituents_of_modified_fasta,
@@ -155,9 +160,16 @@ def load_chains_from_raw(
     inputs: list[Input],
     identifier: str = "test",
     tokenizer: AllAtomResidueTokenizer | None = None,
+    entity_cache: EntityCache | None = None,
+    tokenizer_pool: Executor | None = None,
 ) -> list[Chain]:
     """
     loads and tokenizes each input chain
+
+    Entities found in `entity_cache` are copied from it rather than tokenized, and
+    newly tokenized ones are added to it. With a `tokenizer_pool` (see
+    `make_tokenizer_pool`), distinct entities are tokenized concurrently by its
+    workers, with their own tokenizers, rather than by `tokenizer`.
     """
 
     if tokenizer is None:
@@ -173,15 +185,46 @@ def load_chains_from_raw(
     # Tokenize the entity data
     structure_contexts: list[AllAtomStructureContext | None] = []
     sym_ids = _make_sym_ids([x.entity_id for x in entities])
-    for entity_data, sym_id in zip(entities, sym_ids):
+    # copies of an entity (e.g. homo-oligomers) are tokenized once
+    tokenized_copies: dict[Hashable, AllAtomStructureContext] = {}
+    # chain index -> tokenization in the pool, numbered as chain 1
+    pooled: dict[int, Future[AllAtomStructureContext | None]] = {}
+    if tokenizer_pool is not None:
+        pooled = _submit_distinct_entities(tokenizer_pool, entities, entity_cache)
+    for i, (entity_data, sym_id) in enumerate(zip(entities, sym_ids)):
         # chain index should not count null contexts that result from failed tokenization
         chain_index = sum(ctx is not None for ctx in structure_contexts) + 1
+        copy_key = tokenizer.copy_key(entity_data)
+        tok: AllAtomStructureContext | None
         try:
-            tok = tokenizer._tokenize_entity(
-                entity_data,
-                chain_id=chain_index,
-                sym_id=sym_id,
-            )
+            tokenized = tokenized_copies.get(copy_key)
+            if tokenized is None and entity_cache is not None:
+                tokenized = entity_cache.get(entity_data)
+            if tokenized is not None:
+                tok = tokenizer.tokenize_copy(
+                    tokenized,
+                    entity_data,
+                    chain_id=chain_index,
+                    sym_id=sym_id,
+                )
+            else:
+                if i in pooled:
+                    # raises the worker's exception, if any
+                    tok = pooled[i].result()
+                    if tok is not None:
+                        tok = tokenizer.renumber(
+                            tok, entity_data, chain_id=chain_index, sym_id=sym_id
+                        )
+                else:
+                    tok = tokenizer._tokenize_entity(
+                        entity_data,
+                        chain_id=chain_index,
+                        sym_id=sym_id,
+                    )
+                if tok is not None and entity_cache is not None:
+                    entity_cache.put(entity_data, tok)
+            if copy_key is not None and tok is not None:
+                tokenized_copies[copy_key] = tok
         except Exception:
             logger.exception(f"Failed to tokenize input {entity_data=}  {sym_id=}")
             tok = None
@@ -198,6 +241,64 @@ def load_chains_from_raw(
     return chains
 
 
+_worker_tokenizer: AllAtomResidueTokenizer | None = None
+
+
+def _init_tokenizer_worker(start_method: str):
+    global _worker_tokenizer
+    # spawned workers default to spawning, chai_lab.utils.timeout (used by the
+    # conformer generator) needs the parent's start method
+    multiprocessing.set_start_method(start_method, force=True)
+    # workers run side by side, one intra-op thread each does not oversubscribe
+    torch.set_num_threads(1)
+    # spawned workers all start from torch's default seed, do not augment
+    # reference conformers identically
+    torch.seed()
+    _worker_tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+
+
+def _tokenize_in_worker(
+    entity_data: AllAtomEntityData,
+) -> AllAtomStructureContext | None:
+    assert _worker_tokenizer is not None
+    return _worker_tokenizer._tokenize_entity(entity_data)
+
+
+def make_tokenizer_pool(num_workers: int) -> ProcessPoolExecutor:
+    """
+    Processes that tokenize chains for `load_chains_from_raw`, e.g. ligands, which
+    spend most of their time in RDKit. Each worker loads the reference conformer
+    library when it starts, so keep the pool for many jobs.
+    """
+    return ProcessPoolExecutor(
+        max_workers=num_workers,
+        # forking a process with torch or server threads running is unsafe
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_tokenizer_worker,
+        initargs=(multiprocessing.get_start_method(),),
+    )
+
+
+def _submit_distinct_entities(
+    pool: Executor,
+    entities: list[AllAtomEntityData],
+    entity_cache: EntityCache | None,
+) -> dict[int, Future[AllAtomStructureContext | None]]:
+    """Tokenizes the first chain of each entity that is not cached."""
+    futures = {}
+    submitted: set[Hashable] = set()
+    for i, entity_data in enumerate(entities):
+        copy_key = AllAtomResidueTokenizer.copy_key(entity_data)
+        if copy_key is not None:
+            if copy_key in submitted:
+                continue
+            submitted.add(copy_key)
+            if entity_cache is not None and entity_cache.get(entity_data) is not None:
+                continue
+        futures[i] = pool.submit(_tokenize_in_worker, entity_data)
+    return futures
+
+
 def read_inputs(fasta_file: str | Path, length_limit: int | None = None) -> list[Input]:
     """Read inputs from a fasta file.
 
@@ -15,6 +15,7 @@ from chai_lab.data.parsing.msas.data_source import (
 from chai_lab.data.parsing.msas.species import UNKNOWN_SPECIES
 from chai_lab.data.residue_constants import residue_types_with_nucleotides_order
 from chai_lab.utils.defaults import default
+from chai_lab.utils.tensor_utils import PadSpec, pad_to_spec
 from chai_lab.utils.typing import Bool, Int32, UInt8, typecheck
 
 
@@ -75,50 +76,42 @@ class MSAContext:
             is_paired_mask=is_paired_mask[subscript].any(dim=-1),
         )
 
-    def pad(
+    def pad_spec(
         self,
         max_num_tokens: int | None = None,
         max_msa_depth: int | None = None,
-    ) -> "MSAContext":
+    ) -> dict[str, PadSpec]:
+        """Padded shape and pad value of each tensor field, see `pad`."""
         max_num_tokens = default(max_num_tokens, self.num_tokens)
         assert self.num_tokens <= max_num_tokens
 
         max_msa_depth = default(max_msa_depth, self.depth)
         assert self.depth <= max_msa_depth
 
-        pad_dims = (0, max_num_tokens - self.num_tokens, 0, max_msa_depth - self.depth)
+        dims = (max_msa_depth, max_num_tokens)
+        return dict(
+            tokens=PadSpec(dims, residue_types_with_nucleotides_order[":"]),
+            species=PadSpec(dims, UNKNOWN_SPECIES),
+            deletion_matrix=PadSpec(dims, 0),  # No deletions
+            mask=PadSpec(dims, False),
+            sequence_source=PadSpec(
+                dims, msa_dataset_source_to_int[MSADataSource.NONE]
+            ),
+            is_paired_mask=PadSpec((max_msa_depth,), False),
+        )
+
+    def pad(
+        self,
+        max_num_tokens: int | None = None,
+        max_msa_depth: int | None = None,
+    ) -> "MSAContext":
+        specs = self.pad_spec(max_num_tokens, max_msa_depth)
         return MSAContext(
             dataset_source=self.dataset_source,
-            tokens=torch.nn.functional.pad(
-                self.tokens,
-                pad_dims,
-                value=residue_types_with_nucleotides_order[":"],
-            ),
-            species=torch.nn.functional.pad(
-                self.species,
-                pad_dims,
-                value=UNKNOWN_SPECIES,
-            ),
-            deletion_matrix=torch.nn.functional.pad(
-                self.deletion_matrix,
-                pad_dims,
-                value=0,  # No deletions
-            ),
-            mask=torch.nn.functional.pad(
-                self.mask,
-                pad_dims,
-                value=False,
-            ),
-            sequence_source=torch.nn.functional.pad(
-                self.sequence_source,
-                pad_dims,
-                value=msa_dataset_source_to_int[MSADataSource.NONE],
-            ),
-            is_paired_mask=torch.nn.functional.pad(
-                self.is_paired_mask,
-                (0, max_msa_depth - self.depth),
-                value=False,
-            ),
+            **{
+                name: pad_to_spec(getattr(self, name), spec)
+                for name, spec in specs.items()
+            },
         )
 
     @typecheck
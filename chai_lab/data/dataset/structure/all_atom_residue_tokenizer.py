@@ -3,8 +3,10 @@
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from enum import Enum
 from itertools import chain
+from typing import Any, Hashable
 
 import torch
 from einops import repeat
@@ -26,13 +28,29 @@ from chai_lab.data.parsing.structure.residue import ConformerData, Residue
 from chai_lab.data.residue_constants import standard_residue_pdb_codes
 from chai_lab.data.sources.rdkit import (
     RefConformerGenerator,
+    canonical_smiles,
     conformer_data_to_rdkit_mol,
 )
+from chai_lab.model.utils import center_random_augmentation
 from chai_lab.utils.tensor_utils import string_to_tensorcode, unique_indexes
 from chai_lab.utils.typing import Bool, Float, Int, typecheck
 
 logger = logging.getLogger(__name__)
 
+# bump when tokenization changes its output, invalidates entity_cache entries
+TOKENIZER_VERSION = 1
+
+
+class _RefConformerSource(Enum):
+    """Where _get_ref_conformer_data takes the reference conformer of a residue from."""
+
+    # conformer library of the generator, by residue name
+    LIBRARY = "library"
+    # generated from the residue's smiles
+    SMILES = "smiles"
+    # the residue's ground truth coordinates
+    GROUND_TRUTH = "ground_truth"
+
 
 # jaxtyping on residue-level objects is extremely slow.
 @dataclass(frozen=True)
@@ -138,11 +156,150 @@ class AllAtomResidueTokenizer:
 
     def __init__(self, ref_conformer_generator: RefConformerGenerator):
         self.ref_conformer_generator = ref_conformer_generator
+        # residue name -> span of a standard residue without ground truth coordinates,
+        # see tokenize_residue
+        self._residue_templates: dict[str, TokenSpan] = {}
+        # names of residues with augmented conformers, logged once each
+        self._augmented_residue_names: set[str] = set()
 
     def tokenize_residue(
         self,
         residue: Residue,
         entity_type: EntityType,
+    ) -> TokenSpan | None:
+        """
+        Tokenizes a residue. Spans of standard residues without ground truth
+        coordinates share all tensors but restype, residue_index and
+        b_factor_or_plddt; do not modify them in place.
+        """
+        template = self._residue_template(residue, entity_type)
+        if template is None:
+            return self._tokenize_residue(residue, entity_type)
+        return replace(
+            template,
+            restype=torch.tensor([residue.restype], dtype=torch.int),
+            residue_index=torch.tensor([residue.residue_index], dtype=torch.int),
+            b_factor_or_plddt=torch.tensor([residue.b_factor_or_plddt]),
+        )
+
+    def _residue_template(
+        self,
+        residue: Residue,
+        entity_type: EntityType,
+    ) -> TokenSpan | None:
+        """
+        Span shared by the residues named like this one, if it is a standard
+        residue without ground truth coordinates; None for other residues.
+        """
+        if not (
+            residue.conformer_data is None
+            and residue.name in standard_residue_pdb_codes
+            and entity_type != EntityType.LIGAND
+        ):
+            return None
+
+        template = self._residue_templates.get(residue.name)
+        # otherwise the span only depends on the residue name: the cached
+        # reference conformers of standard residues are not augmented
+        ref_conformer = self.ref_conformer_generator.get(residue.name)
+        if template is None and ref_conformer is not None:
+            template = self._tokenize_residue(residue, entity_type)
+            if template is not None:
+                self._residue_templates[residue.name] = template
+        return template
+
+    def _tokenize_standard_residues(
+        self,
+        residues: list[Residue],
+        entity_type: EntityType,
+    ) -> TokenSpan | None:
+        """
+        Equivalent to concatenating the spans of `residues`, when all of them have
+        a template (see `_residue_template`): the chain's token and atom tensors
+        are gathered from the templates with whole-chain index arithmetic.
+        None if any residue has no template.
+        """
+        template_indices: dict[str, int] = {}
+        templates: list[TokenSpan] = []
+        for residue in residues:
+            if residue.name not in template_indices:
+                template = self._residue_template(residue, entity_type)
+                if template is None:
+                    return None
+                template_indices[residue.name] = len(templates)
+                templates.append(template)
+        if len(templates) == 0:
+            return None
+        # per-residue tokenization, one token per template
+        assert all(t.restype.shape == (1,) for t in templates)
+
+        # residue -> template, and each atom of the chain -> atom of the templates
+        kind = torch.tensor([template_indices[r.name] for r in residues])
+        atoms_per_template = torch.tensor([t.ref_pos.shape[0] for t in templates])
+        atoms_per_residue = atoms_per_template[kind]
+        residue_atom_offsets = _exclusive_cumsum(atoms_per_residue)
+        atom_residue = torch.repeat_interleave(
+            torch.arange(len(residues)), atoms_per_residue
+        )
+        atom_source = (
+            _exclusive_cumsum(atoms_per_template)[kind][atom_residue]
+            + torch.arange(atom_residue.shape[0])
+            - residue_atom_offsets[atom_residue]
+        )
+
+        def per_atom(name: str) -> Tensor:
+            return torch.cat([getattr(t, name) for t in templates])[atom_source]
+
+        def per_token(name: str) -> Tensor:
+            return torch.cat([getattr(t, name) for t in templates])[kind]
+
+        def atom_index_per_token(name: str) -> Tensor:
+            # template atom indices, offset by the first atom of each residue
+            index = per_token(name)
+            offsets = residue_atom_offsets.to(index.dtype)
+            return index + (offsets if index.ndim == 1 else offsets.unsqueeze(-1))
+
+        max_symms = max(t.symmetries.shape[-1] for t in templates)
+        symmetries = torch.cat(
+            [
+                torch.nn.functional.pad(
+                    t.symmetries, (0, max_symms - t.symmetries.shape[-1]), value=-1
+                )
+                for t in templates
+            ]
+        )[atom_source]
+
+        return TokenSpan(
+            restype=torch.tensor([r.restype for r in residues], dtype=torch.int),
+            residue_index=torch.tensor(
+                [r.residue_index for r in residues], dtype=torch.int
+            ),
+            centre_atom_index=atom_index_per_token("centre_atom_index"),
+            reference_atom_index=atom_index_per_token("reference_atom_index"),
+            backbone_frame_mask=per_token("backbone_frame_mask"),
+            backbone_frame_index=atom_index_per_token("backbone_frame_index"),
+            atom_gt_coords=per_atom("atom_gt_coords"),
+            atom_exists_mask=per_atom("atom_exists_mask"),
+            atom_token_index=atom_residue.to(torch.int),
+            ref_pos=per_atom("ref_pos"),
+            ref_mask=per_atom("ref_mask"),
+            ref_element=per_atom("ref_element"),
+            ref_charge=per_atom("ref_charge"),
+            atom_names=list(
+                chain.from_iterable(
+                    templates[template_indices[r.name]].atom_names for r in residues
+                )
+            ),
+            atom_within_token_indices=per_atom("atom_within_token_indices"),
+            residue_names=[r.name for r in residues],
+            symmetries=symmetries,
+            b_factor_or_plddt=torch.tensor([r.b_factor_or_plddt for r in residues]),
+        )
+
+    def _tokenize_residue(
+        self,
+        residue: Residue,
+        entity_type: EntityType,
     ) -> TokenSpan | None:
         ref_conformer_data = self._get_ref_conformer_data(residue)
         if ref_conformer_data.num_atoms == 0:
@@ -378,24 +535,27 @@ class AllAtomResidueTokenizer:
         chain_id: int = 1,
         sym_id: int = 1,
     ) -> AllAtomStructureContext | None:
-        tokenized_residues = [
-            self.tokenize_residue(residue, entity_data.entity_type)
-            for residue in entity_data.residues
-        ]
+        tokens = self._tokenize_standard_residues(
+            entity_data.residues, entity_data.entity_type
+        )
+        if tokens is None:
+            tokenized_residues = [
+                self.tokenize_residue(residue, entity_data.entity_type)
+                for residue in entity_data.residues
+            ]
 
-        valid_residues = [x for x in tokenized_residues if x is not None]
-        if len(valid_residues) == 0:
-            return None
+            valid_residues = [x for x in tokenized_residues if x is not None]
+            if len(valid_residues) == 0:
+                return None
 
-        tokens = TokenSpan.concatenate(valid_residues)
+            tokens = TokenSpan.concatenate(valid_residues)
 
         num_tokens = tokens.restype.shape[0]
         token_index = torch.arange(num_tokens, dtype=torch.int)
 
         # mask indicating if a token has >=1 atom with known coordinates
-        token_exists_mask = (tokens.atom_token_index == token_index[..., None]).sum(
-            dim=-1
-        ) > 0
+        token_exists_mask = torch.zeros(num_tokens, dtype=torch.bool)
+        token_exists_mask[tokens.atom_token_index.long()] = True
 
         # checks on atom mask and positions:
         # max 1 atom per-example has zero coordinates
@@ -409,9 +569,8 @@ class AllAtomResidueTokenizer:
                 f"Zero coordinates found in unmasked atoms for {entity_data.pdb_id}"
             )
 
-        # construct asym_id, entity_id, sym_id
+        # construct asym_id
         asym_id = chain_id
-        entity_id = entity_data.entity_id
 
         # Create unique ids to identify atoms which belong to same residue in same chain
         # here assume we featurize a single chain
@@ -438,7 +597,7 @@ class AllAtomResidueTokenizer:
                     )
 
                 _, unique_indices = unique_indexes(tokens.residue_index)
-                res_seq = [residue_names[i.item()] for i in unique_indices]
+                res_seq = [residue_names[i] for i in unique_indices.tolist()]
                 if res_seq != entity_data.full_sequence:
                     logger.error(
                         f"Protein residue names should match entity data full sequence, {entity_data}"
@@ -454,18 +613,12 @@ class AllAtomResidueTokenizer:
             token_exists_mask=token_exists_mask,
             token_backbone_frame_mask=tokens.backbone_frame_mask,
             token_backbone_frame_index=tokens.backbone_frame_index,
-            token_asym_id=_id_to_token_tensor(asym_id, num_tokens),
-            token_entity_id=_id_to_token_tensor(entity_id, num_tokens),
-            token_sym_id=_id_to_token_tensor(sym_id, num_tokens),
             token_entity_type=entity_type_to_tensor(
                 entity_data.entity_type,
                 num_tokens,
             ),
             # token res name is padded to 8 characters
-            token_residue_name=torch.stack(
-                [string_to_tensorcode(x, 8) for x in residue_names],
-                dim=0,
-            ),
+            token_residue_name=_residue_names_to_tensor(residue_names),
             token_b_factor_or_plddt=tokens.b_factor_or_plddt,
             # atom-level
             atom_token_index=tokens.atom_token_index,
@@ -484,34 +637,100 @@ class AllAtomResidueTokenizer:
             # supervision only
             atom_gt_coords=tokens.atom_gt_coords,
             atom_exists_mask=tokens.atom_exists_mask,
-            # structure-only
-            pdb_id=repeat(
-                # PDB ids are only 4 characters long, but AFDB ids can be longer
-                string_to_tensorcode(entity_data.pdb_id, pad_to_length=32),
-                "length -> num_tokens length",
-                num_tokens=num_tokens,
-            ),
-            source_pdb_chain_id=repeat(
-                string_to_tensorcode(entity_data.source_pdb_chain_id, pad_to_length=4),
-                "length -> num_tokens length",
-                num_tokens=num_tokens,
-            ),
-            subchain_id=repeat(
-                string_to_tensorcode(entity_data.subchain_id, pad_to_length=4),
-                "length -> num_tokens length",
-                num_tokens=num_tokens,
-            ),
-            resolution=torch.tensor(
-                [entity_data.resolution],
-                dtype=torch.float32,
-            ),
-            is_distillation=torch.tensor(
-                [entity_data.is_distillation],
-                dtype=torch.bool,
-            ),
             symmetries=tokens.symmetries,
+            # chain ids and structure-only
+            **_chain_level_fields(entity_data, asym_id, sym_id, num_tokens),
         )
 
+    @staticmethod
+    def copy_key(entity_data: AllAtomEntityData) -> Hashable | None:
+        """
+        Chains with equal keys tokenize to the same tensors up to their ids and the
+        augmentation of their reference conformers, see `tokenize_copy`. None for
+        chains with ground truth coordinates, which are specific to each chain.
+        SMILES are compared in canonical form: spellings of the same ligand share the
+        context, and so the atom order, of the first one tokenized.
+        """
+        if any(r.conformer_data is not None for r in entity_data.residues):
+            return None
+        return entity_data.entity_type, tuple(
+            (
+                r.name,
+                canonical_smiles(r.smiles) if r.smiles is not None else None,
+                r.restype,
+                r.residue_index,
+                r.is_missing,
+                r.b_factor_or_plddt,
+            )
+            for r in entity_data.residues
+        )
+
+    def tokenize_copy(
+        self,
+        tokenized: AllAtomStructureContext,
+        entity_data: AllAtomEntityData,
+        chain_id: int,
+        sym_id: int,
+    ) -> AllAtomStructureContext:
+        """
+        Tokenizes `entity_data` from `tokenized`, the context of a chain with the same
+        `copy_key`: tensors are shared with it, but for the chain-level fields and the
+        reference positions of residues whose reference conformer is randomly
+        augmented, which are augmented again for this chain.
+        """
+        ref_pos = tokenized.atom_ref_pos
+        augmented = [
+            r.residue_index for r in entity_data.residues if self._is_augmented(r)
+        ]
+        if len(augmented) > 0:
+            ref_pos = ref_pos.clone()
+            for residue_index in augmented:
+                # all atoms of the reference conformer are kept, see _tokenize_residue
+                atoms = tokenized.atom_ref_space_uid == residue_index
+                ref_pos[atoms] = center_random_augmentation(
+                    ref_pos[atoms].unsqueeze(0),
+                    torch.ones_like(atoms[atoms]).unsqueeze(0),
+                )[0]
+
+        return replace(
+            tokenized,
+            atom_ref_pos=ref_pos,
+            # without ground truth, coordinates are those of the reference conformers
+            atom_gt_coords=ref_pos,
+            **_chain_level_fields(entity_data, chain_id, sym_id, tokenized.num_tokens),
+        )
+
+    @staticmethod
+    def renumber(
+        context: AllAtomStructureContext,
+        entity_data: AllAtomEntityData,
+        chain_id: int,
+        sym_id: int,
+    ) -> AllAtomStructureContext:
+        """`context` of `entity_data`, tokenized with other chain ids, with these ones."""
+        return replace(
+            context,
+            **_chain_level_fields(entity_data, chain_id, sym_id, context.num_tokens),
+        )
+
+    def _ref_conformer_source(self, residue: Residue) -> _RefConformerSource:
+        if self.ref_conformer_generator.get(residue.name) is not None:
+            return _RefConformerSource.LIBRARY
+        if residue.smiles is not None:
+            return _RefConformerSource.SMILES
+        return _RefConformerSource.GROUND_TRUTH
+
+    def _is_augmented(self, residue: Residue) -> bool:
+        """Whether _get_ref_conformer_data randomly augments the residue's conformer."""
+        match self._ref_conformer_source(residue):
+            case _RefConformerSource.LIBRARY:
+                return residue.name not in standard_residue_pdb_codes
+            case _RefConformerSource.SMILES:
+                # conformers generated from smiles are seeded
+                return False
+            case _RefConformerSource.GROUND_TRUTH:
+                return True
+
     def _get_ref_conformer_data(self, residue: Residue) -> ConformerData:
         """
         Returns the reference conformer data for the residue. We determine the reference
@@ -531,24 +750,35 @@ class AllAtomResidueTokenizer:
         # - which atoms we should expect in this ligand / residue, and how many of them
         # - what are the ideal coordinates of these atoms if the ligand or residue was
         #   assembled alone in the void
-        ref_conformer = self.ref_conformer_generator.get(residue.name)
-
-        if ref_conformer is not None:
-            if residue.name in standard_residue_pdb_codes:
-                return ref_conformer
-            else:
-                return ref_conformer.center_random_augment()
-
-        # When we can't find a reference conformer, and a smiles is given,
-        # generate a reference conformer using rdkit
-        if residue.smiles is not None:
-            logger.info(
-                f"Generating ref conformer for {residue.name}, {residue.smiles}"
-            )
-            return self.ref_conformer_generator.generate(residue.smiles)
-
-        # When we can't find a reference conformer, attempt to use the ground
-        # truth conformer data as the reference conformer.
+        match self._ref_conformer_source(residue):
+            case _RefConformerSource.LIBRARY:
+                ref_conformer = self.ref_conformer_generator.get(residue.name)
+                assert ref_conformer is not None
+            case _RefConformerSource.SMILES:
+                # When we can't find a reference conformer, and a smiles is given,
+                # generate a reference conformer using rdkit
+                assert residue.smiles is not None
+                logger.info(
+                    f"Generating ref conformer for {residue.name}, {residue.smiles}"
+                )
+                ref_conformer = self.ref_conformer_generator.generate(residue.smiles)
+            case _RefConformerSource.GROUND_TRUTH:
+                # When we can't find a reference conformer, attempt to use the
+                # ground truth conformer data as the reference conformer.
+                ref_conformer = self._ground_truth_conformer(residue)
+
+        if self._is_augmented(residue):
+            if residue.name not in self._augmented_residue_names:
+                self._augmented_residue_names.add(residue.name)
+                logger.info(
+                    f"Reference conformer of {residue.name} is randomly augmented, "
+                    "features of inputs with it differ between runs and never hit "
+                    "a trunk cache"
+                )
+            return ref_conformer.center_random_augment()
+        return ref_conformer
+
+    def _ground_truth_conformer(self, residue: Residue) -> ConformerData:
         logger.warning(
             f"No reference conformer found for residue {residue.name},"
             "using training example conformer"
@@ -561,9 +791,7 @@ class AllAtomResidueTokenizer:
             # back into a conformer data so that we can extract inter-atom aymmetries
             # bond and info
             rdkit_mol = conformer_data_to_rdkit_mol(residue.conformer_data)
-            gt_conformer = RefConformerGenerator._load_ref_conformer_from_rdkit(
-                rdkit_mol
-            )
+            return RefConformerGenerator._load_ref_conformer_from_rdkit(rdkit_mol)
         except Exception as e:
             # Occasionally _load_ref_conformer_from_rdkit fails on unknown ligands e.g.
             # rdkit.Chem.rdchem.AtomValenceException's can be raised or ValueError:
@@ -572,18 +800,67 @@ class AllAtomResidueTokenizer:
                 f"Caught error for {residue.name=} while loading reference conformer "
                 f"from RDKit, {(type(e).__name__)}. Using ground truth conformer instead."
             )
-            gt_conformer = residue.conformer_data
-
-        return gt_conformer.center_random_augment()
+            return residue.conformer_data
 
 
 @typecheck
 def _atom_names_to_tensor(atom_names: list[str]) -> Int[Tensor, "n_atoms 4"]:
+    # chains repeat few distinct names, encode each once
+    unique_names = {name: i for i, name in enumerate(dict.fromkeys(atom_names))}
     ords = torch.tensor(
-        [[ord(c) - 32 for c in atom_name.ljust(4, " ")] for atom_name in atom_names],
+        [[ord(c) - 32 for c in atom_name.ljust(4, " ")] for atom_name in unique_names],
         dtype=torch.int,
     )
-    return ords[:, :4]
+    index = torch.tensor([unique_names[name] for name in atom_names])
+    return ords[index, :4]
+
+
+def _residue_names_to_tensor(residue_names: list[str]) -> Tensor:
+    unique_names = {name: i for i, name in enumerate(dict.fromkeys(residue_names))}
+    codes = torch.stack([string_to_tensorcode(x, 8) for x in unique_names], dim=0)
+    index = torch.tensor([unique_names[name] for name in residue_names])
+    return codes[index]
+
+
+def _exclusive_cumsum(x: Tensor) -> Tensor:
+    return torch.cumsum(x, dim=0) - x
+
+
+def _chain_level_fields(
+    entity_data: AllAtomEntityData,
+    asym_id: int,
+    sym_id: int,
+    num_tokens: int,
+) -> dict[str, Any]:
+    return dict(
+        token_asym_id=_id_to_token_tensor(asym_id, num_tokens),
+        token_entity_id=_id_to_token_tensor(entity_data.entity_id, num_tokens),
+        token_sym_id=_id_to_token_tensor(sym_id, num_tokens),
+        pdb_id=repeat(
+            # PDB ids are only 4 characters long, but AFDB ids can be longer
+            string_to_tensorcode(entity_data.pdb_id, pad_to_length=32),
+            "length -> num_tokens length",
+            num_tokens=num_tokens,
+        ),
+        source_pdb_chain_id=repeat(
+            string_to_tensorcode(entity_data.source_pdb_chain_id, pad_to_length=4),
+            "length -> num_tokens length",
+            num_tokens=num_tokens,
+        ),
+        subchain_id=repeat(
+            string_to_tensorcode(entity_data.subchain_id, pad_to_length=4),
+            "length -> num_tokens length",
+            num_tokens=num_tokens,
+        ),
+        resolution=torch.tensor(
+            [entity_data.resolution],
+            dtype=torch.float32,
+        ),
+        is_distillation=torch.tensor(
+            [entity_data.is_distillation],
+            dtype=torch.bool,
+        ),
+    )
 
 
 @typecheck
@@ -3,14 +3,17 @@
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
 import logging
-from dataclasses import asdict, dataclass
-from functools import cached_property, partial
+from dataclasses import asdict, dataclass, fields, replace
+from functools import cached_property
+from typing import Any
 
 import torch
 from torch import Tensor
 
 from chai_lab.utils.tensor_utils import (
+    PadSpec,
     batch_tensorcode_to_string,
+    pad_to_spec,
     tensorcode_to_string,
 )
 from chai_lab.utils.typing import Bool, Float, Int, UInt8, typecheck
@@ -86,63 +89,32 @@ class AllAtomStructureContext:
     def residue_names(self) -> list[str]:
         return batch_tensorcode_to_string(self.token_residue_name)
 
+    def pad_spec(self, n_tokens: int, n_atoms: int) -> dict[str, PadSpec]:
+        """
+        Padded shape and pad value of each padded field, see `pad`. Token- and
+        atom-level fields are padded along their first dimension.
+        """
+        assert n_tokens >= self.num_tokens
+        assert n_atoms >= self.num_atoms
+
+        specs = {}
+        for name in _TOKEN_LEVEL_FIELDS + _ATOM_LEVEL_FIELDS:
+            x = getattr(self, name)
+            n = n_tokens if name in _TOKEN_LEVEL_FIELDS else n_atoms
+            specs[name] = PadSpec((n, *x.shape[1:]), _PAD_VALUES.get(name, 0))
+        return specs
+
     def pad(
         self,
         n_tokens: int,
         n_atoms: int,
     ) -> "AllAtomStructureContext":
-        assert n_tokens >= self.num_tokens
-        pad_tokens_func = partial(_pad_func, pad_size=n_tokens - self.num_tokens)
-
-        assert n_atoms >= self.num_atoms
-        pad_atoms_func = partial(_pad_func, pad_size=n_atoms - self.num_atoms)
-
-        return AllAtomStructureContext(
-            # token-level
-            token_residue_type=pad_tokens_func(self.token_residue_type),
-            token_residue_index=pad_tokens_func(self.token_residue_index),
-            token_index=pad_tokens_func(self.token_index),
-            token_centre_atom_index=pad_tokens_func(self.token_centre_atom_index),
-            token_ref_atom_index=pad_tokens_func(self.token_ref_atom_index),
-            token_exists_mask=pad_tokens_func(self.token_exists_mask),
-            token_backbone_frame_mask=pad_tokens_func(self.token_backbone_frame_mask),
-            token_backbone_frame_index=torch.cat(
-                [
-                    pad_tokens_func(self.token_backbone_frame_index[..., i]).unsqueeze(
-                        -1
-                    )
-                    for i in range(3)
-                ],
-                dim=-1,
-            ),
-            token_asym_id=pad_tokens_func(self.token_asym_id),
-            token_entity_id=pad_tokens_func(self.token_entity_id),
-            token_sym_id=pad_tokens_func(self.token_sym_id),
-            token_entity_type=pad_tokens_func(self.token_entity_type),
-            token_residue_name=pad_tokens_func(self.token_residue_name),
-            token_b_factor_or_plddt=pad_tokens_func(self.token_b_factor_or_plddt),
-            # atom-level
-            atom_token_index=pad_atoms_func(self.atom_token_index),
-            atom_within_token_index=pad_atoms_func(self.atom_within_token_index),
-            atom_ref_pos=pad_atoms_func(self.atom_ref_pos),
-            atom_ref_mask=pad_atoms_func(self.atom_ref_mask),
-            atom_ref_element=pad_atoms_func(self.atom_ref_element),
-            atom_ref_charge=pad_atoms_func(self.atom_ref_charge),
-            atom_ref_name=self.atom_ref_name,
-            atom_ref_name_chars=pad_atoms_func(self.atom_ref_name_chars),
-            atom_ref_space_uid=pad_atoms_func(self.atom_ref_space_uid, pad_value=-1),
-            atom_is_not_padding_mask=pad_atoms_func(self.atom_is_not_padding_mask),
-            # supervision-only
-            atom_gt_coords=pad_atoms_func(self.atom_gt_coords),
-            atom_exists_mask=pad_atoms_func(self.atom_exists_mask),
-            # structure-level
-            pdb_id=pad_tokens_func(self.pdb_id),
-            source_pdb_chain_id=pad_tokens_func(self.source_pdb_chain_id),
-            subchain_id=pad_tokens_func(self.subchain_id),
-            resolution=self.resolution,
-            is_distillation=self.is_distillation,
-            symmetries=pad_atoms_func(self.symmetries, pad_value=-1),
-        )
+        # atom_ref_name, resolution and is_distillation are kept as they are
+        padded: dict[str, Any] = {
+            name: pad_to_spec(getattr(self, name), spec)
+            for name, spec in self.pad_spec(n_tokens, n_atoms).items()
+        }
+        return replace(self, **padded)
 
     @typecheck
     @classmethod
@@ -275,12 +247,48 @@ class AllAtomStructureContext:
         return n_atoms
 
     def to_dict(self) -> dict[str, torch.Tensor]:
-        return asdict(self)
+        # shares the tensors rather than copying them (as asdict would); collation
+        # copies what it keeps as it stacks
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
 
-def _pad_func(x: Tensor, pad_size: int, pad_value: float | None = None) -> Tensor:
-    sizes = [0, 0] * (x.ndim - 1) + [0, pad_size]
-    return torch.nn.functional.pad(x, sizes, value=pad_value)
+# fields padded to the number of tokens, see AllAtomStructureContext.pad_spec
+_TOKEN_LEVEL_FIELDS = (
+    "token_residue_type",
+    "token_residue_index",
+    "token_index",
+    "token_centre_atom_index",
+    "token_ref_atom_index",
+    "token_exists_mask",
+    "token_backbone_frame_mask",
+    "token_backbone_frame_index",
+    "token_asym_id",
+    "token_entity_id",
+    "token_sym_id",
+    "token_entity_type",
+    "token_residue_name",
+    "token_b_factor_or_plddt",
+    "pdb_id",
+    "source_pdb_chain_id",
+    "subchain_id",
+)
+# fields padded to the number of atoms
+_ATOM_LEVEL_FIELDS = (
+    "atom_token_index",
+    "atom_within_token_index",
+    "atom_ref_pos",
+    "atom_ref_mask",
+    "atom_ref_element",
+    "atom_ref_charge",
+    "atom_ref_name_chars",
+    "atom_ref_space_uid",
+    "atom_is_not_padding_mask",
+    "atom_gt_coords",
+    "atom_exists_mask",
+    "symmetries",
+)
+# pad values other than 0
+_PAD_VALUES = dict(atom_ref_space_uid=-1, symmetries=-1)
 
 
 def _exclusive_cum_lengths(tensors: list[Int[Tensor, "n"]]):
@@ -0,0 +1,117 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Cache of tokenized entities, shared between jobs.
+
+The same protein is often folded with many different partners or ligands. An
+entity tokenizes to the same structure context in every job, up to its chain ids
+and the augmentation of its reference conformers, so the context of its first
+tokenization is kept and copied to later chains of the same content, see
+`AllAtomResidueTokenizer.tokenize_copy`. Entries are keyed by a hash of the
+tokenizer version and the entity's residues (names, canonical SMILES, indices);
+they are held in memory, least recently used first out, and optionally on disk.
+"""
+
+import dataclasses
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import torch
+from torch import Tensor
+
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    TOKENIZER_VERSION,
+    AllAtomResidueTokenizer,
+)
+from chai_lab.data.dataset.structure.all_atom_structure_context import (
+    AllAtomStructureContext,
+)
+from chai_lab.data.parsing.structure.all_atom_entity_data import AllAtomEntityData
+
+logger = logging.getLogger(__name__)
+
+
+class EntityCache:
+    def __init__(self, max_entries: int | None = 256, cache_dir: Path | None = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: OrderedDict[str, AllAtomStructureContext] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, entity_data: AllAtomEntityData) -> str | None:
+        """None for entities that are not cached, see `copy_key`."""
+        copy_key = AllAtomResidueTokenizer.copy_key(entity_data)
+        if copy_key is None:
+            return None
+        h = hashlib.sha256(f"v{TOKENIZER_VERSION}:{copy_key!r}".encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / f"{key}.pt"
+
+    def get(self, entity_data: AllAtomEntityData) -> AllAtomStructureContext | None:
+        """
+        Context of an earlier chain with the content of `entity_data`; its chain
+        ids are those of that chain. Shared between callers, do not modify it.
+        """
+        key = self.key(entity_data)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.cache_dir is None or not self._path(key).exists():
+            return None
+        saved: dict[str, Any] = torch.load(
+            self._path(key), map_location="cpu", weights_only=True
+        )
+        context = AllAtomStructureContext(**saved)
+        self._remember(key, context)
+        return context
+
+    def put(self, entity_data: AllAtomEntityData, context: AllAtomStructureContext):
+        key = self.key(entity_data)
+        if key is None:
+            return
+        self._remember(key, context)
+
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+        torch.save(
+            {
+                # copy views so that only their own elements are saved
+                field.name: (value.clone() if isinstance(value, Tensor) else value)
+                for field in dataclasses.fields(context)
+                for value in [getattr(context, field.name)]
+            },
+            tmp_path,
+        )
+        # atomic, concurrent writers of the same key save equivalent contexts
+        os.replace(tmp_path, path)
+
+    def _remember(self, key: str, context: AllAtomStructureContext):
+        with self._lock:
+            self._entries[key] = context
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops the entries held in memory, those on disk are kept."""
+        with self._lock:
+            self._entries.clear()
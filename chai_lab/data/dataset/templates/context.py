@@ -3,14 +3,14 @@
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
 import logging
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, fields
 
 import torch
 from torch import Tensor
-from torch.nn import functional as F
 
 from chai_lab.data import residue_constants as rc
 from chai_lab.utils.defaults import default
+from chai_lab.utils.tensor_utils import PadSpec, pad_to_spec
 from chai_lab.utils.typing import Bool, Float, Int, typecheck
 
 logger = logging.getLogger(__name__)
@@ -53,7 +53,7 @@ class TemplateContext:
         return self.template_restype != rc.residue_types_with_nucleotides_order["-"]
 
     def to_dict(self) -> dict[str, torch.Tensor]:
-        retval = asdict(self)
+        retval = {f.name: getattr(self, f.name) for f in fields(self)}
         retval.update(
             {
                 "num_templates": torch.tensor(self.num_nonnull_templates),
@@ -163,57 +163,57 @@ class TemplateContext:
     #         template_unit_vector=new_template_unit_vector,
     #     )
 
-    def pad(
+    def pad_spec(
         self,
         max_templates: int | None = None,
         max_tokens: int | None = None,
-    ) -> "TemplateContext":
-        """Pad to the given number of templates and tokens."""
+    ) -> dict[str, PadSpec]:
+        """
+        Padded shape and pad value of each tensor field, and of `template_mask`,
+        see `pad`.
+        """
         max_templates = default(max_templates, self.num_templates)
         assert (
             self.num_templates <= max_templates
         ), f"Cannot pad templates containing {self.num_templates} templates to {max_templates} templates"
-        n_pad_templates = max_templates - self.num_templates
 
         max_tokens = default(max_tokens, self.num_tokens)
         assert (
             self.num_tokens <= max_tokens
         ), f"Cannot pad templates containing {self.num_tokens} tokens to {max_tokens} tokens"
-        n_pad_tokens = max_tokens - self.num_tokens
+
+        dims = (max_templates, max_tokens)
+        return dict(
+            template_restype=PadSpec(
+                dims, rc.residue_types_with_nucleotides_order["-"]
+            ),
+            template_pseudo_beta_mask=PadSpec(dims, False),
+            template_backbone_frame_mask=PadSpec(dims, False),
+            template_distances=PadSpec((*dims, max_tokens), 0),
+            # This field has a final dimension of size 3, which we shouldn't pad
+            template_unit_vector=PadSpec((*dims, max_tokens, 3), 0),
+            # padded templates and tokens are null
+            template_mask=PadSpec(dims, False),
+        )
+
+    def pad(
+        self,
+        max_templates: int | None = None,
+        max_tokens: int | None = None,
+    ) -> "TemplateContext":
+        """Pad to the given number of templates and tokens."""
+        specs = self.pad_spec(max_templates, max_tokens)
+        n_pad_templates = specs["template_restype"].shape[0] - self.num_templates
+        n_pad_tokens = specs["template_restype"].shape[1] - self.num_tokens
 
         if n_pad_templates == 0 and n_pad_tokens == 0:  # Exact match yay
             return self
 
         logger.debug(f"Padding templates by {n_pad_templates=} {n_pad_tokens=}")
 
-        # Padding works from last dim forward in pairs of padding (left, right)
-        # - (0, n_pad_tokens) = pad nothing on left, pad by n_pad_tokens on right for
-        #   last dim
-        # - (0, 0, 0, n_pad_tokens, 0, n_pad_tokens) = pad nothing on last dim, but pad
-        #   next two dims
-        pad_dims_template = (0, n_pad_templates)
-        pad_dims_token = (0, n_pad_tokens)
         return TemplateContext(
-            template_restype=F.pad(
-                self.template_restype,
-                pad=pad_dims_token + pad_dims_template,
-                value=rc.residue_types_with_nucleotides_order["-"],
-            ),
-            template_pseudo_beta_mask=F.pad(
-                self.template_pseudo_beta_mask,
-                pad=pad_dims_token + pad_dims_template,
-            ),
-            template_backbone_frame_mask=F.pad(
-                self.template_backbone_frame_mask,
-                pad=pad_dims_token + pad_dims_template,
-            ),
-            template_distances=F.pad(
-                self.template_distances,
-                pad=pad_dims_token + pad_dims_token + pad_dims_template,
-            ),
-            template_unit_vector=F.pad(
-                self.template_unit_vector,
-                # This field has a final dimension of size 3, which we shouldn't pad
-                pad=(0, 0) + pad_dims_token + pad_dims_token + pad_dims_template,
-            ),
+            **{
+                f.name: pad_to_spec(getattr(self, f.name), specs[f.name])
+                for f in fields(self)
+            }
         )
@@ -5,22 +5,168 @@
 """Helper methods for generating model input features"""
 
 import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 from torch import Tensor
 
 from chai_lab.data.features.generators.base import FeatureGenerator
+from chai_lab.data.features.memo import FeatureMemo
+from chai_lab.utils.profiling import active_report, record_stage
 
 logger = logging.getLogger(__name__)
 
 
+def _timed_generate(
+    gen: FeatureGenerator, batch, memo: FeatureMemo
+) -> tuple[Tensor, float]:
+    start = time.perf_counter()
+    with memo.activate():
+        feature = gen.generate(batch)
+    return feature, time.perf_counter() - start
+
+
 class FeatureFactory:
+    """
+    Generates all features of a batch.
+
+    Generators are independent unless `dependencies` maps a generator's name to
+    the names of generators that must finish before it starts. By default they run
+    one at a time. With `max_workers` above one, generators run concurrently on a
+    thread pool; torch ops release the GIL. Generators that draw from the global
+    random number generators (`FeatureGenerator.draws_random`) still run one at a
+    time and in order, on the calling thread, so seeded runs draw the same numbers
+    as with a single worker. The workers share torch's intra-op threads, keep
+    `max_workers` small next to `torch.get_num_threads()`. Intermediates shared
+    between generators are computed once per call, see
+    `chai_lab.data.features.memo`.
+    """
+
     generators: dict[str, FeatureGenerator]
 
-    def __init__(self, generators: dict[str, FeatureGenerator]):
+    def __init__(
+        self,
+        generators: dict[str, FeatureGenerator],
+        dependencies: dict[str, list[str]] | None = None,
+        max_workers: int = 1,
+    ):
         self.generators = generators
+        self.dependencies = {
+            name: list(deps) for name, deps in (dependencies or {}).items()
+        }
+        self.max_workers = max_workers
+        self._order = self._topological_order()
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    def _topological_order(self) -> list[str]:
+        for name, deps in self.dependencies.items():
+            unknown = [n for n in [name, *deps] if n not in self.generators]
+            if unknown:
+                raise ValueError(
+                    f"Unknown feature generators in dependencies: {unknown}"
+                )
+
+        order: list[str] = []
+        # 0: unvisited, 1: on the current path, 2: done
+        state = {name: 0 for name in self.generators}
+
+        def visit(name: str, path: list[str]):
+            if state[name] == 2:
+                return
+            if state[name] == 1:
+                raise ValueError(f"Cyclic feature dependencies: {path + [name]}")
+            state[name] = 1
+            for dep in self.dependencies.get(name, []):
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in self.generators:
+            visit(name, [])
+        return order
+
+    @property
+    def input_keys(self) -> frozenset[str] | None:
+        """Keys of batch["inputs"] read by the generators, None if any is undeclared"""
+        keys: set[str] = set()
+        for gen in self.generators.values():
+            if gen.input_keys is None:
+                return None
+            keys.update(gen.input_keys)
+        return frozenset(keys)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="features"
+                )
+            return self._executor
 
     def generate(self, batch) -> dict[str, Tensor]:
-        return {name: gen.generate(batch) for name, gen in self.generators.items()}
+        memo = FeatureMemo()
+        if self.max_workers <= 1:
+            features = {}
+            with memo.activate():
+                for name in self._order:
+                    with record_stage(f"features/{name}"):
+                        features[name] = self.generators[name].generate(batch)
+        else:
+            features = self._generate_concurrently(batch, memo)
+        # keep the declared order, the feature embedder concatenates in it
+        return {name: features[name] for name in self.generators}
+
+    def _generate_concurrently(self, batch, memo: FeatureMemo) -> dict[str, Tensor]:
+        executor = self._get_executor()
+        remaining = {name: set(self.dependencies.get(name, [])) for name in self._order}
+        random_order = [
+            name for name in self._order if self.generators[name].draws_random
+        ]
+        running: dict[Future, str] = {}
+        features: dict[str, Tensor] = {}
+        seconds: dict[str, float] = {}
+
+        def finish(name: str, feature: Tensor, elapsed: float):
+            features[name], seconds[name] = feature, elapsed
+            for deps in remaining.values():
+                deps.discard(name)
+
+        def submit_ready():
+            for name, deps in list(remaining.items()):
+                if not deps and not self.generators[name].draws_random:
+                    del remaining[name]
+                    future = executor.submit(
+                        _timed_generate, self.generators[name], batch, memo
+                    )
+                    running[future] = name
+
+        try:
+            while remaining or running:
+                submit_ready()
+                # the next generator drawing random numbers runs here once its
+                # dependencies are done, while the others run on the pool
+                if random_order and not remaining[random_order[0]]:
+                    name = random_order.pop(0)
+                    del remaining[name]
+                    finish(name, *_timed_generate(self.generators[name], batch, memo))
+                    continue
+                # the order is topological, so what the next one waits for runs
+                assert running, remaining
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(running.pop(future), *future.result())
+        finally:
+            for future in running:
+                future.cancel()
+
+        # per-generator memory is accounted to the enclosing stage, peaks of
+        # concurrent work cannot be told apart
+        if (report := active_report()) is not None:
+            for name in self._order:
+                report.add_stage(f"features/{name}", seconds[name])
+        return features
 
     def __repr__(self) -> str:
         return f"Feature factory, {len(self.generators)=}"
@@ -11,6 +11,8 @@ from chai_lab.utils.typing import Int, typecheck
 
 
 class AtomElementOneHot(FeatureGenerator):
+    input_keys = ("atom_ref_element",)
+
     def __init__(
         self,
         max_atomic_num: int = 128,
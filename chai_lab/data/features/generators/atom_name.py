@@ -10,6 +10,8 @@ from chai_lab.utils.typing import Int, typecheck
 
 
 class AtomNameOneHot(FeatureGenerator):
+    input_keys = ("atom_ref_name_chars",)
+
     def __init__(
         self,
         num_chars: int = 64,
@@ -31,8 +31,9 @@ def cast_feature(
     match encoding_ty:
         case EncodingType.IDENTITY:
             feature = feature.float()
-            # safety check
-            assert feature.abs().max() < 100, feature
+            # safety check, without a temporary the size of the feature
+            lo, hi = torch.aminmax(feature)
+            assert max(-lo, hi) < 100, feature
             return feature
         case EncodingType.RBF | EncodingType.FOURIER:
             assert feature.dtype in (torch.float16, torch.float32, torch.bfloat16)
@@ -56,6 +57,13 @@ def cast_feature(
 
 
 class FeatureGenerator(ABC):
+    # keys of batch["inputs"] the generator reads; None if undeclared, in which case
+    # collation keeps every input
+    input_keys: tuple[str, ...] | None = None
+    # whether generate draws from the global random number generators; a feature
+    # factory runs such generators one at a time, in order, see FeatureFactory
+    draws_random: bool = False
+
     @typechecker
     def __init__(
         self,
@@ -105,9 +113,36 @@ class FeatureGenerator(ABC):
         """Get input keyword arguments to pass to _generate"""
         raise NotImplementedError("implement me")
 
+    @property
+    def index_dtype(self) -> torch.dtype:
+        """Smallest integer dtype holding every class and the mask value"""
+        for dtype in (torch.uint8, torch.int16, torch.int32):
+            if self.num_classes <= torch.iinfo(dtype).max:
+                return dtype
+        return torch.long
+
     def make_feature(self, data: Tensor) -> Tensor:
         """Checks and converts dtype if necessary"""
-        return cast_feature(data, encoding_ty=self.encoding_ty)
+        feature = cast_feature(data, encoding_ty=self.encoding_ty)
+        if self.encoding_ty in (EncodingType.ONE_HOT, EncodingType.OUTERSUM):
+            # classes are widened for the model on its device, see chai1
+            feature = feature.to(self.index_dtype)
+        return feature
+
+    def make_constant_feature(
+        self,
+        shape: tuple[int, ...],
+        value: int | float | bool,
+        dtype: torch.dtype,
+        device: torch.device | None = None,
+    ) -> Tensor:
+        """Feature equal to `value` everywhere, as a broadcast view of one element.
+
+        For inputs known to produce a constant (e.g. absent MSAs or templates),
+        skipping the computation and allocation of the full feature.
+        """
+        element = torch.full((1,) * len(shape), value, dtype=dtype, device=device)
+        return self.make_feature(element).expand(shape)
 
     def __repr__(self):
         return f"[FeatureGenerator] : type: {self.ty}"
@@ -10,6 +10,8 @@ from torch import Tensor
 
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
+from chai_lab.data.features.memo import memoize
+from chai_lab.utils.static_cache import on_device
 from chai_lab.utils.tensor_utils import cdist
 from chai_lab.utils.typing import Bool, Float, Int, typecheck
 
@@ -21,6 +23,14 @@ DEFAULT_RBF_DIST_BINS = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0, 12.0, 14.0, 16.0]
 
 
 class BlockedAtomPairDistances(FeatureGenerator):
+    input_keys = (
+        "atom_ref_pos",
+        "atom_ref_mask",
+        "atom_ref_space_uid",
+        "block_atom_pair_q_idces",
+        "block_atom_pair_kv_idces",
+        "block_atom_pair_mask",
+    )
     transform: Literal["none", "inverse_squared"]
 
     def __init__(
@@ -65,7 +75,8 @@ class BlockedAtomPairDistances(FeatureGenerator):
     ) -> Tensor:
         """see super class"""
 
-        blocked_feat, blocked_mask = get_blocked_atom_pair_dists(
+        blocked_feat, blocked_mask = memoize(
+            get_blocked_atom_pair_dists,
             atom_ref_pos,
             atom_ref_space_uid,
             q_idces,
@@ -92,6 +103,14 @@ class BlockedAtomPairDistances(FeatureGenerator):
 
 
 class BlockedAtomPairDistogram(FeatureGenerator):
+    input_keys = (
+        "atom_ref_pos",
+        "atom_ref_mask",
+        "atom_ref_space_uid",
+        "block_atom_pair_q_idces",
+        "block_atom_pair_kv_idces",
+        "block_atom_pair_mask",
+    )
     dist_bins: Tensor
 
     def __init__(
@@ -137,7 +156,8 @@ class BlockedAtomPairDistogram(FeatureGenerator):
         block_atom_pair_mask: Bool[Tensor, "b bl bl_q bl_kv"],
     ) -> Tensor:
         """see super class"""
-        feat, mask = get_blocked_atom_pair_dists(
+        feat, mask = memoize(
+            get_blocked_atom_pair_dists,
             atom_ref_pos,
             atom_ref_space_uid,
             q_idces,
@@ -145,8 +165,11 @@ class BlockedAtomPairDistogram(FeatureGenerator):
             block_atom_pair_mask,
         )
         if self.encoding_ty == EncodingType.ONE_HOT:
-            feat = torch.searchsorted(self.dist_bins.to(atom_ref_pos.device), feat)
-        feat.masked_fill_(~mask, self.mask_value)
+            feat = torch.searchsorted(
+                on_device(self.dist_bins, atom_ref_pos.device), feat, out_int32=True
+            )
+        # not in place, distances are shared with BlockedAtomPairDistances
+        feat = feat.masked_fill(~mask, self.mask_value)
 
         return self.make_feature(feat.unsqueeze(-1))
 
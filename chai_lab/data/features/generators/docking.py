@@ -17,6 +17,7 @@ from chai_lab.data.features.generators.token_pair_distance import TokenCenterDis
 from chai_lab.data.parsing.structure.entity_type import EntityType
 from chai_lab.model.utils import get_asym_id_from_subchain_id
 from chai_lab.utils.defaults import default
+from chai_lab.utils.static_cache import on_device
 from chai_lab.utils.tensor_utils import cdist, und, und_self
 from chai_lab.utils.typing import Bool, Float, Int, UInt8, typecheck
 
@@ -93,6 +94,18 @@ class DockingConstraintGenerator(FeatureGenerator):
 
     """
 
+    input_keys = (
+        "docking_constraints",
+        "atom_gt_coords",
+        "atom_exists_mask",
+        "token_exists_mask",
+        "token_centre_atom_index",
+        "token_asym_id",
+        "subchain_id",
+        "token_entity_type",
+    )
+    draws_random = True
+
     def __init__(
         self,
         dist_bins: list[float] | None = None,
@@ -172,6 +185,27 @@ class DockingConstraintGenerator(FeatureGenerator):
         feature = feature.masked_fill(feature_mask.unsqueeze(-1), self.mask_value)
         return feature
 
+    def _skip_random_draws(
+        self,
+        all_atom_positions: Float[Tensor, "b a 3"],
+        token_asym_id: Int[Tensor, "b n"],
+    ):
+        """Make the random draws `_generate_from_batch` would when it includes
+        no distances, so seeded runs see the same random stream either way."""
+        random.uniform(self.coord_noise[0], self.coord_noise[1])
+        torch.randn_like(all_atom_positions)
+        assert not any(
+            random.random() < self.include_probability for _ in token_asym_id
+        )
+        if random.random() < self.structure_dropout_prob:
+            torch.rand(1)
+            torch.rand(token_asym_id.shape, device=token_asym_id.device)
+        elif random.random() < self.chain_dropout_prob:
+            for asym_i in token_asym_id:
+                unique_asyms = torch.unique(asym_i[asym_i != 0]).tolist()
+                random.shuffle(unique_asyms)
+                random.randint(0, len(unique_asyms))
+
     @typecheck
     def _generate(
         self,
@@ -224,6 +258,16 @@ class DockingConstraintGenerator(FeatureGenerator):
         token_entity_type=Int[Tensor, "b n"],
         token_asym_id=Int[Tensor, "b n"],
     ) -> Tensor:
+        if self.include_probability == 0:
+            # all distances are masked out, with or without dropout
+            b, n = token_single_mask.shape
+            self._skip_random_draws(all_atom_positions, token_asym_id)
+            return self.make_constant_feature(
+                (b, n, n, 1),
+                self.num_classes,  # the mask value of one-hot features
+                dtype=self.index_dtype,
+                device=token_single_mask.device,
+            )
         sampled_noise = random.uniform(self.coord_noise[0], self.coord_noise[1])
         token_center_dists = self.token_dist_gen._generate(
             all_atom_positions=all_atom_positions
@@ -246,7 +290,10 @@ class DockingConstraintGenerator(FeatureGenerator):
             ]
             # exclude other entity types
             asym_exclude_mask = torch.any(
-                (token_asym_id[i].unsqueeze(-1) == torch.tensor(asym_exclude_list)),
+                (
+                    token_asym_id[i].unsqueeze(-1)
+                    == torch.tensor(asym_exclude_list, device=token_asym_id.device)
+                ),
                 dim=-1,
             )
             token_center_dists[i, asym_exclude_mask] = self.mask_value
@@ -262,7 +309,10 @@ class DockingConstraintGenerator(FeatureGenerator):
                     asym_include_list[:partition_idx],
                     asym_include_list[partition_idx:],
                 )
-                group_1, group_2 = torch.tensor(_group_1), torch.tensor(_group_2)
+                group_1, group_2 = (
+                    torch.tensor(_group_1, device=token_asym_id.device),
+                    torch.tensor(_group_2, device=token_asym_id.device),
+                )
                 # find positions of elements in first and second group
                 group1_mask, group2_mask = [
                     torch.any((token_asym_id[i].unsqueeze(-1) == x), dim=-1)
@@ -323,7 +373,9 @@ class DockingConstraintGenerator(FeatureGenerator):
                 )
         # encode and apply mask
         feat = torch.searchsorted(
-            self.token_dist_gen.dist_bins.to(constraint_mat.device), constraint_mat
+            on_device(self.token_dist_gen.dist_bins, constraint_mat.device),
+            constraint_mat,
+            out_int32=True,
         )
         feat = feat.masked_fill(~constraint_mask, self.mask_value)
         # add back batch dim
@@ -10,6 +10,8 @@ from chai_lab.utils.typing import Float, typecheck
 
 
 class ESMEmbeddings(FeatureGenerator):
+    input_keys = ("esm_embeddings",)
+
     def __init__(
         self,
         ty: FeatureType = FeatureType.TOKEN,
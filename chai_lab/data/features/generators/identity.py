@@ -28,6 +28,8 @@ class Identity(FeatureGenerator):
         )
         self.key = key
         self.dim = dim
+        if key.startswith("inputs/"):
+            self.input_keys = (key.split("/")[1],)
 
     def generate(self, batch: dict) -> Tensor:
         feat = futils.get_entry_for_key(batch, self.key)
@@ -11,6 +11,8 @@ from chai_lab.utils.typing import Int, typecheck
 
 
 class ChainIsCropped(FeatureGenerator):
+    input_keys = ("token_asym_id",)
+
     def __init__(
         self,
     ):
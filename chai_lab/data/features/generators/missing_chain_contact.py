@@ -7,17 +7,26 @@ from torch import Tensor
 
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
-from chai_lab.utils.tensor_utils import cdist, und_self
+from chai_lab.data.features.tiling import DEFAULT_TILE_SIZE, row_tiles
+from chai_lab.utils.tensor_utils import cdist, und
 from chai_lab.utils.typing import Bool, Float, Int, typecheck
 
 
 class MissingChainContact(FeatureGenerator):
+    input_keys = (
+        "atom_gt_coords",
+        "atom_exists_mask",
+        "token_exists_mask",
+        "token_asym_id",
+        "atom_token_index",
+    )
     contact_threshold: float
 
     def __init__(
         self,
         # Use DockQ atom contact cutoff as default
         contact_threshold: float = 6.0,
+        tile_size: int = DEFAULT_TILE_SIZE,
     ):
         """Token-Level feature that indicates is a chain has no tokens
         in contact with tokens from another chain.
@@ -30,6 +39,7 @@ class MissingChainContact(FeatureGenerator):
             mult=1,
         )
         self.contact_threshold = contact_threshold
+        self.tile_size = tile_size
 
     def get_input_kwargs_from_batch(self, batch) -> dict:
         return dict(
@@ -51,17 +61,24 @@ class MissingChainContact(FeatureGenerator):
     ) -> Tensor:
         # per-atom asym id
         atom_asym_id = torch.gather(token_asym_id, dim=1, index=atom_token_index.long())
-        # compute atom pair distances and mask
-        atom_pair_dist = cdist(atom_gt_coords)
-        atom_pair_mask = und_self(atom_exists_mask, "b i, b j -> b i j")
-        atom_pair_asym_mask = atom_asym_id.unsqueeze(-1) != atom_asym_id.unsqueeze(-2)
-        aggregate_mask = (
-            atom_pair_mask
-            & atom_pair_asym_mask
-            & (atom_pair_dist < self.contact_threshold)
-        )
-        # determine which atoms are in contact with some atom from another chain
-        atom_in_contact = aggregate_mask.any(dim=-1)
+        # determine which atoms are in contact with some atom from another chain,
+        # by blocks of atoms as atom pairs would not fit in memory
+        atom_in_contact = torch.empty_like(atom_exists_mask)
+        for rows in row_tiles(atom_gt_coords.shape[1], self.tile_size):
+            # compute atom pair distances and mask
+            atom_pair_dist = cdist(atom_gt_coords[:, rows], atom_gt_coords)
+            atom_pair_mask = und(
+                atom_exists_mask[:, rows], atom_exists_mask, "b i, b j -> b i j"
+            )
+            atom_pair_asym_mask = atom_asym_id[:, rows].unsqueeze(
+                -1
+            ) != atom_asym_id.unsqueeze(-2)
+            aggregate_mask = (
+                atom_pair_mask
+                & atom_pair_asym_mask
+                & (atom_pair_dist < self.contact_threshold)
+            )
+            atom_in_contact[:, rows] = aggregate_mask.any(dim=-1)
         # determine if any chain has no atoms in contact with another chain
         chain_contact_features: list[torch.Tensor] = []
         for b in range(atom_gt_coords.shape[0]):
@@ -82,7 +99,8 @@ class MissingChainContact(FeatureGenerator):
                 for x in (unique_chain_asyms, unique_asyms_with_contacts)
             ]
             asyms_without_contacts = torch.tensor(
-                list(unique_chain_asyms - unique_asyms_with_contacts)
+                list(unique_chain_asyms - unique_asyms_with_contacts),
+                device=token_asym_id.device,
             )
             # create feature data for this chain
             feat = torch.any(
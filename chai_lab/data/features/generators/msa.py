@@ -20,6 +20,8 @@ from chai_lab.utils.typing import Bool, Int, UInt8, typecheck
 class MSAFeatureGenerator(FeatureGenerator):
     """Generates feature for one-hot encoding of processed MSA, same classes as restype."""
 
+    input_keys = ("msa_tokens",)
+
     def __init__(self):
         num_res_ty = len(residue_types_with_nucleotides_order)
         super().__init__(
@@ -47,6 +49,8 @@ class MSAFeatureGenerator(FeatureGenerator):
 class MSAHasDeletionGenerator(FeatureGenerator):
     """Binary feature for if there is a deletion to the left of each position."""
 
+    input_keys = ("msa_deletion_matrix",)
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.MSA,
@@ -64,6 +68,14 @@ class MSAHasDeletionGenerator(FeatureGenerator):
         self,
         msa_deletion_matrix: UInt8[Tensor, "batch depth tokens"],
     ) -> Tensor:
+        if not msa_deletion_matrix.any():
+            # e.g. no MSA
+            return self.make_constant_feature(
+                (*msa_deletion_matrix.shape, 1),
+                False,
+                dtype=torch.bool,
+                device=msa_deletion_matrix.device,
+            )
         has_deletion = msa_deletion_matrix > 0
         return self.make_feature(data=has_deletion.unsqueeze(-1))
 
@@ -73,6 +85,8 @@ class MSADeletionValueGenerator(FeatureGenerator):
     Scaling is given by s(d) = 2 / pi * arctan(d / 3)
     """
 
+    input_keys = ("msa_deletion_matrix",)
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.MSA,
@@ -90,6 +104,14 @@ class MSADeletionValueGenerator(FeatureGenerator):
         self,
         msa_deletion_matrix: UInt8[Tensor, "batch depth tokens"],
     ) -> Tensor:
+        if not msa_deletion_matrix.any():
+            # e.g. no MSA
+            return self.make_constant_feature(
+                (*msa_deletion_matrix.shape, 1),
+                0.0,
+                dtype=torch.float32,
+                device=msa_deletion_matrix.device,
+            )
         d_scaled = 2.0 / torch.pi * torch.arctan(msa_deletion_matrix.float() / 3.0)
         return self.make_feature(data=d_scaled.unsqueeze(-1))
 
@@ -97,6 +119,8 @@ class MSADeletionValueGenerator(FeatureGenerator):
 class MSAProfileGenerator(FeatureGenerator):
     """MSA profile - distribution across residue types BEFORE processing"""
 
+    input_keys = ("main_msa_tokens", "main_msa_mask")
+
     def __init__(self):
         self.num_res_ty = len(residue_types_with_nucleotides_order)
         super().__init__(
@@ -122,7 +146,9 @@ class MSAProfileGenerator(FeatureGenerator):
         batch, _, tokens = main_msa_tokens.shape
 
         unnormalized_profile = torch.zeros(
-            (batch, tokens, self.num_res_ty), dtype=main_msa_tokens.dtype
+            (batch, tokens, self.num_res_ty),
+            dtype=main_msa_tokens.dtype,
+            device=main_msa_tokens.device,
         ).scatter_add(
             dim=2,
             index=rearrange(
@@ -142,6 +168,8 @@ class MSAProfileGenerator(FeatureGenerator):
 class MSADeletionMeanGenerator(FeatureGenerator):
     """MSA deletion mean - mean number of deletions at each position in main MSA."""
 
+    input_keys = ("main_msa_mask", "main_msa_deletion_matrix")
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.TOKEN,
@@ -176,6 +204,8 @@ class IsPairedMSAGenerator(FeatureGenerator):
     Relative species encoding within each MSA sequence
     """
 
+    input_keys = ("msa_mask", "msa_species")
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.MSA,
@@ -197,6 +227,11 @@ class IsPairedMSAGenerator(FeatureGenerator):
         msa_mask: Bool[Tensor, "batch depth tokens"],
         msa_species: Int[Tensor, "batch depth tokens"],
     ) -> Tensor:
+        if not msa_mask.any():
+            # no MSA
+            return self.make_constant_feature(
+                (*msa_mask.shape, 1), 0, dtype=torch.uint8, device=msa_mask.device
+            )
         first_species = msa_species[..., :1]
 
         is_paired = (msa_species == first_species).to(torch.uint8)
@@ -212,6 +247,8 @@ class MSADataSourceGenerator(FeatureGenerator):
     MSA data source for each MSA token
     """
 
+    input_keys = ("msa_mask", "msa_sequence_source")
+
     def __init__(
         self,
         num_classes: int = 5,
@@ -238,6 +275,14 @@ class MSADataSourceGenerator(FeatureGenerator):
         msa_mask: Bool[Tensor, "batch depth tokens"],
         msa_sequence_source: UInt8[Tensor, "batch depth tokens"],
     ) -> Tensor:
+        if not msa_mask.any():
+            # no MSA, all masked out
+            return self.make_constant_feature(
+                (*msa_mask.shape, 1),
+                self.num_classes,
+                dtype=msa_sequence_source.dtype,
+                device=msa_mask.device,
+            )
         msa_sequence_source = msa_sequence_source.masked_fill(
             ~msa_mask, self.num_classes
         )
@@ -13,6 +13,8 @@ N_COORDS = 3  # 3 coords: x, y, z
 class RefPos(FeatureGenerator):
     """Provides reference position of atom"""
 
+    input_keys = ("atom_ref_pos",)
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.ATOM,
@@ -12,6 +12,8 @@ from chai_lab.utils.typing import Int, typecheck
 
 
 class RelativeChain(FeatureGenerator):
+    input_keys = ("token_entity_id", "token_sym_id")
+
     def __init__(
         self,
         s_max: int = 2,
@@ -43,9 +45,10 @@ class RelativeChain(FeatureGenerator):
         # remap unique sym_id values to 0,n-1
         _, sym_ids_from_zero = torch.unique(sym_id, sorted=True, return_inverse=True)
 
+        # pairwise in int32, ids are at most the number of tokens
         rel_entity, rel_chain = map(
             lambda x: rearrange(x, "b n -> b n 1") - rearrange(x, "b n -> b 1 n"),
-            (entity_id, sym_ids_from_zero),
+            (entity_id.to(torch.int32), sym_ids_from_zero.to(torch.int32)),
         )
         # within an entity, determine relative chain
         rel_chain = torch.clamp(rel_chain + self.s_max, 0, 2 * self.s_max)
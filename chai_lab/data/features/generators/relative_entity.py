@@ -12,6 +12,8 @@ from chai_lab.utils.typing import Int, typecheck
 
 
 class RelativeEntity(FeatureGenerator):
+    input_keys = ("token_entity_id",)
+
     def __init__(self):
         """Relative Entity Encoding
 
@@ -39,9 +41,10 @@ class RelativeEntity(FeatureGenerator):
             entity_id, sorted=True, return_inverse=True
         )
 
+        # pairwise in int32, ids are at most the number of tokens
+        entity_id_from_zero = entity_id_from_zero.to(torch.int32)
         rel_entity = rearrange(entity_id_from_zero, "b n -> b n 1") - rearrange(
             entity_id_from_zero, "b n -> b 1 n"
         )
         rel_entity = torch.clamp(rel_entity + 1, 0, 2)
-        assert rel_entity.dtype == torch.long
         return self.make_feature(rel_entity.unsqueeze(-1))
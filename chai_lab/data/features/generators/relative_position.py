@@ -0,0 +1,201 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Fused relative position encodings.
+
+`RelativeSequenceSeparation`, `RelativeTokenSeparation`, `RelativeChain` and
+`RelativeEntity` each build their own token pair differences and same-chain
+masks. `FusedRelativePositions` computes all four encodings in one pass over the
+token pair grid, sharing those intermediates and producing the encodings directly
+in their feature dtype, by blocks of rows of the grid. It exposes a generator per
+feature, with the same outputs as the separate generators.
+"""
+
+from typing import Any
+
+import torch
+from einops import rearrange
+from torch import Tensor
+
+from chai_lab.data.features.generators.base import FeatureGenerator
+from chai_lab.data.features.generators.relative_chain import RelativeChain
+from chai_lab.data.features.generators.relative_entity import RelativeEntity
+from chai_lab.data.features.generators.relative_sep import RelativeSequenceSeparation
+from chai_lab.data.features.generators.relative_token import RelativeTokenSeparation
+from chai_lab.data.features.memo import memoize
+from chai_lab.data.features.tiling import DEFAULT_TILE_SIZE, row_tiles
+from chai_lab.utils.static_cache import on_device
+from chai_lab.utils.typing import Int, typecheck
+
+
+class _FusedFeature(FeatureGenerator):
+    """One of the fused encodings, as a generator in place of `separate`."""
+
+    input_keys = (
+        "token_residue_index",
+        "token_index",
+        "token_asym_id",
+        "token_entity_id",
+        "token_sym_id",
+    )
+
+    def __init__(
+        self, fused: "FusedRelativePositions", separate: FeatureGenerator, key: str
+    ):
+        super().__init__(
+            ty=separate.ty,
+            encoding_ty=separate.encoding_ty,
+            num_classes=separate.num_classes,
+            mult=separate.mult,
+            ignore_index=separate.ignore_index,
+            can_mask=separate.can_mask,
+        )
+        self.fused = fused
+        self.key = key
+
+    def get_input_kwargs_from_batch(self, batch: dict[str, Any]) -> dict:
+        # uncast, so all four generators share one computation via the memo
+        return dict(
+            residue_index=batch["inputs"]["token_residue_index"],
+            token_index=batch["inputs"]["token_index"],
+            asym_id=batch["inputs"]["token_asym_id"],
+            entity_id=batch["inputs"]["token_entity_id"],
+            sym_id=batch["inputs"]["token_sym_id"],
+        )
+
+    def _generate(
+        self,
+        residue_index: Tensor,
+        token_index: Tensor,
+        asym_id: Tensor,
+        entity_id: Tensor,
+        sym_id: Tensor,
+    ) -> Tensor:
+        encodings = memoize(
+            self.fused.encode, residue_index, token_index, asym_id, entity_id, sym_id
+        )
+        return encodings[self.key]
+
+
+class FusedRelativePositions:
+    def __init__(
+        self,
+        sequence_separation: RelativeSequenceSeparation,
+        token_separation: RelativeTokenSeparation,
+        chain: RelativeChain,
+        entity: RelativeEntity,
+        tile_size: int = DEFAULT_TILE_SIZE,
+    ):
+        self.tile_size = tile_size
+        self._sequence_separation_gen = sequence_separation
+        self._token_separation_gen = token_separation
+        self._chain_gen = chain
+        self._entity_gen = entity
+
+        # sequence separations are binned by a lookup table over the range of the
+        # bins, beyond which the bin index saturates
+        sep_bins = sequence_separation.sep_bins.float()
+        self._sep_min = int(sep_bins.min().floor()) - 1
+        self._sep_max = int(sep_bins.max().ceil()) + 1
+        seps = torch.arange(self._sep_min, self._sep_max + 1).float()
+        # add small epsilon bc. bins are chosen by leftmost index
+        self._sep_table = torch.searchsorted(sep_bins, seps + 1e-4).to(
+            sequence_separation.index_dtype
+        )
+
+        self.sequence_separation = _FusedFeature(
+            self, sequence_separation, "sequence_separation"
+        )
+        self.token_separation = _FusedFeature(
+            self, token_separation, "token_separation"
+        )
+        self.chain = _FusedFeature(self, chain, "chain")
+        self.entity = _FusedFeature(self, entity, "entity")
+
+    @typecheck
+    def encode(
+        self,
+        residue_index: Int[Tensor, "b n"],
+        token_index: Int[Tensor, "b n"],
+        asym_id: Int[Tensor, "b n"],
+        entity_id: Int[Tensor, "b n"],
+        sym_id: Int[Tensor, "b n"],
+    ) -> dict[str, Tensor]:
+        """All four encodings, keyed by the attribute of their generator."""
+        seq_gen = self._sequence_separation_gen
+        token_gen = self._token_separation_gen
+        chain_gen = self._chain_gen
+        entity_gen = self._entity_gen
+
+        residue_index = residue_index.to(torch.int32)
+        token_index = token_index.to(torch.int32)
+        entity_id = entity_id.to(torch.int32)
+        # RelativeChain remaps sym ids to 0..n-1 over the batch
+        _, sym_id_from_zero = torch.unique(sym_id, sorted=True, return_inverse=True)
+        sym_id_from_zero = sym_id_from_zero.to(torch.int32)
+        table = on_device(self._sep_table, residue_index.device)
+        r_max = token_gen.r_max
+        s_max = chain_gen.s_max
+
+        b, n = residue_index.shape
+        outputs = {
+            key: torch.empty((b, n, n), dtype=gen.index_dtype, device=asym_id.device)
+            for key, gen in [
+                ("sequence_separation", seq_gen),
+                ("token_separation", token_gen),
+                ("chain", chain_gen),
+                ("entity", entity_gen),
+            ]
+        }
+        for rows in row_tiles(n, self.tile_size):
+
+            def pairwise(x: Tensor) -> Tensor:
+                return rearrange(x[:, rows], "b i -> b i 1") - rearrange(
+                    x, "b j -> b 1 j"
+                )
+
+            same_chain = rearrange(asym_id[:, rows], "b i -> b i 1") == rearrange(
+                asym_id, "b j -> b 1 j"
+            )
+            rel_residue = pairwise(residue_index)
+
+            # RelativeSequenceSeparation: binned residue separation within chains
+            outputs["sequence_separation"][:, rows] = table[
+                rel_residue.clamp(self._sep_min, self._sep_max) - self._sep_min
+            ].masked_fill_(~same_chain, seq_gen.num_classes - 1)
+
+            # RelativeTokenSeparation: token separation within residues
+            same_residue = same_chain & (rel_residue == 0)
+            del rel_residue, same_chain
+            outputs["token_separation"][:, rows] = (
+                pairwise(token_index)
+                .clamp_(-r_max, r_max + 1)
+                .add_(r_max)
+                .masked_fill_(~same_residue, 2 * r_max + 2)
+            )
+            del same_residue
+
+            # RelativeEntity: sign of the entity difference, shifted to 0..2
+            rel_entity = pairwise(entity_id)
+            outputs["entity"][:, rows] = rel_entity.clamp(-1, 1).add_(1)
+
+            # RelativeChain: separation of symmetric copies within entities
+            outputs["chain"][:, rows] = (
+                pairwise(sym_id_from_zero)
+                .clamp_(-s_max, s_max)
+                .add_(s_max)
+                .masked_fill_(rel_entity != 0, 2 * s_max + 1)
+            )
+
+        return dict(
+            sequence_separation=seq_gen.make_feature(
+                outputs["sequence_separation"].unsqueeze(-1)
+            ),
+            token_separation=token_gen.make_feature(
+                outputs["token_separation"].unsqueeze(-1)
+            ),
+            chain=chain_gen.make_feature(outputs["chain"].unsqueeze(-1)),
+            entity=entity_gen.make_feature(outputs["entity"].unsqueeze(-1)),
+        )
@@ -8,6 +8,7 @@ from torch import Tensor
 
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
+from chai_lab.utils.static_cache import on_device
 from chai_lab.utils.typing import Int, typecheck
 
 
@@ -20,6 +21,8 @@ SMALL_SEP_BINS = get_sep_bins(32)
 
 
 class RelativeSequenceSeparation(FeatureGenerator):
+    input_keys = ("token_residue_index", "token_asym_id")
+
     def __init__(
         self,
         sep_bins: list[int] | list[float] | None = None,
@@ -38,8 +41,8 @@ class RelativeSequenceSeparation(FeatureGenerator):
 
     def get_input_kwargs_from_batch(self, batch) -> dict:
         return dict(
-            residue_index=batch["inputs"]["token_residue_index"].long(),
-            asym_id=batch["inputs"]["token_asym_id"].long(),
+            residue_index=batch["inputs"]["token_residue_index"],
+            asym_id=batch["inputs"]["token_asym_id"],
         )
 
     @typecheck
@@ -53,8 +56,9 @@ class RelativeSequenceSeparation(FeatureGenerator):
             (residue_index, asym_id),
         )
         encoded_feat = torch.searchsorted(
-            self.sep_bins.to(rel_sep.device),
+            on_device(self.sep_bins, rel_sep.device),
             rel_sep + 1e-4,  # add small epsilon bc. bins are chosen by leftmost index
+            out_int32=True,
         )
         same_chain_mask = rel_chain == 0
         # mask inter-chain sep
@@ -12,6 +12,8 @@ from chai_lab.utils.typing import Int, typecheck
 
 
 class RelativeTokenSeparation(FeatureGenerator):
+    input_keys = ("token_index", "token_residue_index", "token_asym_id")
+
     def __init__(
         self,
         # using 16 for default here since values beyond this are very rare.
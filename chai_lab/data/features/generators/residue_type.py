@@ -12,6 +12,8 @@ from chai_lab.utils.typing import Bool, Int, typecheck
 
 
 class ResidueType(FeatureGenerator):
+    draws_random = True
+
     def __init__(
         self,
         min_corrupt_prob: float = 0.0,
@@ -29,6 +31,7 @@ class ResidueType(FeatureGenerator):
         self.min_corrupt_prob = min_corrupt_prob
         self.max_corrupt_prob = max_corrupt_prob
         self.key = key
+        self.input_keys = (key,)
 
     @typecheck
     def _corrupt_seq(
@@ -9,6 +9,7 @@ from torch import Tensor
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
 from chai_lab.utils.defaults import default
+from chai_lab.utils.static_cache import on_device
 from chai_lab.utils.typing import Bool, Float, typecheck
 
 DEFAULT_BFACTOR_BINS = [140.0]
@@ -17,6 +18,8 @@ DEFAULT_PLDDT_BINS = [0.3, 0.7]
 
 
 class IsDistillation(FeatureGenerator):
+    input_keys = ("is_distillation", "token_exists_mask")
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.TOKEN,
@@ -44,6 +47,9 @@ class IsDistillation(FeatureGenerator):
 
 
 class TokenBFactor(FeatureGenerator):
+    input_keys = ("token_b_factor_or_plddt", "is_distillation", "token_exists_mask")
+    draws_random = True
+
     def __init__(
         self,
         include_prob: float = 1.0,
@@ -74,7 +80,16 @@ class TokenBFactor(FeatureGenerator):
         is_distillation: Bool[Tensor, "b 1"],
         token_exists_mask: Bool[Tensor, "b n"],
     ) -> Tensor:
-        _, n = token_exists_mask.shape
+        b, n = token_exists_mask.shape
+        if self.include_prob == 0:
+            # keep the random stream as if the include mask were drawn
+            torch.rand_like(is_distillation, dtype=torch.float)
+            return self.make_constant_feature(
+                (b, n, 1),
+                self.num_classes,  # the mask value of one-hot features
+                dtype=self.index_dtype,
+                device=token_exists_mask.device,
+            )
 
         include_mask = (
             torch.rand_like(is_distillation, dtype=torch.float) <= self.include_prob
@@ -87,13 +102,18 @@ class TokenBFactor(FeatureGenerator):
             & repeat(include_mask, "b 1 -> b n", n=n)
         )
 
-        feat = torch.searchsorted(self.bins.to(is_distillation.device), token_b_factor)
+        feat = torch.searchsorted(
+            on_device(self.bins, is_distillation.device), token_b_factor
+        )
         feat.masked_fill_(~mask, self.mask_value)
 
         return self.make_feature(data=feat.unsqueeze(-1))
 
 
 class TokenPLDDT(FeatureGenerator):
+    input_keys = ("token_b_factor_or_plddt", "is_distillation", "token_exists_mask")
+    draws_random = True
+
     def __init__(
         self,
         include_prob: float = 1.0,
@@ -124,7 +144,16 @@ class TokenPLDDT(FeatureGenerator):
         is_distillation: Bool[Tensor, "b 1"],
         token_exists_mask: Bool[Tensor, "b n"],
     ) -> Tensor:
-        _, n = token_exists_mask.shape
+        b, n = token_exists_mask.shape
+        if self.include_prob == 0:
+            # keep the random stream as if the include mask were drawn
+            torch.rand_like(is_distillation, dtype=torch.float)
+            return self.make_constant_feature(
+                (b, n, 1),
+                self.num_classes,  # the mask value of one-hot features
+                dtype=self.index_dtype,
+                device=token_exists_mask.device,
+            )
 
         include_mask = (
             torch.rand_like(is_distillation, dtype=torch.float) <= self.include_prob
@@ -137,7 +166,9 @@ class TokenPLDDT(FeatureGenerator):
             & repeat(include_mask, "b 1 -> b n", n=n)
         )
 
-        feat = torch.searchsorted(self.bins.to(is_distillation.device), token_plddt)
+        feat = torch.searchsorted(
+            on_device(self.bins, is_distillation.device), token_plddt
+        )
         feat.masked_fill_(~mask, self.mask_value)
 
         return self.make_feature(data=feat.unsqueeze(-1))
@@ -19,20 +19,35 @@ from torch import Tensor
 
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
+from chai_lab.data.features.memo import memoize
+from chai_lab.data.features.tiling import DEFAULT_TILE_SIZE, tiled_pair_feature
 from chai_lab.data.residue_constants import residue_types_with_nucleotides_order
+from chai_lab.utils.static_cache import on_device
 from chai_lab.utils.typing import Bool, Float, Int, UInt8, typecheck
 
 logger = logging.getLogger(__name__)
 
 
+@typecheck
+def _same_asym(asym_ids: Int[Tensor, "b n"]) -> Bool[Tensor, "b n n"]:
+    return rearrange(asym_ids, "b i -> b i 1") == rearrange(asym_ids, "b j -> b 1 j")
+
+
 class TemplateMaskGenerator(FeatureGenerator):
-    def __init__(self):
+    input_keys = (
+        "template_backbone_frame_mask",
+        "template_pseudo_beta_mask",
+        "token_asym_id",
+    )
+
+    def __init__(self, tile_size: int = DEFAULT_TILE_SIZE):
         super().__init__(
             ty=FeatureType.TEMPLATES,
             encoding_ty=EncodingType.IDENTITY,
             can_mask=False,
             num_classes=2,
         )
+        self.tile_size = tile_size
 
     def get_input_kwargs_from_batch(self, batch: dict[str, Any]) -> dict:
         return dict(
@@ -40,7 +55,8 @@ class TemplateMaskGenerator(FeatureGenerator):
                 "template_backbone_frame_mask"
             ],
             template_pseudo_beta_mask=batch["inputs"]["template_pseudo_beta_mask"],
-            asym_ids=batch["inputs"]["token_asym_id"].type(torch.int32),
+            # uncast, so the same-chain mask is shared via the memo
+            asym_ids=batch["inputs"]["token_asym_id"],
         )
 
     def _generate(
@@ -49,29 +65,47 @@ class TemplateMaskGenerator(FeatureGenerator):
         template_pseudo_beta_mask: Bool[Tensor, "batch templ tokens"],
         asym_ids: Int[Tensor, "batch tokens"],
     ) -> Tensor:
-        same_asym = rearrange(asym_ids, "b t -> b 1 t 1 1") == rearrange(
-            asym_ids, "b t -> b 1 1 t 1"
+        if not (template_backbone_frame_mask.any() or template_pseudo_beta_mask.any()):
+            # no templates
+            b, t, n = template_backbone_frame_mask.shape
+            return self.make_constant_feature(
+                (b, t, n, n, 2), 0.0, dtype=torch.float32, device=asym_ids.device
+            )
+        same_asym = rearrange(memoize(_same_asym, asym_ids), "b i j -> b 1 i j 1")
+
+        def compute(rows: slice) -> Tensor:
+            # Line 1: backbone frame mask
+            # (b t n n)
+            bij_backbone = rearrange(
+                template_backbone_frame_mask[:, :, rows], "b t n -> b t n 1 1"
+            ) * rearrange(template_backbone_frame_mask, "b t n -> b t 1 n 1")
+
+            # Line 2: backbone pseudo beta mask
+            # (b t n n)
+            bij_pseudo_beta = rearrange(
+                template_pseudo_beta_mask[:, :, rows], "b t n -> b t n 1 1"
+            ) * rearrange(template_pseudo_beta_mask, "b t n -> b t 1 n 1")
+
+            mask_feat = torch.cat([bij_backbone, bij_pseudo_beta], dim=-1)
+            return mask_feat & same_asym[:, :, rows]
+
+        b, t, n = template_backbone_frame_mask.shape
+        mask_feat = tiled_pair_feature(
+            compute,
+            shape=(b, t, n, n, 2),
+            dtype=torch.float32,
+            device=asym_ids.device,
+            tile_size=self.tile_size,
+            dim=2,
         )
-        # Line 1: backbone frame mask
-        # (b t n n)
-        bij_backbone = rearrange(
-            template_backbone_frame_mask, "b t n -> b t n 1 1"
-        ) * rearrange(template_backbone_frame_mask, "b t n -> b t 1 n 1")
-
-        # Line 2: backbone pseudo beta mask
-        # (b t n n)
-        bij_pseudo_beta = rearrange(
-            template_pseudo_beta_mask, "b t n -> b t n 1 1"
-        ) * rearrange(template_pseudo_beta_mask, "b t n -> b t 1 n 1")
-
-        mask_feat = torch.cat([bij_backbone, bij_pseudo_beta], dim=-1).float()
-
-        return self.make_feature(mask_feat.float() * same_asym.float())
+        return self.make_feature(mask_feat)
 
 
 class TemplateUnitVectorGenerator(FeatureGenerator):
     """Generates feature for template unit vector"""
 
+    input_keys = ("template_unit_vector", "token_asym_id")
+
     def __init__(self):
         super().__init__(
             ty=FeatureType.TEMPLATES,
@@ -84,7 +118,7 @@ class TemplateUnitVectorGenerator(FeatureGenerator):
     def get_input_kwargs_from_batch(self, batch: dict[str, Any]) -> dict:
         return dict(
             template_unit_vector=batch["inputs"]["template_unit_vector"],
-            asym_ids=batch["inputs"]["token_asym_id"].to(torch.int32),
+            asym_ids=batch["inputs"]["token_asym_id"],
         )
 
     @typecheck
@@ -93,9 +127,15 @@ class TemplateUnitVectorGenerator(FeatureGenerator):
         template_unit_vector: Float[Tensor, "batch templ tokens tokens 3"],
         asym_ids: Int[Tensor, "batch tokens"],
     ) -> Tensor:
-        same_asym = rearrange(asym_ids, "b t -> b 1 t 1 1") == rearrange(
-            asym_ids, "b t -> b 1 1 t 1"
-        )
+        if not template_unit_vector.any():
+            # no templates
+            return self.make_constant_feature(
+                template_unit_vector.shape,
+                0.0,
+                dtype=template_unit_vector.dtype,
+                device=template_unit_vector.device,
+            )
+        same_asym = rearrange(memoize(_same_asym, asym_ids), "b i j -> b 1 i j 1")
         same_asym = same_asym.to(template_unit_vector.dtype)
         # mask out pairs with different asyms
         template_unit_vector = template_unit_vector * same_asym
@@ -105,6 +145,8 @@ class TemplateUnitVectorGenerator(FeatureGenerator):
 class TemplateResTypeGenerator(FeatureGenerator):
     """Generates feature for one-hot encoding of templates, same classes as restype."""
 
+    input_keys = ("template_restype",)
+
     def __init__(self, embed_dim=32):
         num_res_ty = len(residue_types_with_nucleotides_order)
         super().__init__(
@@ -131,11 +173,14 @@ class TemplateResTypeGenerator(FeatureGenerator):
 class TemplateDistogramGenerator(FeatureGenerator):
     """Generates feature for distogram of templates."""
 
+    input_keys = ("template_distances", "token_asym_id")
+
     def __init__(
         self,
         min_dist_bin: float = 3.25,
         max_dist_bin: float = 50.75,
         n_dist_bin: int = 38,
+        tile_size: int = DEFAULT_TILE_SIZE,
     ):
         super().__init__(
             ty=FeatureType.TEMPLATES,
@@ -145,11 +190,12 @@ class TemplateDistogramGenerator(FeatureGenerator):
             mult=1,
         )
         self.dist_bins = torch.linspace(min_dist_bin, max_dist_bin, n_dist_bin)[1:]
+        self.tile_size = tile_size
 
     def get_input_kwargs_from_batch(self, batch: dict[str, Any]) -> dict:
         return dict(
             template_distances=batch["inputs"]["template_distances"],
-            asym_ids=batch["inputs"]["token_asym_id"].to(torch.int32),
+            asym_ids=batch["inputs"]["token_asym_id"],
         )
 
     @typecheck
@@ -158,9 +204,21 @@ class TemplateDistogramGenerator(FeatureGenerator):
         template_distances: Float[Tensor, "batch templ tokens tokens"],
         asym_ids: Int[Tensor, "batch tokens"],
     ) -> Tensor:
-        discretized = torch.searchsorted(self.dist_bins, template_distances)
-        same_asym = rearrange(asym_ids, "b t -> b 1 t 1") == rearrange(
-            asym_ids, "b t -> b 1 1 t"
+        same_asym = rearrange(memoize(_same_asym, asym_ids), "b i j -> b 1 i j")
+        dist_bins = on_device(self.dist_bins, template_distances.device)
+
+        def compute(rows: slice) -> Tensor:
+            discretized = torch.searchsorted(
+                dist_bins, template_distances[:, :, rows].contiguous(), out_int32=True
+            )
+            return discretized.masked_fill_(~same_asym[:, :, rows], self.mask_value)
+
+        discretized = tiled_pair_feature(
+            compute,
+            shape=template_distances.shape,
+            dtype=self.index_dtype,
+            device=template_distances.device,
+            tile_size=self.tile_size,
+            dim=2,
         )
-        discretized = torch.masked_fill(discretized, ~same_asym, self.mask_value)
         return self.make_feature(data=discretized.unsqueeze(-1))
@@ -12,6 +12,7 @@ from torch import Tensor
 
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
+from chai_lab.data.features.memo import memoize
 from chai_lab.data.parsing.structure.entity_type import EntityType
 from chai_lab.model.utils import get_asym_id_from_subchain_id
 from chai_lab.utils.tensor_utils import cdist, tensorcode_to_string, und, und_self
@@ -20,6 +21,22 @@ from chai_lab.utils.typing import Bool, Float, Int, UInt8, typecheck
 logger = logging.getLogger(__name__)
 
 
+@typecheck
+def _gather_token_ref_atom_coords(
+    atom_coords: Float[Tensor, "b a 3"], token_ref_atom_index: Int[Tensor, "b n"]
+) -> Float[Tensor, "b n 3"]:
+    return torch.gather(
+        atom_coords, dim=1, index=repeat(token_ref_atom_index.long(), "... -> ... 3")
+    )
+
+
+@typecheck
+def _token_ref_atom_dists(
+    atom_coords: Float[Tensor, "b a 3"], token_ref_atom_index: Int[Tensor, "b n"]
+) -> Float[Tensor, "b n n"]:
+    return cdist(_gather_token_ref_atom_coords(atom_coords, token_ref_atom_index))
+
+
 @typecheck
 @dataclass
 class ConstraintGroup:
@@ -65,6 +82,20 @@ class ConstraintGroup:
 
 
 class TokenDistanceRestraint(FeatureGenerator):
+    input_keys = (
+        "contact_constraints",
+        "atom_gt_coords",
+        "atom_exists_mask",
+        "token_asym_id",
+        "token_ref_atom_index",
+        "token_exists_mask",
+        "token_entity_type",
+        "token_residue_index",
+        "token_residue_name",
+        "subchain_id",
+    )
+    draws_random = True
+
     def __init__(
         self,
         include_probability: float = 1.0,
@@ -127,6 +158,10 @@ class TokenDistanceRestraint(FeatureGenerator):
             ]
         ).long()
 
+    @property
+    def samples_no_restraints(self) -> bool:
+        return self.include_prob == 0 and 0 < self.size < 1
+
     def get_num_restraints(self, batch_size) -> list[int]:
         if 0 < self.size < 1:
             seles = np.random.geometric(self.size, size=batch_size)
@@ -135,6 +170,17 @@ class TokenDistanceRestraint(FeatureGenerator):
             return [int(x) for x in seles]
         return [int(self.size)] * batch_size
 
+    def skip_random_draws(
+        self, batch_size: int, n: int, dtype: torch.dtype, device: torch.device
+    ):
+        """Make the random draws `_generate_from_batch` would when it samples
+        no restraints, so seeded runs see the same random stream either way."""
+        torch.randn((batch_size, n, 3), dtype=dtype, device=device)
+        assert not any(self.get_num_restraints(batch_size))
+        for _ in range(batch_size):
+            torch.rand(1)
+            torch.rand((n, n), dtype=dtype, device=device)
+
     def get_input_kwargs_from_batch(self, batch) -> dict:
         maybe_constraint_dicts = batch["inputs"].get("contact_constraints", [[None]])[0]
         contact_constraints = (
@@ -146,7 +192,8 @@ class TokenDistanceRestraint(FeatureGenerator):
             atom_gt_coords=batch["inputs"]["atom_gt_coords"],
             atom_exists_mask=batch["inputs"]["atom_exists_mask"],
             token_asym_id=batch["inputs"]["token_asym_id"].long(),
-            token_ref_atom_index=batch["inputs"]["token_ref_atom_index"].long(),
+            # cast where used, so distances are shared via the memo
+            token_ref_atom_index=batch["inputs"]["token_ref_atom_index"],
             token_exists_mask=batch["inputs"]["token_exists_mask"],
             token_entity_type=batch["inputs"]["token_entity_type"].long(),
             token_residue_index=batch["inputs"]["token_residue_index"].long(),
@@ -166,7 +213,7 @@ class TokenDistanceRestraint(FeatureGenerator):
         # We choose a random delta to upper bound all sampled distances with.
         # We do this because larger distance restraints are more likely to be
         # valid than smaller ones, and we try to reduce that bias here.
-        delta = torch.rand(1) * (self.max_dist - self.min_dist)
+        delta = (torch.rand(1) * (self.max_dist - self.min_dist)).to(dists.device)
         all_restraint_bounds = torch.rand_like(dists) * delta + self.min_dist
         all_valid_restraints = dists < all_restraint_bounds
         num_valid_restraints = int(all_valid_restraints.sum().item())
@@ -236,14 +283,34 @@ class TokenDistanceRestraint(FeatureGenerator):
         token_exists_mask: Bool[Tensor, "b n"],
         token_entity_type: Int[Tensor, "b n"],
     ) -> Tensor:
-        batch_size = atom_gt_coords.shape[0]
+        batch_size, n = token_exists_mask.shape
+        if self.samples_no_restraints:
+            self.skip_random_draws(
+                batch_size, n, atom_gt_coords.dtype, atom_gt_coords.device
+            )
+            return self.make_constant_feature(
+                (batch_size, n, n, 1),
+                self.ignore_idx,
+                dtype=torch.float32,
+                device=atom_gt_coords.device,
+            )
         # create inter-chain contact mask
         valid_token_pair_mask = und_self(token_exists_mask, "b i, b j -> b i j")
         left_entity_type_mask = torch.any(
-            (token_entity_type.unsqueeze(-1) - self.query_entity_types) == 0, dim=-1
+            (
+                token_entity_type.unsqueeze(-1)
+                - self.query_entity_types.to(token_entity_type.device)
+            )
+            == 0,
+            dim=-1,
         )
         right_entity_type_mask = torch.any(
-            (token_entity_type.unsqueeze(-1) - self.key_entity_types) == 0, dim=-1
+            (
+                token_entity_type.unsqueeze(-1)
+                - self.key_entity_types.to(token_entity_type.device)
+            )
+            == 0,
+            dim=-1,
         )
         valid_entity_pair_mask = und(
             left_entity_type_mask, right_entity_type_mask, "b i, b j -> b i j"
@@ -252,7 +319,7 @@ class TokenDistanceRestraint(FeatureGenerator):
             token_asym_id, "b j -> b 1 j"
         )
         ref_atom_mask = torch.gather(
-            atom_exists_mask, dim=1, index=token_ref_atom_index
+            atom_exists_mask, dim=1, index=token_ref_atom_index.long()
         )
         valid_token_ref_atom_mask = und_self(ref_atom_mask, "b i, b j -> b i j")
         valid_contact_mask = (
@@ -262,17 +329,26 @@ class TokenDistanceRestraint(FeatureGenerator):
             & diff_chain_mask
         )
 
-        # compute pairwise distances
-        token_ref_atom_coords = torch.gather(
-            atom_gt_coords, dim=1, index=repeat(token_ref_atom_index, "... -> ... 3")
+        # compute pairwise distances, optionally adding noise to coordinates;
+        # noise is drawn regardless so the random stream does not depend on it
+        noise = torch.randn(
+            (*token_ref_atom_index.shape, 3),
+            dtype=atom_gt_coords.dtype,
+            device=atom_gt_coords.device,
         )
-        # optionally add noise to coordinates before computing distances
-        token_ref_atom_coords = (
-            token_ref_atom_coords
-            + torch.randn_like(token_ref_atom_coords) * self.coord_noise
+        if self.coord_noise == 0:
+            # shared with other restraint generators
+            inter_token_dists = memoize(
+                _token_ref_atom_dists, atom_gt_coords, token_ref_atom_index
+            )
+        else:
+            token_ref_atom_coords = _gather_token_ref_atom_coords(
+                atom_gt_coords, token_ref_atom_index
+            )
+            inter_token_dists = cdist(token_ref_atom_coords + noise * self.coord_noise)
+        inter_token_dists = inter_token_dists.masked_fill(
+            ~valid_contact_mask, self.max_dist + 1
         )
-        inter_token_dists = cdist(token_ref_atom_coords)
-        inter_token_dists[~valid_contact_mask] = self.max_dist + 1
         # compute contacts by (1) sampling an upper bound on the distance
         # and (2) selecting pairwise distances below the threshold
         num_to_include = self.get_num_restraints(batch_size)
@@ -9,15 +9,25 @@ from torch import Tensor
 
 from chai_lab.data.features.feature_type import FeatureType
 from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
+from chai_lab.data.features.tiling import DEFAULT_TILE_SIZE, tiled_pair_feature
 from chai_lab.data.features.token_utils import get_centre_positions_and_mask
+from chai_lab.utils.static_cache import on_device
 from chai_lab.utils.tensor_utils import cdist
 from chai_lab.utils.typing import Bool, Float, Int, typecheck
 
 
 class TokenCenterDistance(FeatureGenerator):
+    input_keys = (
+        "atom_gt_coords",
+        "atom_exists_mask",
+        "token_exists_mask",
+        "token_centre_atom_index",
+    )
+
     def __init__(
         self,
         dist_bins: list[float] | None = None,
+        tile_size: int = DEFAULT_TILE_SIZE,
     ):
         dist_bins = dist_bins if dist_bins is not None else [0.0, 4.0, 8.0, 12.0, 16.0]
         super().__init__(
@@ -31,6 +41,7 @@ class TokenCenterDistance(FeatureGenerator):
 
         # maintain consistent orders
         self.dist_bins = torch.tensor(dist_bins)
+        self.tile_size = tile_size
 
     def get_input_kwargs_from_batch(self, batch: dict[str, Any]) -> dict:
         return dict(
@@ -55,11 +66,25 @@ class TokenCenterDistance(FeatureGenerator):
             token_centre_atom_index=token_center_atom_index,
             token_exists_mask=token_single_mask,
         )
-        feat = torch.searchsorted(
-            self.dist_bins.to(center_atom_coords.device), cdist(center_atom_coords)
-        )
-        center_atom_pair_exists = torch.einsum(
-            "b i, b j -> b i j", center_atom_mask, center_atom_mask
+        dist_bins = on_device(self.dist_bins, center_atom_coords.device)
+
+        def compute(rows: slice) -> Tensor:
+            feat = torch.searchsorted(
+                dist_bins,
+                cdist(center_atom_coords[:, rows], center_atom_coords),
+                out_int32=True,
+            )
+            center_atom_pair_exists = torch.einsum(
+                "b i, b j -> b i j", center_atom_mask[:, rows], center_atom_mask
+            )
+            return feat.masked_fill_(~center_atom_pair_exists, self.mask_value)
+
+        b, n = center_atom_mask.shape
+        feat = tiled_pair_feature(
+            compute,
+            shape=(b, n, n),
+            dtype=self.index_dtype,
+            device=center_atom_coords.device,
+            tile_size=self.tile_size,
         )
-        feat.masked_fill_(~center_atom_pair_exists, self.mask_value)
         return self.make_feature(feat.unsqueeze(-1))
@@ -69,6 +69,20 @@ class ConstraintGroup:
 
 
 class TokenPairPocketRestraint(FeatureGenerator):
+    input_keys = (
+        "pocket_constraints",
+        "atom_gt_coords",
+        "atom_exists_mask",
+        "token_asym_id",
+        "token_ref_atom_index",
+        "token_exists_mask",
+        "token_entity_type",
+        "token_residue_index",
+        "token_residue_name",
+        "subchain_id",
+    )
+    draws_random = True
+
     def __init__(
         self,
         include_probability: float = 1.0,
@@ -128,7 +142,7 @@ class TokenPairPocketRestraint(FeatureGenerator):
             atom_gt_coords=batch["inputs"]["atom_gt_coords"],
             atom_exists_mask=batch["inputs"]["atom_exists_mask"],
             token_asym_id=batch["inputs"]["token_asym_id"].long(),
-            token_ref_atom_index=batch["inputs"]["token_ref_atom_index"].long(),
+            token_ref_atom_index=batch["inputs"]["token_ref_atom_index"],
             token_exists_mask=batch["inputs"]["token_exists_mask"],
             token_entity_type=batch["inputs"]["token_entity_type"].long(),
             token_residue_index=batch["inputs"]["token_residue_index"].long(),
@@ -183,6 +197,18 @@ class TokenPairPocketRestraint(FeatureGenerator):
         token_exists_mask: Bool[Tensor, "b n"],
         token_entity_type: Int[Tensor, "b n"],
     ) -> Tensor:
+        if self.distance_restraint_gen.samples_no_restraints:
+            # no contacts, so no pockets
+            b, n = token_exists_mask.shape
+            self.distance_restraint_gen.skip_random_draws(
+                b, n, atom_gt_coords.dtype, atom_gt_coords.device
+            )
+            return self.make_constant_feature(
+                (b, n, n, 1),
+                self.ignore_idx,
+                dtype=torch.float32,
+                device=atom_gt_coords.device,
+            )
         contact_feat = self.distance_restraint_gen._generate_from_batch(
             atom_gt_coords=atom_gt_coords,
             atom_exists_mask=atom_exists_mask,
@@ -0,0 +1,72 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Intermediates shared between feature generators within one collation pass.
+
+Several generators derive the same intermediate (e.g. blocked atom pair distances,
+same-chain masks) from the same batch inputs. `FeatureFactory.generate` makes a
+`FeatureMemo` active for the generators it runs; they call `memoize` to compute
+each intermediate once. Tensor arguments are keyed by identity, so pass tensors
+straight from the batch rather than converted copies. Results are shared and must
+not be modified in place.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, TypeVar
+
+from torch import Tensor
+
+T = TypeVar("T")
+
+
+def _arg_key(arg: Any) -> Any:
+    return ("tensor", id(arg)) if isinstance(arg, Tensor) else arg
+
+
+class FeatureMemo:
+    def __init__(self):
+        # key -> (arguments, kept alive so their ids are not reused; result)
+        self._entries: dict[tuple, tuple[tuple, Any]] = {}
+        self._key_locks: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, fn: Callable[..., T], *args) -> T:
+        key = (fn, *(_arg_key(arg) for arg in args))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # generators may run concurrently, the first one computes
+        with key_lock:
+            if key in self._entries:
+                with self._lock:
+                    self.hits += 1
+                return self._entries[key][1]
+            result = fn(*args)
+            with self._lock:
+                self._entries[key] = (args, result)
+                self.misses += 1
+            return result
+
+    @contextmanager
+    def activate(self) -> Iterator["FeatureMemo"]:
+        token = _active_memo.set(self)
+        try:
+            yield self
+        finally:
+            _active_memo.reset(token)
+
+
+_active_memo: ContextVar[FeatureMemo | None] = ContextVar("_active_memo", default=None)
+
+
+def memoize(fn: Callable[..., T], *args) -> T:
+    """`fn(*args)`, computed once per active memo; uncached without one."""
+    memo = _active_memo.get()
+    if memo is None:
+        return fn(*args)
+    return memo.get_or_compute(fn, *args)
@@ -0,0 +1,48 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Row-tiled computation of pair features.
+
+Computed whole, a b x n x n pair feature materializes several intermediates of
+that size at once (broadcast differences, masks, distances, bin indices), so peak
+memory during collation is a multiple of the final feature. Computed in blocks of
+rows written into a preallocated output of the final dtype, intermediates are
+bounded by `tile_size` rows.
+"""
+
+from typing import Callable, Iterator
+
+import torch
+from torch import Tensor
+
+# rows per tile; at 2048 tokens a float32 tile intermediate is 1 MiB
+DEFAULT_TILE_SIZE = 128
+
+
+def row_tiles(n: int, tile_size: int = DEFAULT_TILE_SIZE) -> Iterator[slice]:
+    assert tile_size > 0, tile_size
+    for start in range(0, n, tile_size):
+        yield slice(start, min(start + tile_size, n))
+
+
+def tiled_pair_feature(
+    compute: Callable[[slice], Tensor],
+    shape: tuple[int, ...],
+    dtype: torch.dtype,
+    device: torch.device,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    dim: int = 1,
+) -> Tensor:
+    """Fills a feature of `shape` by blocks of rows along `dim`.
+
+    `compute(rows)` returns the feature at those rows, i.e. the output indexed
+    with `rows` along `dim`; it is cast to `dtype` as it is written.
+    """
+    out = torch.empty(shape, dtype=dtype, device=device)
+    index: list[slice] = [slice(None)] * len(shape)
+    for rows in row_tiles(shape[dim], tile_size):
+        index[dim] = rows
+        out[tuple(index)] = compute(rows)
+    return out
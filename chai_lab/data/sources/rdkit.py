@@ -2,6 +2,7 @@
 # This source code is licensed under the Chai Discovery Community License
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
+import functools
 import logging
 from pathlib import Path
 
@@ -171,6 +172,18 @@ def _get_adapters():
     return [TorchAntipickleAdapter(), DataclassAdapter(dict(conf=ConformerData))]
 
 
+@functools.lru_cache(maxsize=4096)
+def canonical_smiles(smiles: str) -> str:
+    """
+    RDKit's canonical form of `smiles`, equal for all spellings of a molecule (atom
+    order, aromatic or Kekulé form); `smiles` itself if RDKit cannot parse it.
+    """
+    block = BlockLogs()
+    mol = Chem.MolFromSmiles(smiles)
+    del block
+    return Chem.MolToSmiles(mol) if mol is not None else smiles
+
+
 def conformer_data_to_rdkit_mol(conformer: ConformerData) -> Chem.Mol:
     """Convert ConformerData to RDKit Mol
     RDKit Molecules can be used infer bonds (often better than the PDB) and compute
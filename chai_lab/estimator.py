@@ -0,0 +1,455 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Cost estimates for a job, computed from its FASTA file before tokenization.
+
+Token and atom counts follow the tokenizer: standard polymer residues are a
+single token with the atoms of their reference conformer, modified residues and
+ligands are tokenized per heavy atom. Runtime and peak memory of each stage are
+predicted from a calibration table fitted on the reports (report.json, see
+`chai_lab.utils.profiling`) of earlier runs on the same hardware:
+
+    python -m chai_lab.estimator fit outputs/*/report.json --output calibration.json
+    python -m chai_lab.estimator estimate input.fasta --calibration calibration.json
+
+A scheduler can reject or route jobs on the estimate before any expensive step
+(conformer generation, ESM, the model itself) runs.
+"""
+
+import json
+import logging
+import math
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from statistics import median
+from typing import Any, Callable
+
+import numpy as np
+import typer
+from rdkit import Chem
+
+from chai_lab.chai1 import UnsupportedInputError
+from chai_lab.data.collate.utils import AVAILABLE_MODEL_SIZES, pad_size
+from chai_lab.data.dataset.inference_dataset import Input, read_inputs
+from chai_lab.data.parsing.fasta import get_residue_name
+from chai_lab.data.parsing.input_validation import constituents_of_modified_fasta
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.data.residue_constants import standard_residue_pdb_codes
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+
+logger = logging.getLogger(__name__)
+
+# padded atoms per padded token, see `get_pad_sizes`
+ATOMS_PER_TOKEN = 23
+
+
+@dataclass(frozen=True)
+class InputSizes:
+    n_tokens: int
+    n_atoms: int
+    n_chains: int
+    # names of inputs the tokenizer would fail on; these are dropped from the job
+    dropped_chains: list[str] = field(default_factory=list)
+
+    @property
+    def model_size(self) -> int | None:
+        """Model size the job pads to, None if no model is large enough."""
+        if self.n_tokens > max(AVAILABLE_MODEL_SIZES):
+            return None
+        model_size = pad_size(self.n_tokens, AVAILABLE_MODEL_SIZES)
+        if self.n_atoms > ATOMS_PER_TOKEN * model_size:
+            return None
+        return model_size
+
+
+def _residue_tokens_and_atoms(
+    residue_name: str, conformer_generator: RefConformerGenerator
+) -> tuple[int, int] | None:
+    conformer = conformer_generator.get(residue_name)
+    if conformer is None:
+        # there is no ground truth to fall back to at inference
+        return None
+    if residue_name in standard_residue_pdb_codes:
+        return 1, conformer.num_atoms
+    return conformer.num_atoms, conformer.num_atoms
+
+
+def _chain_tokens_and_atoms(
+    inp: Input,
+    conformer_generator: RefConformerGenerator,
+    per_residue: dict[str, tuple[int, int] | None],
+) -> tuple[int, int] | None:
+    entity_type = EntityType(inp.entity_type)
+    if entity_type == EntityType.LIGAND:
+        mol = Chem.MolFromSmiles(inp.sequence)
+        if mol is None:
+            return None
+        return mol.GetNumHeavyAtoms(), mol.GetNumHeavyAtoms()
+
+    constituents = constituents_of_modified_fasta(inp.sequence)
+    assert constituents is not None, f"incorrect FASTA: {inp.sequence}"
+    n_tokens, n_atoms = 0, 0
+    for constituent in constituents:
+        residue_name = (
+            get_residue_name(constituent, entity_type=entity_type)
+            if len(constituent) == 1
+            else constituent
+        )
+        if residue_name not in per_residue:
+            per_residue[residue_name] = _residue_tokens_and_atoms(
+                residue_name, conformer_generator
+            )
+        counts = per_residue[residue_name]
+        if counts is None:
+            return None
+        n_tokens += counts[0]
+        n_atoms += counts[1]
+    return n_tokens, n_atoms
+
+
+def count_input_sizes(
+    inputs: list[Input], conformer_generator: RefConformerGenerator
+) -> InputSizes:
+    """Token and atom counts of the inputs, as the tokenizer would produce them."""
+    n_tokens, n_atoms, n_chains = 0, 0, 0
+    dropped_chains: list[str] = []
+    # counts per residue name, residues repeat a lot
+    per_residue: dict[str, tuple[int, int] | None] = {}
+    for inp in inputs:
+        counts = _chain_tokens_and_atoms(inp, conformer_generator, per_residue)
+        if counts is None:
+            dropped_chains.append(inp.entity_name)
+            continue
+        n_tokens += counts[0]
+        n_atoms += counts[1]
+        n_chains += 1
+
+    return InputSizes(
+        n_tokens=n_tokens,
+        n_atoms=n_atoms,
+        n_chains=n_chains,
+        dropped_chains=dropped_chains,
+    )
+
+
+# %%
+# Calibration
+
+# stages whose cost depends on the actual rather than the padded number of tokens
+_UNPADDED_STAGES = {"parse_inputs", "tokenize", "esm_embeddings"}
+# only run when the trunk cache is used
+_OPTIONAL_STAGES = {"trunk_cache_load", "trunk_cache_save"}
+# cost exponent in the number of tokens, used when only one size was observed;
+# pair representations are quadratic in the number of tokens
+_DEFAULT_EXPONENT = 2.0
+
+
+def _stage_key(stage: str) -> str:
+    # all recycles cost the same
+    return re.sub(r"^trunk_recycle_\d+$", "trunk_recycle", stage)
+
+
+def _stage_work(stage_key: str, metadata: dict[str, Any]) -> float:
+    """Units of work a stage does in a run, its cost is assumed linear in them."""
+    match stage_key:
+        case "diffusion":
+            return metadata["num_diffn_rounds"] * metadata["num_diffn_timesteps"]
+        case "confidence" | "ranking" | "write_outputs":
+            return metadata["num_samples"]
+        case _:
+            return 1.0
+
+
+@dataclass(frozen=True)
+class StageObservation:
+    size: int  # number of tokens, padded unless the stage is unpadded
+    seconds_per_work: float
+    peak_memory_bytes: int | None
+
+
+@dataclass(frozen=True)
+class StageEstimate:
+    seconds: float
+    peak_memory_bytes: int | None
+
+
+def _fit_power_law(
+    sizes: list[int],
+    values: list[float],
+    size: int,
+    reduce: Callable[[list[float]], float] = median,
+) -> float:
+    """
+    Predicts the value at `size` from the observations at that size, reduced with
+    `reduce`, or from a log-log linear fit to the observations at other sizes.
+    """
+    by_size: dict[int, list[float]] = {}
+    for s, v in zip(sizes, values, strict=True):
+        by_size.setdefault(s, []).append(v)
+    if size in by_size:
+        return reduce(by_size[size])
+
+    observed = sorted((s, reduce(vs)) for s, vs in by_size.items())
+    positive = [(s, v) for s, v in observed if v > 0]
+    if len(positive) >= 2:
+        slope, intercept = np.polyfit(
+            np.log([s for s, _ in positive]), np.log([v for _, v in positive]), deg=1
+        )
+        return float(math.exp(intercept + slope * math.log(size)))
+    # a single size observed, extrapolate from the closest one
+    nearest, value = min(observed, key=lambda sv: abs(math.log(sv[0] / size)))
+    return value * (size / nearest) ** _DEFAULT_EXPONENT
+
+
+@dataclass(frozen=True)
+class CostEstimate:
+    sizes: InputSizes
+    stages: dict[str, StageEstimate]
+
+    @property
+    def total_seconds(self) -> float:
+        # nested stages are included in their parent
+        return sum(s.seconds for name, s in self.stages.items() if "/" not in name)
+
+    @property
+    def peak_memory_bytes(self) -> int | None:
+        peaks = [
+            s.peak_memory_bytes
+            for s in self.stages.values()
+            if s.peak_memory_bytes is not None
+        ]
+        return max(peaks) if peaks else None
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(
+            n_tokens=self.sizes.n_tokens,
+            n_atoms=self.sizes.n_atoms,
+            n_chains=self.sizes.n_chains,
+            dropped_chains=self.sizes.dropped_chains,
+            model_size=self.sizes.model_size,
+            total_seconds=self.total_seconds,
+            peak_memory_bytes=self.peak_memory_bytes,
+            stages={name: asdict(s) for name, s in self.stages.items()},
+        )
+
+
+class CalibrationTable:
+    """Per-stage costs observed on one kind of hardware, keyed by stage."""
+
+    def __init__(
+        self,
+        observations: dict[str, list[StageObservation]],
+        device: str | None = None,
+    ):
+        self.observations = observations
+        self.device = device
+
+    @classmethod
+    def fit(cls, reports: list[dict[str, Any]]) -> "CalibrationTable":
+        """Builds a table from `InferenceReport.to_dict()` outputs."""
+        observations: dict[str, list[StageObservation]] = {}
+        devices = set()
+        for report in reports:
+            metadata = report.get("metadata", {})
+            if "model_size" not in metadata:
+                logger.warning("Skipping report without run metadata")
+                continue
+            devices.add(report["device"])
+            for stage, stats in report["stages"].items():
+                key = _stage_key(stage)
+                if key in _OPTIONAL_STAGES:
+                    continue
+                size = (
+                    metadata["n_tokens"]
+                    if key in _UNPADDED_STAGES
+                    else metadata["model_size"]
+                )
+                # repeated stages (e.g. ranking per sample) are summed in reports
+                observations.setdefault(key, []).append(
+                    StageObservation(
+                        size=size,
+                        seconds_per_work=stats["seconds"] / _stage_work(key, metadata),
+                        peak_memory_bytes=stats["peak_memory_bytes"],
+                    )
+                )
+        if len(devices) > 1:
+            logger.warning(f"Calibrating from reports on several devices: {devices}")
+        return cls(observations, device=next(iter(devices), None))
+
+    @classmethod
+    def fit_files(cls, paths: list[Path]) -> "CalibrationTable":
+        return cls.fit([json.loads(path.read_text()) for path in paths])
+
+    def save(self, path: Path):
+        path.write_text(
+            json.dumps(
+                dict(
+                    device=self.device,
+                    observations={
+                        stage: [asdict(o) for o in stage_observations]
+                        for stage, stage_observations in self.observations.items()
+                    },
+                ),
+                indent=2,
+            )
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "CalibrationTable":
+        saved = json.loads(path.read_text())
+        return cls(
+            {
+                stage: [StageObservation(**o) for o in stage_observations]
+                for stage, stage_observations in saved["observations"].items()
+            },
+            device=saved["device"],
+        )
+
+    def predict_stage(
+        self, stage_key: str, size: int, work: float
+    ) -> StageEstimate | None:
+        observations = self.observations.get(stage_key)
+        if not observations:
+            return None
+        sizes = [o.size for o in observations]
+        seconds = work * _fit_power_law(
+            sizes, [o.seconds_per_work for o in observations], size
+        )
+        memory = [
+            (o.size, o.peak_memory_bytes)
+            for o in observations
+            if o.peak_memory_bytes is not None
+        ]
+        # admission decisions should err on the safe side
+        peak_memory_bytes = (
+            int(
+                _fit_power_law(
+                    [s for s, _ in memory], [m for _, m in memory], size, reduce=max
+                )
+            )
+            if memory
+            else None
+        )
+        return StageEstimate(seconds=seconds, peak_memory_bytes=peak_memory_bytes)
+
+
+def estimate_cost(
+    fasta_file: Path,
+    *,
+    conformer_generator: RefConformerGenerator,
+    calibration: CalibrationTable | None = None,
+    use_esm_embeddings: bool = True,
+    num_trunk_recycles: int = 3,
+    num_diffn_timesteps: int = 200,
+    num_samples: int = 5,
+) -> CostEstimate:
+    """
+    Estimates the sizes of a job and, given a calibration table, the runtime and
+    peak memory of each stage. Trunk recycling is assumed to run to completion.
+    """
+    sizes = count_input_sizes(read_inputs(fasta_file), conformer_generator)
+    model_size = sizes.model_size
+    if calibration is None or model_size is None or sizes.n_chains == 0:
+        return CostEstimate(sizes=sizes, stages={})
+
+    metadata = dict(
+        num_samples=num_samples,
+        num_diffn_timesteps=num_diffn_timesteps,
+        num_diffn_rounds=math.ceil(num_samples / 5),
+    )
+    stages: dict[str, StageEstimate] = {}
+    for stage_key in calibration.observations:
+        if stage_key == "esm_embeddings" and not use_esm_embeddings:
+            continue
+        size = sizes.n_tokens if stage_key in _UNPADDED_STAGES else model_size
+        estimate = calibration.predict_stage(
+            stage_key, size, work=_stage_work(stage_key, metadata)
+        )
+        assert estimate is not None
+        if stage_key == "trunk_recycle":
+            for recycle_idx in range(num_trunk_recycles):
+                stages[f"trunk_recycle_{recycle_idx}"] = estimate
+        else:
+            stages[stage_key] = estimate
+    return CostEstimate(sizes=sizes, stages=stages)
+
+
+# %%
+# Admission control
+
+
+def raise_if_not_admissible(
+    estimate: CostEstimate,
+    *,
+    max_peak_memory_bytes: int | None = None,
+    max_seconds: float | None = None,
+):
+    """Rejects jobs no model can run, or predicted to exceed the given budgets."""
+    sizes = estimate.sizes
+    if sizes.n_chains == 0:
+        raise UnsupportedInputError("No input can be tokenized")
+    if sizes.model_size is None:
+        raise UnsupportedInputError(
+            f"Input too large: {sizes.n_tokens} tokens and {sizes.n_atoms} atoms, "
+            f"at most {max(AVAILABLE_MODEL_SIZES)} tokens and {ATOMS_PER_TOKEN} "
+            "atoms per token are supported"
+        )
+    peak_memory_bytes = estimate.peak_memory_bytes
+    if (
+        max_peak_memory_bytes is not None
+        and peak_memory_bytes is not None
+        and peak_memory_bytes > max_peak_memory_bytes
+    ):
+        raise UnsupportedInputError(
+            f"Predicted peak memory {peak_memory_bytes / 2**30:.1f} GiB exceeds "
+            f"{max_peak_memory_bytes / 2**30:.1f} GiB"
+        )
+    if (
+        max_seconds is not None
+        and estimate.stages
+        and estimate.total_seconds > max_seconds
+    ):
+        raise UnsupportedInputError(
+            f"Predicted runtime {estimate.total_seconds:.0f}s exceeds {max_seconds:.0f}s"
+        )
+
+
+# %%
+# CLI
+
+cli = typer.Typer()
+
+
+@cli.command()
+def fit(reports: list[Path], output: Path = Path("calibration.json")):
+    """Fit a calibration table to the report.json files of earlier runs."""
+    CalibrationTable.fit_files(reports).save(output)
+
+
+@cli.command()
+def estimate(
+    fasta_file: Path,
+    calibration: Path | None = None,
+    use_esm_embeddings: bool = True,
+    num_trunk_recycles: int = 3,
+    num_diffn_timesteps: int = 200,
+    num_samples: int = 5,
+):
+    """Print the estimated sizes, runtime and peak memory of a job."""
+    cost = estimate_cost(
+        fasta_file,
+        conformer_generator=RefConformerGenerator(),
+        calibration=CalibrationTable.load(calibration) if calibration else None,
+        use_esm_embeddings=use_esm_embeddings,
+        num_trunk_recycles=num_trunk_recycles,
+        num_diffn_timesteps=num_diffn_timesteps,
+        num_samples=num_samples,
+    )
+    print(json.dumps(cost.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,267 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Samplers that integrate the diffusion ODE/SDE given a denoiser.
+
+Each denoiser call is a full forward pass of the diffusion module, so samplers
+differ mostly in how many calls they need for a given number of timesteps:
+- EDMSampler: stochastic Heun sampler (Karras et al. 2022, Alg. 2), two calls per
+  step. Can fall back to Euler steps at low noise levels.
+- MultistepSampler: second-order Adams-Bashforth; reuses the previous step's
+  denoiser output, so one call per step.
+- AdaptiveSampler: Heun steps of adaptive size over the noise schedule, growing
+  the step while the Euler/Heun discrepancy stays within tolerance.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import torch
+from einops import einsum
+from torch import Tensor
+from tqdm import tqdm
+
+from chai_lab.model.diffusion_schedules import InferenceNoiseSchedule
+from chai_lab.model.utils import center_random_augmentation, random_rotations
+from chai_lab.utils.static_cache import static_cached
+from chai_lab.utils.typing import Bool, Float, typecheck
+
+# (noised coords "s a 3", noise level "") -> denoised coords "s a 3"
+DenoiseFn = Callable[[Tensor, Tensor], Tensor]
+
+
+def _default_noise_schedule() -> InferenceNoiseSchedule:
+    return InferenceNoiseSchedule(s_max=80.0, s_min=4e-4, p=7.0, sigma_data=16.0)
+
+
+def _sigmas_and_gammas(
+    sampler: "DiffusionSampler", num_timesteps: int, device: torch.device
+) -> tuple[Tensor, Tensor]:
+    sigmas = sampler.noise_schedule.get_schedule(
+        device=device, num_timesteps=num_timesteps
+    )
+    gammas = torch.where(
+        (sigmas >= sampler.S_tmin) & (sigmas <= sampler.S_tmax),
+        min(sampler.S_churn / num_timesteps, math.sqrt(2) - 1),
+        0.0,
+    )
+    return sigmas, gammas
+
+
+@dataclass(frozen=True)
+class DiffusionSampler(ABC):
+    noise_schedule: InferenceNoiseSchedule = field(
+        default_factory=_default_noise_schedule
+    )
+    # stochastic churn, see Karras et al. 2022
+    S_churn: float = 80.0
+    S_tmin: float = 4e-4
+    S_tmax: float = 80.0
+    S_noise: float = 1.003
+
+    def get_sigmas_and_gammas(
+        self, num_timesteps: int, device: torch.device
+    ) -> tuple[Float[Tensor, "t"], Float[Tensor, "t"]]:
+        # shared between calls, see chai_lab.utils.static_cache
+        return static_cached(
+            _sigmas_and_gammas, self, num_timesteps, torch.device(device)
+        )
+
+    def add_churn(
+        self, atom_pos: Tensor, sigma: Tensor, gamma: Tensor
+    ) -> tuple[Tensor, Tensor]:
+        """Raises the noise level from sigma to sigma_hat, Alg 2. lines 4-6"""
+        noise = self.S_noise * torch.randn(atom_pos.shape, device=atom_pos.device)
+        sigma_hat = sigma + gamma * sigma
+        atom_pos_noise = (sigma_hat**2 - sigma**2).clamp_min(1e-6).sqrt()
+        return atom_pos + noise * atom_pos_noise, sigma_hat
+
+    @abstractmethod
+    def sample(
+        self,
+        denoise: DenoiseFn,
+        atom_single_mask: Bool[Tensor, "s a"],
+        num_timesteps: int,
+    ) -> Float[Tensor, "s a 3"]:
+        """Draws one sample per row of atom_single_mask."""
+
+
+@dataclass(frozen=True)
+class EDMSampler(DiffusionSampler):
+    second_order: bool = True
+    # skip the second order correction once the target noise level is at or
+    # below this value; late steps are small and Euler is usually accurate enough
+    second_order_min_sigma: float = 0.0
+
+    @typecheck
+    def sample(
+        self,
+        denoise: DenoiseFn,
+        atom_single_mask: Bool[Tensor, "s a"],
+        num_timesteps: int,
+    ) -> Float[Tensor, "s a 3"]:
+        device = atom_single_mask.device
+        sigmas, gammas = self.get_sigmas_and_gammas(num_timesteps, device)
+        sigmas_and_gammas = list(zip(sigmas[:-1], sigmas[1:], gammas[:-1]))
+
+        # Initial atom positions
+        num_samples, num_atoms = atom_single_mask.shape
+        atom_pos = sigmas[0] * torch.randn(num_samples, num_atoms, 3, device=device)
+
+        for sigma_curr, sigma_next, gamma_curr in tqdm(
+            sigmas_and_gammas, desc="Diffusion steps"
+        ):
+            # Center coords
+            atom_pos = center_random_augmentation(
+                atom_pos, atom_single_mask=atom_single_mask
+            )
+
+            atom_pos_hat, sigma_hat = self.add_churn(atom_pos, sigma_curr, gamma_curr)
+
+            # Lines 7-8
+            denoised_pos = denoise(atom_pos_hat, sigma_hat)
+            d_i = (atom_pos_hat - denoised_pos) / sigma_hat
+            atom_pos = atom_pos_hat + (sigma_next - sigma_hat) * d_i
+
+            # Lines 9-11
+            if self.second_order and sigma_next > self.second_order_min_sigma:
+                denoised_pos = denoise(atom_pos, sigma_next)
+                d_i_prime = (atom_pos - denoised_pos) / sigma_next
+                atom_pos = atom_pos + (sigma_next - sigma_hat) * ((d_i_prime + d_i) / 2)
+
+        return atom_pos
+
+
+@dataclass(frozen=True)
+class MultistepSampler(DiffusionSampler):
+    """
+    Variable step size Adams-Bashforth 2, one denoiser call per step.
+    The first step is a plain Euler step.
+    """
+
+    @typecheck
+    def sample(
+        self,
+        denoise: DenoiseFn,
+        atom_single_mask: Bool[Tensor, "s a"],
+        num_timesteps: int,
+    ) -> Float[Tensor, "s a 3"]:
+        device = atom_single_mask.device
+        sigmas, gammas = self.get_sigmas_and_gammas(num_timesteps, device)
+        sigmas_and_gammas = list(zip(sigmas[:-1], sigmas[1:], gammas[:-1]))
+
+        num_samples, num_atoms = atom_single_mask.shape
+        atom_pos = sigmas[0] * torch.randn(num_samples, num_atoms, 3, device=device)
+
+        prev_d: Tensor | None = None
+        prev_step: Tensor | None = None
+        for sigma_curr, sigma_next, gamma_curr in tqdm(
+            sigmas_and_gammas, desc="Diffusion steps"
+        ):
+            rotations = random_rotations(num_samples, device=device)
+            atom_pos = center_random_augmentation(
+                atom_pos, atom_single_mask=atom_single_mask, rotations=rotations
+            )
+            atom_pos_hat, sigma_hat = self.add_churn(atom_pos, sigma_curr, gamma_curr)
+
+            d_i = (atom_pos_hat - denoise(atom_pos_hat, sigma_hat)) / sigma_hat
+            step = sigma_next - sigma_hat
+
+            if prev_d is None or prev_step is None or sigma_next == 0:
+                atom_pos = atom_pos_hat + step * d_i
+            else:
+                # the previous derivative lives in the frame before augmentation
+                prev_d = einsum(rotations, prev_d, "s i j, s a j -> s a i")
+                ratio = step / prev_step
+                atom_pos = atom_pos_hat + step * (
+                    (1 + ratio / 2) * d_i - (ratio / 2) * prev_d
+                )
+            prev_d, prev_step = d_i, step
+
+        return atom_pos
+
+
+@dataclass(frozen=True)
+class AdaptiveSampler(DiffusionSampler):
+    """
+    Heun steps that skip over points of the noise schedule while accurate enough.
+
+    The local error of a step is the masked RMS of (Heun - Euler) / delta, where
+    delta = max(atol, rtol * |x|). Steps with error above 1 are retried with half
+    the stride; strides double while the error stays below 1/2.
+    The first denoiser call of a step does not depend on the stride, so a
+    rejected step only costs one extra call.
+    """
+
+    atol: float = 0.1
+    rtol: float = 0.05
+    max_stride: int = 8
+
+    @typecheck
+    def sample(
+        self,
+        denoise: DenoiseFn,
+        atom_single_mask: Bool[Tensor, "s a"],
+        num_timesteps: int,
+    ) -> Float[Tensor, "s a 3"]:
+        device = atom_single_mask.device
+        sigmas, gammas = self.get_sigmas_and_gammas(num_timesteps, device)
+        last = len(sigmas) - 1
+
+        num_samples, num_atoms = atom_single_mask.shape
+        atom_pos = sigmas[0] * torch.randn(num_samples, num_atoms, 3, device=device)
+        mask = atom_single_mask[..., None].to(atom_pos.dtype)
+        num_masked_coords = (mask.sum() * 3).clamp_min(1)
+
+        idx, stride = 0, 1
+        with tqdm(total=last, desc="Diffusion steps") as progress:
+            while idx < last:
+                atom_pos = center_random_augmentation(
+                    atom_pos, atom_single_mask=atom_single_mask
+                )
+                atom_pos_hat, sigma_hat = self.add_churn(
+                    atom_pos, sigmas[idx], gammas[idx]
+                )
+                d_i = (atom_pos_hat - denoise(atom_pos_hat, sigma_hat)) / sigma_hat
+
+                while True:
+                    next_idx = min(idx + stride, last)
+                    sigma_next = sigmas[next_idx]
+                    atom_pos_euler = atom_pos_hat + (sigma_next - sigma_hat) * d_i
+                    if sigma_next == 0:  # no correction possible
+                        atom_pos = atom_pos_euler
+                        break
+
+                    d_i_prime = (
+                        atom_pos_euler - denoise(atom_pos_euler, sigma_next)
+                    ) / sigma_next
+                    atom_pos_heun = atom_pos_hat + (sigma_next - sigma_hat) * (
+                        (d_i_prime + d_i) / 2
+                    )
+                    delta = torch.maximum(
+                        torch.full_like(atom_pos_heun, self.atol),
+                        self.rtol
+                        * torch.maximum(atom_pos_euler.abs(), atom_pos_heun.abs()),
+                    )
+                    error = (
+                        (((atom_pos_heun - atom_pos_euler) / delta).square() * mask)
+                        .sum()
+                        .div(num_masked_coords)
+                        .sqrt()
+                        .item()
+                    )
+                    if error <= 1.0 or stride == 1:
+                        atom_pos = atom_pos_heun
+                        if error <= 0.5:
+                            stride = min(2 * stride, self.max_stride)
+                        break
+                    stride //= 2
+
+                progress.update(next_idx - idx)
+                idx = next_idx
+
+        return atom_pos
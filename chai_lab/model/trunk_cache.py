@@ -0,0 +1,126 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Disk cache of embedding and trunk outputs.
+
+Sampling different seeds or samplers for the same inputs only needs the diffusion
+module and confidence head; everything up to the trunk is deterministic given the
+collated features. Entries are keyed by a hash of the features and the
+trunk-relevant inputs, the model size and the recycling settings, and are loaded
+memory-mapped.
+
+Reference conformers of modified residues and of ligands named by CCD code (not
+given as SMILES) are randomly rotated and translated each time they are
+tokenized, see `AllAtomResidueTokenizer._is_augmented`. Their reference positions
+are features, so inputs with such residues get a different key on every run and
+never hit the cache; the tokenizer logs the residues this applies to.
+"""
+
+import dataclasses
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import torch
+from torch import Tensor
+
+logger = logging.getLogger(__name__)
+
+# bump when the cached content changes meaning
+_CACHE_VERSION = 1
+
+# inputs consumed by the feature embedder, token input embedder or trunk
+_TRUNK_INPUT_KEYS = (
+    "atom_exists_mask",
+    "atom_token_index",
+    "block_atom_pair_kv_idces",
+    "block_atom_pair_mask",
+    "block_atom_pair_q_idces",
+    "msa_mask",
+    "template_mask",
+    "token_exists_mask",
+)
+
+
+@dataclass(frozen=True)
+class TrunkOutputs:
+    token_single_initial_repr: Tensor
+    token_single_structure_input: Tensor
+    token_pair_initial_repr: Tensor
+    token_single_trunk_repr: Tensor
+    token_pair_trunk_repr: Tensor
+    # structure halves of the embedded features, consumed by the diffusion module
+    token_pair_structure_input_feats: Tensor
+    atom_single_structure_input_feats: Tensor
+    block_atom_pair_structure_input_feats: Tensor
+    num_trunk_recycles: int
+
+
+def _update_hash(h: Any, name: str, tensor: Tensor):
+    h.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+    # reinterpret as bytes, works for dtypes numpy does not know (e.g. bfloat16)
+    h.update(tensor.detach().cpu().contiguous().flatten().view(torch.uint8).numpy())
+
+
+class TrunkCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(
+        self,
+        batch: dict[str, Any],
+        model_size: int,
+        num_trunk_recycles: int,
+        trunk_convergence_tol: float | None,
+    ) -> str:
+        """Hash of a collated batch, computed before it is moved to the device."""
+        h = hashlib.sha256()
+        h.update(
+            f"v{_CACHE_VERSION}:{model_size}:{num_trunk_recycles}:"
+            f"{trunk_convergence_tol}".encode()
+        )
+        for name in sorted(batch["features"]):
+            _update_hash(h, name, batch["features"][name])
+        for name in _TRUNK_INPUT_KEYS:
+            _update_hash(h, name, batch["inputs"][name])
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pt"
+
+    def load(self, key: str, device: torch.device) -> TrunkOutputs | None:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        logger.info(f"Loading trunk outputs from {path}")
+        saved: dict[str, Any] = torch.load(
+            path, map_location="cpu", mmap=True, weights_only=True
+        )
+        loaded: dict[str, Any] = {
+            name: value.to(device) if isinstance(value, Tensor) else value
+            for name, value in saved.items()
+        }
+        return TrunkOutputs(**loaded)
+
+    def save(self, key: str, outputs: TrunkOutputs):
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+        to_save = {
+            field.name: getattr(outputs, field.name)
+            for field in dataclasses.fields(outputs)
+        }
+        torch.save(
+            {
+                name: value.cpu() if isinstance(value, Tensor) else value
+                for name, value in to_save.items()
+            },
+            tmp_path,
+        )
+        # atomic, concurrent writers of the same key produce identical files
+        os.replace(tmp_path, path)
@@ -5,7 +5,7 @@
 from dataclasses import dataclass
 
 import torch
-from einops import rearrange, reduce, repeat
+from einops import rearrange, reduce
 from torch import Tensor
 
 import chai_lab.ranking.utils as rank_utils
@@ -112,23 +112,24 @@ def get_scores(
     # dimensions
     n_chains = atom_asym_id.amax().add(1).item()
     assert isinstance(n_chains, int)
-    *b, a = atom_mask.shape
+    *b, _ = atom_mask.shape
 
-    clashes_a_a = _compute_clashes(atom_coords, atom_mask, clash_threshold)
-    clashes_a_a = clashes_a_a.to(torch.int32)  # b a a
+    clashes_a_a = _compute_clashes(atom_coords, atom_mask, clash_threshold)  # b a a
 
-    clashes_a_chain = clashes_a_a.new_zeros(*b, a, n_chains)
-    clashes_a_chain.scatter_add_(
-        dim=-1,
-        src=clashes_a_a,
-        index=repeat(atom_asym_id, f"b a -> b {a} a"),
+    # clashes are sparse, accumulate them per chain pair from their indices
+    # rather than through dense (b, a, a) counts
+    batch_idx, atom_i, atom_j = torch.nonzero(clashes_a_a, as_tuple=True)
+    clashes_chain_chain = torch.zeros(
+        *b, n_chains, n_chains, dtype=torch.int32, device=atom_coords.device
     )
-
-    clashes_chain_chain = clashes_a_a.new_zeros(*b, n_chains, n_chains)
-    clashes_chain_chain.scatter_add_(
-        dim=-2,
-        src=clashes_a_chain,
-        index=repeat(atom_asym_id, f"b a -> b a {n_chains}"),
+    clashes_chain_chain.index_put_(
+        (
+            batch_idx,
+            atom_asym_id[batch_idx, atom_i],
+            atom_asym_id[batch_idx, atom_j],
+        ),
+        torch.ones_like(batch_idx, dtype=torch.int32),
+        accumulate=True,
     )
     # i, j enumerate chains
     total_clashes = reduce(clashes_chain_chain, "... i j -> ...", "sum") // 2
@@ -136,12 +137,12 @@ def get_scores(
     # NB: self-interaction of chain contains doubled self-interaction,
     #  we compensate for this.
     clashes_chain_chain = clashes_chain_chain // (
-        1 + torch.diag(clashes_a_a.new_ones(n_chains))
+        1 + torch.diag(clashes_chain_chain.new_ones(n_chains))
     )
     # in case anyone needs
     # per_chain_intra_clashes = torch.einsum("... i i -> ... i", clashes_chain_chain)
     # delete self-interaction for simplicity
-    non_diag = 1 - torch.diag(clashes_a_a.new_ones(n_chains))
+    non_diag = 1 - torch.diag(clashes_chain_chain.new_ones(n_chains))
     inter_chain_chain = non_diag * clashes_chain_chain
 
     inter_chain_clashes = (
@@ -7,6 +7,7 @@ from einops import rearrange, repeat
 from torch import Tensor
 
 from chai_lab.data.features.token_utils import get_centre_positions_and_mask
+from chai_lab.utils.static_cache import diagonal_mask
 from chai_lab.utils.tensor_utils import cdist, und_self
 from chai_lab.utils.typing import Bool, Float, Int, typecheck
 
@@ -81,7 +82,7 @@ def get_single_atom_frames(
 
     # Mask out diagonal
     batch_indices = torch.arange(B, device=device)[..., None, None]
-    dists[batch_indices, torch.eye(tokens, device=device).bool()] = torch.inf
+    dists[batch_indices, diagonal_mask(tokens, device)] = torch.inf
 
     _, idces = torch.topk(dists, 2, dim=-1, largest=False)  # b, n_tokens, 2
     a, c = idces.unbind(dim=-1)
@@ -121,11 +122,13 @@ def get_single_atom_frames(
 
     # Positions where the token backbone was NOT already defined, shares the same
     # entity_id, are not co-linear, and is actually a centre atom
-    mask = torch.ones_like(token_backbone_frame_mask)
-    for i in range(mask.shape[0]):
-        all_idces, counts = torch.unique(atom_token_index[i], return_counts=True)
-        not_single_idces = all_idces[counts != 1]
-        mask[i, not_single_idces] = False
+    num_atoms_per_token = torch.zeros_like(token_asym_id, dtype=torch.int64)
+    num_atoms_per_token.scatter_add_(
+        -1,
+        atom_token_index.long(),
+        torch.ones_like(atom_token_index, dtype=torch.int64),
+    )
+    mask = num_atoms_per_token <= 1
 
     mask &= (
         ~token_backbone_frame_mask
@@ -2,7 +2,8 @@
 # This source code is licensed under the Chai Discovery Community License
 # Agreement (LICENSE.md) found in the root directory of this source tree.
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from typing import Any
 
 import numpy as np
 import torch
@@ -33,6 +34,30 @@ class SampleRanking:
     clash_scores: clashes.ClashScores
     plddt_scores: plddt.PLDDTScores
 
+    def split_samples(self) -> list["SampleRanking"]:
+        """Splits the ranking of a batch of samples into one ranking per sample."""
+        num_samples = self.aggregate_score.shape[0]
+        return [
+            SampleRanking(
+                asym_ids=self.asym_ids,
+                aggregate_score=self.aggregate_score[idx : idx + 1],
+                ptm_scores=_select_sample(self.ptm_scores, idx),
+                clash_scores=_select_sample(self.clash_scores, idx),
+                plddt_scores=_select_sample(self.plddt_scores, idx),
+            )
+            for idx in range(num_samples)
+        ]
+
+
+def _select_sample(scores: Any, idx: int) -> Any:
+    # keeps the leading batch dimension, as if ranked one sample at a time
+    return type(scores)(
+        **{
+            field.name: getattr(scores, field.name)[idx : idx + 1]
+            for field in fields(scores)
+        }
+    )
+
 
 @typecheck
 def rank(
@@ -0,0 +1,473 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Local inference server.
+
+Keeps exported model components, the reference conformer library and ESM loaded in
+a single process and folds submitted jobs one at a time, in submission order.
+Nothing is downloaded at serving time once weights and conformers are present in
+the downloads folder, so the server runs fully offline.
+
+    python -m chai_lab.server --port 8000 --device cuda:0
+
+Endpoints:
+    POST /jobs       submit a job (JSON body with `JobRequest` fields) -> {"job_id"}
+    POST /estimate   estimated sizes and costs of a job, without submitting it
+    GET  /jobs/<id>  state of a job, output paths, scores and per-stage timings
+    GET  /status     queue depth and mean per-stage timings over finished jobs
+
+With a calibration table (see chai_lab.estimator), jobs predicted to exceed the
+memory or time budget are rejected at submission, as are jobs too large for any
+model. Estimates run one at a time on their own thread, and not while the worker
+tokenizes, as both use the server's conformer library; request bodies and FASTA
+files are limited to `max_request_bytes`.
+"""
+
+import json
+import logging
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator
+
+import torch
+import typer
+
+from chai_lab.chai1 import (
+    Chai1Session,
+    StructureCandidates,
+    UnsupportedInputError,
+    _load_chains_from_fasta,
+    _make_feature_context,
+    prewarm_static_cache,
+)
+from chai_lab.data.dataset.constraints.constraint_context import (
+    ConstraintContext,
+    ContactConstraint,
+    PocketConstraint,
+)
+from chai_lab.data.dataset.inference_dataset import make_tokenizer_pool
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+)
+from chai_lab.data.dataset.structure.entity_cache import EntityCache
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+from chai_lab.estimator import (
+    CalibrationTable,
+    CostEstimate,
+    estimate_cost,
+    raise_if_not_admissible,
+)
+from chai_lab.ranking.rank import get_scores
+from chai_lab.utils.profiling import InferenceReport
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JobRequest:
+    output_dir: str
+    # either the FASTA content or a path to a FASTA file readable by the server
+    fasta: str | None = None
+    fasta_file: str | None = None
+    use_esm_embeddings: bool = True
+    num_trunk_recycles: int = 3
+    trunk_convergence_tol: float | None = None
+    num_diffn_timesteps: int = 200
+    num_samples: int = 5
+    seed: int | None = None
+    # fields of the respective ConstraintGroup dataclasses
+    contact_constraints: list[dict[str, Any]] | None = None
+    pocket_constraints: list[dict[str, Any]] | None = None
+
+    def __post_init__(self):
+        if (self.fasta is None) == (self.fasta_file is None):
+            raise ValueError("Exactly one of fasta and fasta_file must be provided")
+
+
+@dataclass
+class Job:
+    job_id: str
+    request: JobRequest
+    state: str = "queued"  # queued -> running -> done | failed
+    submitted_at: float = field(default_factory=time.time)
+    timings: dict[str, float] = field(default_factory=dict)
+    estimate: dict[str, Any] | None = None
+    result: dict[str, Any] | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        """Snapshot of the job; call it under the server's lock, see `get_job`."""
+        return dict(
+            job_id=self.job_id,
+            state=self.state,
+            request=asdict(self.request),
+            timings=dict(self.timings),
+            estimate=self.estimate,
+            result=self.result,
+            error=self.error,
+        )
+
+
+class InferenceServer:
+    """Job queue and a single worker thread that folds jobs with resident models."""
+
+    def __init__(
+        self,
+        device: torch.device,
+        max_component_bytes: int | None = None,
+        max_finished_jobs: int = 1000,
+        trunk_cache_dir: Path | None = None,
+        calibration: CalibrationTable | None = None,
+        max_job_memory_bytes: int | None = None,
+        max_job_seconds: float | None = None,
+        entity_cache_dir: Path | None = None,
+        tokenizer_workers: int = 0,
+        max_request_bytes: int = 1 << 20,
+    ):
+        self.device = device
+        self.trunk_cache_dir = trunk_cache_dir
+        self.calibration = calibration
+        self.max_job_memory_bytes = max_job_memory_bytes
+        self.max_job_seconds = max_job_seconds
+        self.session = Chai1Session(max_bytes=max_component_bytes)
+        # loading the conformer library is slow, do it once
+        self.tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+        # targets recur across jobs, tokenize each once
+        self.entity_cache = EntityCache(cache_dir=entity_cache_dir)
+        self.tokenizer_pool = (
+            make_tokenizer_pool(tokenizer_workers) if tokenizer_workers > 0 else None
+        )
+        self.max_finished_jobs = max_finished_jobs
+        self.max_request_bytes = max_request_bytes
+
+        # estimates are served off the request threads, one at a time, and hold
+        # the tokenizer lock so they do not run alongside the worker's tokenization
+        self._estimate_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="estimate"
+        )
+        self._tokenizer_lock = threading.Lock()
+
+        self._queue: queue.Queue[Job] = queue.Queue()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._running: Job | None = None
+        self._stage_totals: dict[str, float] = defaultdict(float)
+        self._stage_counts: dict[str, int] = defaultdict(int)
+
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    def preload(self, model_sizes: list[int]):
+        components = [
+            "feature_embedding",
+            "token_input_embedder",
+            "trunk",
+            "diffusion_module",
+            "confidence_head",
+        ]
+        for model_size in model_sizes:
+            for component in components:
+                self.session.load_exported(f"{model_size}/{component}.pt2", self.device)
+
+    def estimate(self, request: JobRequest) -> CostEstimate:
+        """
+        Estimate of a job; has no side effects, output_dir is not created.
+        Raises ValueError if the inputs are too large or cannot be parsed.
+        """
+        return self._estimate_pool.submit(self._estimate, request).result()
+
+    def _estimate(self, request: JobRequest) -> CostEstimate:
+        with _readable_fasta_file(request) as fasta_file:
+            try:
+                if fasta_file.stat().st_size > self.max_request_bytes:
+                    raise ValueError(
+                        f"FASTA file larger than {self.max_request_bytes} bytes"
+                    )
+                with self._tokenizer_lock:
+                    return estimate_cost(
+                        fasta_file,
+                        conformer_generator=self.tokenizer.ref_conformer_generator,
+                        calibration=self.calibration,
+                        use_esm_embeddings=request.use_esm_embeddings,
+                        num_trunk_recycles=request.num_trunk_recycles,
+                        num_diffn_timesteps=request.num_diffn_timesteps,
+                        num_samples=request.num_samples,
+                    )
+            except ValueError:
+                raise
+            except Exception as e:
+                # e.g. missing files or RDKit errors, a bad request not a server error
+                raise ValueError(f"Could not parse inputs: {e!r}") from e
+
+    def shutdown(self):
+        self._estimate_pool.shutdown()
+        if self.tokenizer_pool is not None:
+            self.tokenizer_pool.shutdown()
+
+    def submit(self, request: JobRequest) -> str:
+        """Queues a job; raises UnsupportedInputError if it is not admissible."""
+        estimate = self.estimate(request)
+        raise_if_not_admissible(
+            estimate,
+            max_peak_memory_bytes=self.max_job_memory_bytes,
+            max_seconds=self.max_job_seconds,
+        )
+        job = Job(job_id=uuid.uuid4().hex, request=request, estimate=estimate.to_dict())
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._queue.put(job)
+        return job.job_id
+
+    def get_job(self, job_id: str) -> dict[str, Any] | None:
+        """Snapshot of a job, the worker keeps updating the job itself."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            return dict(
+                queue_depth=self._queue.qsize(),
+                running=self._running.job_id if self._running is not None else None,
+                num_jobs=len(self._jobs),
+                mean_stage_seconds={
+                    stage: total / self._stage_counts[stage]
+                    for stage, total in self._stage_totals.items()
+                },
+                cached_component_bytes=self.session.cached_bytes,
+            )
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            # job fields are read by request handlers, write them under the lock
+            with self._lock:
+                job.timings["queued"] = time.time() - job.submitted_at
+                self._running = job
+                job.state = "running"
+            try:
+                result = self._run(job)
+                with self._lock:
+                    job.result = result
+                    job.state = "done"
+            except Exception as e:
+                logger.exception(f"Job {job.job_id} failed")
+                with self._lock:
+                    job.error = repr(e)
+                    job.state = "failed"
+            with self._lock:
+                self._running = None
+                for stage, seconds in job.timings.items():
+                    self._stage_totals[stage] += seconds
+                    self._stage_counts[stage] += 1
+                self._forget_old_jobs()
+            self._queue.task_done()
+
+    def _forget_old_jobs(self):
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.state in ("done", "failed")
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job) -> dict[str, Any]:
+        request = job.request
+        output_dir = Path(request.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if request.fasta_file is not None:
+            fasta_file = Path(request.fasta_file)
+        else:
+            assert request.fasta is not None
+            # kept next to the outputs
+            fasta_file = output_dir / "input.fasta"
+            fasta_file.write_text(request.fasta)
+
+        report = InferenceReport(self.device)
+        try:
+            with report.activate():
+                candidates = self._fold(request, fasta_file, output_dir)
+        finally:
+            # also keep the timings of the stages a failed job got through
+            with self._lock:
+                job.timings.update(
+                    {name: stats.seconds for name, stats in report.stages.items()}
+                )
+
+        return dict(
+            cif_paths=[str(p) for p in candidates.cif_paths],
+            num_trunk_recycles=candidates.num_trunk_recycles,
+            scores=[
+                {k: v.tolist() for k, v in get_scores(ranking).items()}
+                for ranking in candidates.ranking_data
+            ],
+            report=report.to_dict(),
+        )
+
+    def _fold(
+        self, request: JobRequest, fasta_file: Path, output_dir: Path
+    ) -> StructureCandidates:
+        with self._tokenizer_lock:
+            chains = _load_chains_from_fasta(
+                fasta_file,
+                tokenizer=self.tokenizer,
+                entity_cache=self.entity_cache,
+                tokenizer_pool=self.tokenizer_pool,
+            )
+        constraint_context = ConstraintContext(
+            docking_constraints=None,
+            contact_constraints=(
+                [ContactConstraint(**c) for c in request.contact_constraints]
+                if request.contact_constraints
+                else None
+            ),
+            pocket_constraints=(
+                [PocketConstraint(**c) for c in request.pocket_constraints]
+                if request.pocket_constraints
+                else None
+            ),
+        )
+        feature_context = _make_feature_context(
+            chains,
+            use_esm_embeddings=request.use_esm_embeddings,
+            device=self.device,
+            constraint_context=constraint_context,
+        )
+
+        return self.session.run_folding_on_context(
+            feature_context,
+            output_dir=output_dir,
+            num_trunk_recycles=request.num_trunk_recycles,
+            trunk_convergence_tol=request.trunk_convergence_tol,
+            num_diffn_timesteps=request.num_diffn_timesteps,
+            num_samples=request.num_samples,
+            seed=request.seed,
+            device=self.device,
+            trunk_cache_dir=self.trunk_cache_dir,
+        )
+
+
+@contextmanager
+def _readable_fasta_file(request: JobRequest) -> Iterator[Path]:
+    """The request's FASTA file, or its inline FASTA in a temporary file."""
+    if request.fasta_file is not None:
+        yield Path(request.fasta_file)
+        return
+    assert request.fasta is not None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fasta_file = Path(tmp_dir) / "input.fasta"
+        fasta_file.write_text(request.fasta)
+        yield fasta_file
+
+
+def _make_handler(server: InferenceServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: HTTPStatus, payload: dict[str, Any]):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._send_json(HTTPStatus.OK, server.status())
+            elif self.path.startswith("/jobs/"):
+                job = server.get_job(self.path.removeprefix("/jobs/"))
+                if job is None:
+                    self._send_json(HTTPStatus.NOT_FOUND, dict(error="unknown job"))
+                else:
+                    self._send_json(HTTPStatus.OK, job)
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, dict(error="unknown path"))
+
+        def do_POST(self):
+            if self.path not in ("/jobs", "/estimate"):
+                self._send_json(HTTPStatus.NOT_FOUND, dict(error="unknown path"))
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            if length > server.max_request_bytes:
+                self._send_json(
+                    HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                    dict(error=f"body larger than {server.max_request_bytes} bytes"),
+                )
+                return
+            try:
+                request = JobRequest(**json.loads(self.rfile.read(length)))
+                if self.path == "/estimate":
+                    estimate = server.estimate(request)
+                    self._send_json(HTTPStatus.OK, estimate.to_dict())
+                    return
+                job_id = server.submit(request)
+            except UnsupportedInputError as e:
+                self._send_json(HTTPStatus.UNPROCESSABLE_ENTITY, dict(error=str(e)))
+                return
+            except (TypeError, ValueError, AssertionError) as e:
+                self._send_json(HTTPStatus.BAD_REQUEST, dict(error=str(e)))
+                return
+            self._send_json(HTTPStatus.ACCEPTED, dict(job_id=job_id))
+
+        def log_message(self, format: str, *args):
+            logger.info(format % args)
+
+    return Handler
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    device: str = "cuda:0",
+    max_component_bytes: int | None = None,
+    preload_model_size: list[int] = [],
+    trunk_cache_dir: Path | None = None,
+    calibration: Path | None = None,
+    max_job_memory_bytes: int | None = None,
+    max_job_seconds: float | None = None,
+    entity_cache_dir: Path | None = None,
+    tokenizer_workers: int = 0,
+    max_request_bytes: int = 1 << 20,
+):
+    """Run the inference server until interrupted."""
+    logging.basicConfig(level=logging.INFO)
+    server = InferenceServer(
+        device=torch.device(device),
+        max_component_bytes=max_component_bytes,
+        trunk_cache_dir=trunk_cache_dir,
+        calibration=CalibrationTable.load(calibration) if calibration else None,
+        max_job_memory_bytes=max_job_memory_bytes,
+        max_job_seconds=max_job_seconds,
+        entity_cache_dir=entity_cache_dir,
+        tokenizer_workers=tokenizer_workers,
+        max_request_bytes=max_request_bytes,
+    )
+    server.preload(preload_model_size)
+    # tensors shared by all jobs of a model size are cheap, build them for all
+    prewarm_static_cache(server.device)
+
+    httpd = ThreadingHTTPServer((host, port), _make_handler(server))
+    logger.info(f"Serving on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    typer.run(serve)
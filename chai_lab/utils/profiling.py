@@ -0,0 +1,181 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Per-stage wall time and peak memory of an inference run.
+
+Peak memory is measured on the device the model runs on: allocated CUDA memory
+on GPUs, resident set size (RSS) of the process otherwise. RSS peaks are reset
+per stage through /proc/self/clear_refs on Linux; elsewhere the process-wide
+high-water mark (or the tracemalloc peak, if tracing) is reported. The reset is
+process-wide, so it is only done on entering a stage: reports that are created
+but not yet running leave the stages of others intact.
+
+Stages can be nested (e.g. feature generators within collation); nested stage
+names contain a "/". The peak of an enclosing stage covers its nested stages.
+Code deep in the pipeline records into the active report, if any, with
+`record_stage`.
+"""
+
+import functools
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+import torch
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    peak_memory_bytes: int | None = None
+    # stages entered more than once (e.g. per sample) are accumulated
+    calls: int = 0
+
+
+def _uses_cuda(device: torch.device) -> bool:
+    return device.type == "cuda" and torch.cuda.is_available()
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _read_peak_rss() -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+@functools.cache
+def _rss_resettable() -> bool:
+    """Probed without writing, which would reset the peak."""
+    return os.access("/proc/self/clear_refs", os.W_OK) and _read_peak_rss() is not None
+
+
+class InferenceReport:
+    def __init__(self, device: torch.device):
+        self.device = device
+        self.stages: dict[str, StageStats] = {}
+        # sizes and settings of the run, e.g. for fitting cost models
+        self.metadata: dict[str, Any] = {}
+        # running peaks of the stages currently open, innermost last
+        self._open_peaks: list[int] = []
+
+    @property
+    def memory_kind(self) -> str:
+        if _uses_cuda(self.device):
+            return "cuda_allocated"
+        if _rss_resettable():
+            return "rss"
+        if tracemalloc.is_tracing():
+            return "tracemalloc"
+        return "max_rss"
+
+    def _reset_peak_memory(self):
+        if _uses_cuda(self.device):
+            torch.cuda.reset_peak_memory_stats(self.device)
+        elif _rss_resettable():
+            _reset_peak_rss()
+        elif tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def _read_peak_memory(self) -> int:
+        if _uses_cuda(self.device):
+            return torch.cuda.max_memory_allocated(self.device)
+        if _rss_resettable() and (peak_rss := _read_peak_rss()) is not None:
+            return peak_rss
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[1]
+        # kilobytes on Linux; never reset, so a lifetime high-water mark
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self._open_peaks:
+            # resetting below would lose the enclosing stage's peak so far
+            self._open_peaks[-1] = max(self._open_peaks[-1], self._read_peak_memory())
+        self._reset_peak_memory()
+        self._open_peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if _uses_cuda(self.device):
+                # kernels run asynchronously, wait for the stage's work
+                torch.cuda.synchronize(self.device)
+            seconds = time.perf_counter() - start
+            peak = max(self._open_peaks.pop(), self._read_peak_memory())
+            if self._open_peaks:
+                self._open_peaks[-1] = max(self._open_peaks[-1], peak)
+
+            self.add_stage(name, seconds, peak)
+
+    def add_stage(
+        self, name: str, seconds: float, peak_memory_bytes: int | None = None
+    ):
+        """Record a stage timed elsewhere, e.g. concurrently on worker threads."""
+        stats = self.stages.setdefault(name, StageStats())
+        stats.seconds += seconds
+        if peak_memory_bytes is not None:
+            stats.peak_memory_bytes = max(
+                stats.peak_memory_bytes or 0, peak_memory_bytes
+            )
+        stats.calls += 1
+
+    @contextmanager
+    def activate(self) -> Iterator["InferenceReport"]:
+        """Make this the report `record_stage` records into."""
+        token = _active_report.set(self)
+        try:
+            yield self
+        finally:
+            _active_report.reset(token)
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(
+            device=str(self.device),
+            memory_kind=self.memory_kind,
+            metadata=self.metadata,
+            stages={name: asdict(stats) for name, stats in self.stages.items()},
+        )
+
+    def write_json(self, path: Path):
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+
+
+_active_report: ContextVar[InferenceReport | None] = ContextVar(
+    "_active_report", default=None
+)
+
+
+def active_report() -> InferenceReport | None:
+    return _active_report.get()
+
+
+@contextmanager
+def record_stage(name: str) -> Iterator[None]:
+    """Time a stage into the active report; does nothing without one."""
+    report = _active_report.get()
+    if report is None:
+        yield
+        return
+    with report.stage(name):
+        yield
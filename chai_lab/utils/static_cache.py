@@ -0,0 +1,66 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Process-wide cache of tensors that depend only on the static structure of a batch.
+
+Batches are padded to one of a few buckets of token and atom counts, so block
+attention indices, diagonal masks, bin centers, noise schedules and constant
+tensors copied to the device are the same for every batch of a bucket on a
+device. `static_cached` builds each once per process and argument values (which
+include the bucket sizes and the device), on first use or ahead of it, see
+`chai_lab.chai1.prewarm_static_cache`. Results are shared by all batches and
+threads and must not be modified in place.
+"""
+
+import threading
+from typing import Any, Callable, TypeVar
+
+import torch
+from torch import Tensor
+
+T = TypeVar("T")
+
+# key -> (arguments, kept alive so their ids are not reused; result)
+_entries: dict[tuple, tuple[tuple, Any]] = {}
+_lock = threading.Lock()
+
+
+def _arg_key(arg: Any) -> Any:
+    return ("tensor", id(arg)) if isinstance(arg, Tensor) else arg
+
+
+def static_cached(fn: Callable[..., T], *args) -> T:
+    """`fn(*args)`, computed once per process. Tensor arguments are keyed by identity."""
+    key = (fn, *(_arg_key(arg) for arg in args))
+    # builders are small, holding the lock keeps them from running twice
+    with _lock:
+        if key not in _entries:
+            _entries[key] = (args, fn(*args))
+        return _entries[key][1]
+
+
+def clear_static_cache() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def _copy_to(x: Tensor, device: torch.device) -> Tensor:
+    return x.to(device)
+
+
+def on_device(x: Tensor, device: torch.device) -> Tensor:
+    """A constant tensor on `device`, copied there once per process."""
+    if x.device == device:
+        return x
+    return static_cached(_copy_to, x, torch.device(device))
+
+
+def _eye(n: int, device: torch.device) -> Tensor:
+    return torch.eye(n, dtype=torch.bool, device=device)
+
+
+def diagonal_mask(n: int, device: torch.device) -> Tensor:
+    """n x n boolean identity on `device`, built once per process."""
+    return static_cached(_eye, n, torch.device(device))
@@ -4,7 +4,7 @@
 
 import typing
 from functools import lru_cache
-from typing import TypeVar
+from typing import NamedTuple, TypeVar
 
 import torch
 import torch.nn.functional as F
@@ -240,6 +240,48 @@ def unique_indexes(x: torch.Tensor, dim=-1, sorted: bool = True):
     return unique, inverse
 
 
+class PadSpec(NamedTuple):
+    """Shape a tensor is right-padded to, along every dim, and the pad value."""
+
+    shape: tuple[int, ...]
+    value: float = 0
+
+
+def max_pad_spec(specs: list[PadSpec]) -> PadSpec:
+    """Spec padding to the largest shape of `specs`, which share their pad value."""
+    assert len({spec.value for spec in specs}) == 1, specs
+    assert len({len(spec.shape) for spec in specs}) == 1, specs
+    shape = tuple(max(sizes) for sizes in zip(*(spec.shape for spec in specs)))
+    return PadSpec(shape, specs[0].value)
+
+
+def pad_to_spec(x: Tensor, spec: PadSpec) -> Tensor:
+    assert x.ndim == len(spec.shape), (x.shape, spec.shape)
+    # F.pad takes (left, right) pairs from the last dim forward
+    pads: list[int] = []
+    for size, padded_size in zip(reversed(x.shape), reversed(spec.shape)):
+        assert size <= padded_size, (x.shape, spec.shape)
+        pads += [0, padded_size - size]
+    return F.pad(x, pads, value=spec.value)
+
+
+def pad_and_stack(tensors: list[Tensor], spec: PadSpec) -> Tensor:
+    """
+    Equivalent to stacking `pad_to_spec(x, spec)` for each tensor, but allocates
+    the stacked tensor once, filled with the pad value, and copies each tensor
+    into its slice, rather than materializing each padded tensor first.
+    """
+    first = tensors[0]
+    out = torch.full(
+        (len(tensors), *spec.shape), spec.value, dtype=first.dtype, device=first.device
+    )
+    for i, x in enumerate(tensors):
+        assert x.dtype == first.dtype and x.ndim == len(spec.shape), (x, spec)
+        index: list[int | slice] = [i, *(slice(0, size) for size in x.shape)]
+        out[tuple(index)] = x
+    return out
+
+
 T = TypeVar("T")
 
 
@@ -250,6 +292,12 @@ def _move_data_to_device(x, device: torch.device):
     if isinstance(x, (str, int, float, bool)):
         return x
     if isinstance(x, torch.Tensor):
+        if 0 in x.stride() and x.numel() > 1:
+            # broadcast view (e.g. a constant feature), move only what it views
+            compact = x[
+                tuple(slice(0, 1) if s == 0 else slice(None) for s in x.stride())
+            ]
+            return compact.to(device=device).expand(x.shape)
         return x.to(device=device)
     elif isinstance(x, dict):
         return {k: move_data_to_device(v, device) for k, v in x.items()}
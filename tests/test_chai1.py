@@ -0,0 +1,333 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+"""
+Folding with stand-ins for the exported components, which are not available in
+tests; they produce outputs of the right shapes and record how they are called.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import pytest
+import torch
+from torch import Tensor
+
+import chai_lab.chai1 as chai1
+from chai_lab.chai1 import (
+    InferenceJob,
+    _make_feature_context,
+    _relative_change,
+    _run_confidence_head,
+    _unbatchable_confidence_heads,
+    run_folding_on_context,
+    run_inference_many,
+)
+from chai_lab.data.collate.utils import AVAILABLE_MODEL_SIZES, model_pad_sizes, pad_size
+from chai_lab.data.dataset.all_atom_feature_context import AllAtomFeatureContext
+from chai_lab.data.dataset.inference_dataset import Input, load_chains_from_raw
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+)
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+from chai_lab.model.diffusion_samplers import DiffusionSampler
+
+_CPU = torch.device("cpu")
+_DIM = 4
+
+
+class _FeatureEmbedding(torch.nn.Module):
+    def __init__(self, model_size: int):
+        super().__init__()
+        self.pad_sizes = model_pad_sizes(model_size)
+
+    def forward(self, **features: Tensor) -> dict[str, Tensor]:
+        n, a = self.pad_sizes.n_tokens, self.pad_sizes.n_atoms
+        return dict(
+            TOKEN=torch.zeros(1, n, _DIM),
+            TOKEN_PAIR=torch.zeros(1, n, n, 2 * _DIM),
+            ATOM=torch.zeros(1, a, 2 * _DIM),
+            ATOM_PAIR=torch.zeros(1, a // 32, 32, 128, 2 * _DIM),
+            TEMPLATES=torch.zeros(1, 1, n, n, _DIM),
+            MSA=torch.zeros(1, 1, n, _DIM),
+        )
+
+
+class _TokenInputEmbedder(torch.nn.Module):
+    def forward(
+        self, token_single_input_feats: Tensor, token_pair_input_feats: Tensor, **_
+    ) -> tuple[Tensor, ...]:
+        return (
+            token_single_input_feats,
+            token_single_input_feats,
+            token_pair_input_feats,
+        )
+
+
+class _Trunk(torch.nn.Module):
+    """Representations converging to 1: 1.1, 1.01, 1.001, ..."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def forward(
+        self, token_single_trunk_repr: Tensor, token_pair_trunk_repr: Tensor, **_
+    ) -> tuple[Tensor, Tensor]:
+        self.calls += 1
+        value = 1 + 0.1**self.calls
+        return (
+            torch.full_like(token_single_trunk_repr, value),
+            torch.full_like(token_pair_trunk_repr, value),
+        )
+
+
+class _DiffusionModule(torch.nn.Module):
+    """Numbers the samples it is called for by their x coordinate."""
+
+    def __init__(self):
+        super().__init__()
+        self.num_samples = 0
+
+    def forward(self, atom_noised_coords: Tensor, **_) -> Tensor:
+        s, a = atom_noised_coords.shape[1:3]
+        sample_ids = torch.arange(self.num_samples, self.num_samples + s)
+        self.num_samples += s
+        coords = torch.zeros(s, a, 3)
+        coords[:, :, 0] = sample_ids[:, None]
+        # atoms far enough apart not to clash
+        coords[:, :, 1] = 3.0 * torch.arange(a)
+        return coords
+
+
+class _ConfidenceHead(torch.nn.Module):
+    def __init__(self, model_size: int):
+        super().__init__()
+        self.pad_sizes = model_pad_sizes(model_size)
+        self.scored_sample_ids: list[int] = []
+
+    def forward(self, atom_coords: Tensor, **_) -> tuple[Tensor, ...]:
+        self.scored_sample_ids.extend(atom_coords[:, 0, 0].long().tolist())
+        s, n, a = atom_coords.shape[0], self.pad_sizes.n_tokens, self.pad_sizes.n_atoms
+        return torch.zeros(s, n, n, 64), torch.zeros(s, n, n, 64), torch.zeros(s, a, 50)
+
+
+@dataclass(frozen=True)
+class _DenoiseOnce(DiffusionSampler):
+    def sample(self, denoise, atom_single_mask, num_timesteps):
+        s, a = atom_single_mask.shape
+        return denoise(torch.zeros(s, a, 3), torch.tensor(1.0))
+
+
+class _Components:
+    """Component loader returning stand-ins, one per component and model size."""
+
+    def __init__(self):
+        self.modules: dict[str, torch.nn.Module] = {}
+        self.loads: Counter[str] = Counter()
+
+    def __call__(self, comp_key: str, device: torch.device) -> torch.nn.Module:
+        self.loads[comp_key] += 1
+        if comp_key not in self.modules:
+            model_size, component = comp_key.removesuffix(".pt2").split("/")
+            factories: dict[str, Callable[[], torch.nn.Module]] = dict(
+                feature_embedding=lambda: _FeatureEmbedding(int(model_size)),
+                token_input_embedder=_TokenInputEmbedder,
+                trunk=_Trunk,
+                diffusion_module=_DiffusionModule,
+                confidence_head=lambda: _ConfidenceHead(int(model_size)),
+            )
+            self.modules[comp_key] = factories[component]()
+        return self.modules[comp_key]
+
+
+@pytest.fixture(autouse=True)
+def no_cif_outputs(monkeypatch):
+    # slow and beside the point here
+    monkeypatch.setattr(
+        chai1, "outputs_to_cif", lambda write_path, **_: write_path.touch()
+    )
+
+
+@pytest.fixture(scope="module")
+def feature_context() -> AllAtomFeatureContext:
+    chains = load_chains_from_raw(
+        [Input("GAWGAKWC", entity_type=EntityType.PROTEIN.value, entity_name="A")],
+        tokenizer=AllAtomResidueTokenizer(RefConformerGenerator()),
+    )
+    return _make_feature_context(chains, use_esm_embeddings=False, device=_CPU)
+
+
+@pytest.mark.parametrize("num_samples", [7, 12])
+def test_samples_beyond_one_diffusion_round(
+    feature_context: AllAtomFeatureContext, num_samples: int, tmp_path: Path
+):
+    components = _Components()
+    candidates = run_folding_on_context(
+        feature_context,
+        output_dir=tmp_path,
+        num_trunk_recycles=2,
+        num_samples=num_samples,
+        diffusion_sampler=_DenoiseOnce(),
+        device=_CPU,
+        component_loader=components,
+    )
+
+    # the trunk runs once for all rounds, each round draws 5 samples
+    assert set(components.loads.values()) == {1}
+    trunk = components.modules["256/trunk.pt2"]
+    assert isinstance(trunk, _Trunk) and trunk.calls == 2
+    diffusion_module = components.modules["256/diffusion_module.pt2"]
+    assert isinstance(diffusion_module, _DiffusionModule)
+    assert diffusion_module.num_samples == 5 * -(-num_samples // 5)
+
+    # extra samples of the last round are dropped, the others are kept in order
+    confidence_head = components.modules["256/confidence_head.pt2"]
+    assert isinstance(confidence_head, _ConfidenceHead)
+    assert confidence_head.scored_sample_ids == list(range(num_samples))
+    assert len(candidates.cif_paths) == len(candidates.ranking_data) == num_samples
+    assert candidates.pae.shape[0] == candidates.plddt.shape[0] == num_samples
+
+
+@pytest.mark.parametrize("shape", [(1, 10, 3), (1, 10, 10, 2)])
+def test_relative_change_ignores_padding(shape: tuple[int, ...]):
+    torch.manual_seed(0)
+    new, old = torch.randn(shape), torch.randn(shape)
+    tokens = (
+        (slice(None), slice(7), slice(7))
+        if len(shape) == 4
+        else (slice(None), slice(7))
+    )
+    expected = (new[tokens] - old[tokens]).norm() / old[tokens].norm()
+
+    # chunks that do not divide the tokens, padding that would change the result
+    new[:, 7:], old[:, 7:] = 1e3, -1e3
+    if len(shape) == 4:
+        new[:, :, 7:], old[:, :, 7:] = 1e3, -1e3
+    change = _relative_change(new.bfloat16(), old.bfloat16(), n_tokens=7, chunk_size=3)
+    assert change == pytest.approx(expected.item(), rel=2e-2)
+    assert _relative_change(old, old, n_tokens=7) == 0.0
+
+
+@pytest.mark.parametrize(
+    "trunk_convergence_tol, expected_recycles",
+    [
+        (None, 4),
+        # changes between recycles: 8.2e-2, 8.9e-3, 9.0e-4
+        (1e-2, 3),
+        (1e-1, 2),
+    ],
+)
+def test_trunk_stops_once_converged(
+    feature_context: AllAtomFeatureContext,
+    trunk_convergence_tol: float | None,
+    expected_recycles: int,
+    tmp_path: Path,
+):
+    components = _Components()
+    candidates = run_folding_on_context(
+        feature_context,
+        output_dir=tmp_path,
+        num_trunk_recycles=4,
+        trunk_convergence_tol=trunk_convergence_tol,
+        diffusion_sampler=_DenoiseOnce(),
+        device=_CPU,
+        component_loader=components,
+    )
+
+    trunk = components.modules["256/trunk.pt2"]
+    assert isinstance(trunk, _Trunk) and trunk.calls == expected_recycles
+    assert candidates.num_trunk_recycles == expected_recycles
+    assert candidates.report.metadata["num_trunk_recycles"] == expected_recycles
+
+
+def test_jobs_are_grouped_by_model_size(monkeypatch, tmp_path: Path):
+    components = _Components()
+    monkeypatch.setattr(chai1, "load_exported", components)
+    folded: list[Path] = []
+    results: dict[Path, object] = {}
+
+    def fold(feature_context, *, output_dir, component_loader, device, **kwargs):
+        n_tokens = feature_context.structure_context.num_tokens
+        model_size = pad_size(n_tokens, AVAILABLE_MODEL_SIZES)
+        for _ in range(2):
+            for component in ["feature_embedding", "trunk", "diffusion_module"]:
+                component_loader(f"{model_size}/{component}.pt2", device)
+        folded.append(output_dir)
+        return results.setdefault(output_dir, object())
+
+    monkeypatch.setattr(chai1, "run_folding_on_context", fold)
+
+    jobs = []
+    # model sizes 256, 384, 256, 768
+    for i, length in enumerate([10, 300, 20, 600]):
+        fasta_file = tmp_path / f"{i}.fasta"
+        fasta_file.write_text(f">protein|name=A\n{'GAWK' * (length // 4)}\n")
+        jobs.append(InferenceJob(fasta_file=fasta_file, output_dir=tmp_path / str(i)))
+    candidates = run_inference_many(jobs, use_esm_embeddings=False, device=_CPU)
+
+    # jobs of the same size are folded together, smallest first
+    assert folded == [jobs[i].output_dir for i in [0, 2, 1, 3]]
+    # each group loads its components once, however often they are asked for
+    assert list(components.loads.items()) == [
+        (f"{model_size}/{component}.pt2", 1)
+        for model_size in [256, 384, 768]
+        for component in ["feature_embedding", "trunk", "diffusion_module"]
+    ]
+    # results are in the order of the jobs
+    assert [id(c) for c in candidates] == [id(results[job.output_dir]) for job in jobs]
+
+
+class _SingleSampleHead(torch.nn.Module):
+    """Raises `error` for batches of samples."""
+
+    def __init__(self, error: RuntimeError):
+        super().__init__()
+        self.error = error
+        self.batch_sizes: list[int] = []
+
+    def forward(self, atom_coords: Tensor, token_mask: Tensor) -> tuple[Tensor]:
+        self.batch_sizes.append(atom_coords.shape[0])
+        if atom_coords.shape[0] > 1:
+            raise self.error
+        return (atom_coords.sum(dim=(1, 2)) + token_mask.sum(),)
+
+
+@pytest.mark.parametrize(
+    "error, marked_unbatchable",
+    [
+        (
+            RuntimeError(
+                "Expected input at **kwargs['atom_coords'].shape[0] to be equal to 1, "
+                "but got 5"
+            ),
+            True,
+        ),
+        # may fit next time, e.g. with fewer atoms
+        (torch.cuda.OutOfMemoryError("CUDA out of memory"), False),
+    ],
+)
+def test_confidence_head_falls_back_to_single_samples(
+    error: RuntimeError, marked_unbatchable: bool
+):
+    head = _SingleSampleHead(error)
+    atom_coords = torch.arange(5.0)[:, None, None].expand(5, 2, 3)
+    token_mask = torch.ones(1, 4)
+    for _ in range(2):
+        (scores,) = _run_confidence_head(head, atom_coords, token_mask=token_mask)
+        assert scores.tolist() == [6 * s + 4 for s in range(5)]
+
+    assert (head in _unbatchable_confidence_heads) == marked_unbatchable
+    retried = [5, 1, 1, 1, 1, 1] if not marked_unbatchable else [1] * 5
+    assert head.batch_sizes == [5, 1, 1, 1, 1, 1] + retried
+
+
+def test_confidence_head_errors_are_not_swallowed():
+    head = _SingleSampleHead(RuntimeError("mat1 and mat2 shapes cannot be multiplied"))
+    with pytest.raises(RuntimeError, match="cannot be multiplied"):
+        _run_confidence_head(head, torch.zeros(5, 2, 3), token_mask=torch.ones(1, 4))
+    assert head not in _unbatchable_confidence_heads
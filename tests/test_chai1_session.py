@@ -0,0 +1,56 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import torch
+
+import chai_lab.chai1 as chai1
+from chai_lab.chai1 import Chai1Session, _module_nbytes
+
+_CPU = torch.device("cpu")
+
+
+class _Dummy(torch.nn.Module):
+    def __init__(self, num_floats: int):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(num_floats // 2))
+        self.register_buffer("buffer", torch.zeros(num_floats // 4))
+        # exported programs may keep constants as plain attributes
+        self.constant = torch.zeros(num_floats // 4)
+
+
+def test_module_nbytes_counts_each_tensor_once():
+    module = _Dummy(400)
+    module.alias = module.constant
+    assert _module_nbytes(module) == 400 * 4
+    assert _module_nbytes(torch.nn.Sequential(module, module)) == 400 * 4
+
+
+def test_least_recently_used_components_are_evicted(monkeypatch):
+    loaded = []
+
+    def load_exported(comp_key: str, device: torch.device) -> torch.nn.Module:
+        loaded.append(comp_key)
+        # 256/<name>.pt2 -> <name> floats
+        return _Dummy(int(comp_key.split("/")[1].removesuffix(".pt2")))
+
+    monkeypatch.setattr(chai1, "load_exported", load_exported)
+    session = Chai1Session(max_bytes=1000 * 4)
+
+    a = session.load_exported("256/400.pt2", _CPU)
+    session.load_exported("256/500.pt2", _CPU)
+    assert session.cached_bytes == 900 * 4
+    # a hit refreshes 400, so 500 is the least recently used
+    assert session.load_exported("256/400.pt2", _CPU) is a
+    session.load_exported("256/200.pt2", _CPU)
+    assert session.cached_bytes == 600 * 4
+    assert [key[1] for key in session._components] == ["400", "200"]
+
+    # over the budget on its own, but the most recent component is always kept
+    session.load_exported("256/2000.pt2", _CPU)
+    assert [key[1] for key in session._components] == ["2000"]
+    assert session.cached_bytes == 2000 * 4
+    assert loaded == ["256/400.pt2", "256/500.pt2", "256/200.pt2", "256/2000.pt2"]
+
+    session.clear()
+    assert session.cached_bytes == 0
@@ -0,0 +1,162 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import random
+
+import numpy as np
+import pytest
+import torch
+
+from chai_lab.data.features.generators.docking import DockingConstraintGenerator
+from chai_lab.data.features.generators.msa import (
+    IsPairedMSAGenerator,
+    MSADataSourceGenerator,
+    MSADeletionValueGenerator,
+    MSAHasDeletionGenerator,
+)
+from chai_lab.data.features.generators.structure_metadata import (
+    TokenBFactor,
+    TokenPLDDT,
+)
+from chai_lab.data.features.generators.token_dist_restraint import (
+    TokenDistanceRestraint,
+)
+from chai_lab.data.features.generators.token_pair_pocket_restraint import (
+    TokenPairPocketRestraint,
+)
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.utils.tensor_utils import move_data_to_device, set_seed
+
+
+def test_absent_msa_gives_broadcast_constants():
+    b, depth, n = 1, 8, 5
+    shape = (b, depth, n)
+    msa_mask = torch.zeros(shape, dtype=torch.bool)
+    deletions = torch.zeros(shape, dtype=torch.uint8)
+
+    has_deletion = MSAHasDeletionGenerator()._generate(msa_deletion_matrix=deletions)
+    deletion_value = MSADeletionValueGenerator()._generate(
+        msa_deletion_matrix=deletions
+    )
+    is_paired = IsPairedMSAGenerator()._generate(
+        msa_mask=msa_mask, msa_species=torch.zeros(shape, dtype=torch.int32)
+    )
+    source_gen = MSADataSourceGenerator()
+    source = source_gen._generate(
+        msa_mask=msa_mask, msa_sequence_source=torch.zeros(shape, dtype=torch.uint8)
+    )
+
+    for feature in (has_deletion, deletion_value, is_paired):
+        assert feature.dtype == torch.float32
+        assert torch.equal(feature, torch.zeros(b, depth, n, 1))
+    assert source.dtype == torch.uint8
+    assert torch.equal(
+        source, torch.full((b, depth, n, 1), source_gen.num_classes, dtype=torch.uint8)
+    )
+    # broadcast, not allocated
+    assert source.untyped_storage().nbytes() == 1
+
+    moved = move_data_to_device(dict(source=source), torch.device("cpu"))["source"]
+    assert torch.equal(moved, source)
+
+
+def test_excluded_metadata_is_masked():
+    gen = TokenBFactor(include_prob=0.0)
+    feature = gen._generate(
+        token_b_factor=torch.linspace(0, 200, 8).view(2, 4),
+        is_distillation=torch.zeros(2, 1, dtype=torch.bool),
+        token_exists_mask=torch.ones(2, 4, dtype=torch.bool),
+    )
+    assert feature.dtype == gen.index_dtype == torch.uint8
+    assert torch.equal(feature, torch.full((2, 4, 1), gen.num_classes))
+
+
+# small enough that nothing is ever included, but too large for the shortcuts
+_NEVER = 1e-300
+
+
+def _restraint_inputs(b: int = 2, n: int = 6) -> dict:
+    # inputs are drawn apart from the global random stream under test
+    rng = torch.Generator().manual_seed(0)
+    return dict(
+        atom_gt_coords=torch.randn(b, 2 * n, 3, generator=rng) * 10,
+        atom_exists_mask=torch.ones(b, 2 * n, dtype=torch.bool),
+        token_asym_id=torch.arange(n).div(2, rounding_mode="floor").repeat(b, 1) + 1,
+        token_ref_atom_index=torch.arange(0, 2 * n, 2).repeat(b, 1),
+        token_exists_mask=torch.ones(b, n, dtype=torch.bool),
+        token_entity_type=torch.full((b, n), EntityType.PROTEIN.value),
+    )
+
+
+def _docking_inputs() -> dict:
+    inputs = _restraint_inputs()
+    return dict(
+        all_atom_positions=inputs["atom_gt_coords"],
+        all_atom_mask=inputs["atom_exists_mask"],
+        token_single_mask=inputs["token_exists_mask"],
+        token_center_atom_index=inputs["token_ref_atom_index"],
+        token_entity_type=inputs["token_entity_type"],
+        token_asym_id=inputs["token_asym_id"],
+    )
+
+
+def _metadata_inputs() -> dict:
+    return dict(
+        is_distillation=torch.zeros(2, 1, dtype=torch.bool),
+        token_exists_mask=torch.ones(2, 4, dtype=torch.bool),
+    )
+
+
+def _seeded(generate, seed: int):
+    set_seed([seed])
+    feature = generate()
+    return feature, (torch.rand(4), np.random.rand(4), random.random())
+
+
+@pytest.mark.parametrize(
+    "make_gen, generate",
+    [
+        (
+            lambda p: TokenDistanceRestraint(include_probability=p),
+            lambda gen: gen._generate_from_batch(**_restraint_inputs()),
+        ),
+        (
+            lambda p: TokenPairPocketRestraint(include_probability=p),
+            lambda gen: gen._generate_from_batch(**_restraint_inputs()),
+        ),
+        (
+            lambda p: DockingConstraintGenerator(
+                include_probability=p,
+                structure_dropout_prob=0.5,
+                chain_dropout_prob=0.5,
+            ),
+            lambda gen: gen._generate_from_batch(**_docking_inputs()),
+        ),
+        (
+            lambda p: TokenBFactor(include_prob=p),
+            lambda gen: gen._generate(
+                token_b_factor=torch.linspace(0, 200, 8).view(2, 4),
+                **_metadata_inputs(),
+            ),
+        ),
+        (
+            lambda p: TokenPLDDT(include_prob=p),
+            lambda gen: gen._generate(
+                token_plddt=torch.linspace(0, 1, 8).view(2, 4), **_metadata_inputs()
+            ),
+        ),
+    ],
+)
+def test_excluded_features_keep_the_random_stream(make_gen, generate):
+    # the constant shortcuts make the same random draws as the full path
+    shortcut, full = make_gen(0.0), make_gen(_NEVER)
+    # first calls may lazily import modules that draw on import
+    generate(full), generate(shortcut)
+    for seed in range(8):
+        expected, expected_draws = _seeded(lambda: generate(full), seed)
+        feature, draws = _seeded(lambda: generate(shortcut), seed)
+        assert torch.equal(feature, expected)
+        assert torch.equal(draws[0], expected_draws[0])
+        assert np.array_equal(draws[1], expected_draws[1])
+        assert draws[2] == expected_draws[2]
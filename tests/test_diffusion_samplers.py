@@ -0,0 +1,54 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import pytest
+import torch
+
+from chai_lab.model.diffusion_samplers import (
+    AdaptiveSampler,
+    DiffusionSampler,
+    EDMSampler,
+    MultistepSampler,
+)
+
+
+@pytest.mark.parametrize(
+    "sampler",
+    [
+        EDMSampler(),
+        EDMSampler(second_order_min_sigma=1.0),
+        MultistepSampler(),
+        AdaptiveSampler(),
+    ],
+)
+def test_samplers_collapse_to_denoiser_prediction(sampler: DiffusionSampler):
+    # a denoiser predicting all atoms at the origin; the noise shrinks with sigma,
+    # so samples collapse to a point (up to the random translation of each step)
+    torch.manual_seed(0)
+    atom_single_mask = torch.ones(5, 12, dtype=torch.bool)
+    num_calls = 0
+
+    def denoise(atom_pos, sigma):
+        nonlocal num_calls
+        num_calls += 1
+        return torch.zeros_like(atom_pos)
+
+    sampled = sampler.sample(denoise, atom_single_mask, num_timesteps=50)
+
+    assert sampled.shape == (5, 12, 3)
+    assert torch.cdist(sampled, sampled).max() < 0.1
+    assert num_calls <= 2 * 50 - 2
+
+
+def test_multistep_uses_one_call_per_step():
+    atom_single_mask = torch.ones(5, 12, dtype=torch.bool)
+    num_calls = 0
+
+    def denoise(atom_pos, sigma):
+        nonlocal num_calls
+        num_calls += 1
+        return torch.zeros_like(atom_pos)
+
+    MultistepSampler().sample(denoise, atom_single_mask, num_timesteps=20)
+    assert num_calls == 20 - 1
@@ -0,0 +1,91 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+from dataclasses import fields
+
+import torch
+
+from chai_lab.data.dataset.inference_dataset import (
+    Input,
+    load_chains_from_raw,
+    raw_inputs_to_entitites_data,
+)
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+)
+from chai_lab.data.dataset.structure.entity_cache import EntityCache
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+
+_PROTEIN = Input("GAWGAKWC", entity_type=EntityType.PROTEIN.value, entity_name="p")
+_LIGAND = Input("CCO", entity_type=EntityType.LIGAND.value, entity_name="l")
+
+
+def test_cached_entities_are_not_tokenized_again(tmp_path, monkeypatch):
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    tokenized = []
+    tokenize_entity = tokenizer._tokenize_entity
+
+    def counting_tokenize_entity(entity_data, **kwargs):
+        tokenized.append(entity_data.entity_name)
+        return tokenize_entity(entity_data, **kwargs)
+
+    monkeypatch.setattr(tokenizer, "_tokenize_entity", counting_tokenize_entity)
+
+    load_chains_from_raw(
+        [_PROTEIN], tokenizer=tokenizer, entity_cache=EntityCache(cache_dir=tmp_path)
+    )
+    # another job, in another process: only the disk layer is shared
+    job = [_LIGAND, _PROTEIN]
+    cached = load_chains_from_raw(
+        job, tokenizer=tokenizer, entity_cache=EntityCache(cache_dir=tmp_path)
+    )
+    assert tokenized == ["p", "l"]
+
+    for chain, expected in zip(cached, load_chains_from_raw(job, tokenizer=tokenizer)):
+        for field in fields(expected.structure_context):
+            x = getattr(expected.structure_context, field.name)
+            y = getattr(chain.structure_context, field.name)
+            if isinstance(x, torch.Tensor):
+                assert x.dtype == y.dtype and torch.equal(x, y), field.name
+            else:
+                assert x == y, field.name
+
+
+def test_least_recently_used_entries_are_evicted():
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    protein, ligand = raw_inputs_to_entitites_data([_PROTEIN, _LIGAND])
+    cache = EntityCache(max_entries=1)
+    for entity_data in [protein, ligand]:
+        context = tokenizer._tokenize_entity(entity_data)
+        assert context is not None
+        cache.put(entity_data, context)
+
+    assert cache.get(protein) is None
+    assert cache.get(ligand) is not None
+
+
+def test_spellings_of_a_ligand_share_an_entry(tmp_path):
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    cache = EntityCache(cache_dir=tmp_path)
+    spellings = ["c1ccccc1O", "OC1=CC=CC=C1", "C1=CC(O)=CC=C1"]
+    for smiles in spellings:
+        [chain] = load_chains_from_raw(
+            [Input(smiles, entity_type=EntityType.LIGAND.value, entity_name="l")],
+            tokenizer=tokenizer,
+            entity_cache=cache,
+        )
+        assert chain.structure_context.num_atoms == 7
+
+    entities = raw_inputs_to_entitites_data(
+        [
+            Input(smiles, entity_type=EntityType.LIGAND.value, entity_name=str(i))
+            for i, smiles in enumerate([*spellings, "not a smiles", "not a smiles!"])
+        ]
+    )
+    keys = [cache.key(entity_data) for entity_data in entities]
+    assert len(set(keys[:3])) == 1
+    # unparsable SMILES are compared as given
+    assert len(set(keys[2:])) == 3
+    assert len(list(tmp_path.iterdir())) == 1
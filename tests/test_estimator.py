@@ -0,0 +1,76 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+from pathlib import Path
+
+import pytest
+
+from chai_lab.chai1 import UnsupportedInputError
+from chai_lab.estimator import (
+    CalibrationTable,
+    CostEstimate,
+    InputSizes,
+    raise_if_not_admissible,
+)
+
+
+def _report(model_size: int, seconds: float, peak_memory_bytes: int) -> dict:
+    return dict(
+        device="cpu",
+        memory_kind="rss",
+        metadata=dict(
+            n_tokens=model_size - 10,
+            n_atoms=4 * model_size,
+            model_size=model_size,
+            num_samples=5,
+            num_diffn_timesteps=200,
+            num_diffn_rounds=1,
+        ),
+        stages=dict(
+            trunk_recycle_0=dict(
+                seconds=seconds, peak_memory_bytes=peak_memory_bytes, calls=1
+            ),
+        ),
+    )
+
+
+def test_calibration_fits_power_law(tmp_path: Path):
+    # quadratic in the number of tokens
+    table = CalibrationTable.fit(
+        [_report(256, 1.0, 2**20), _report(512, 4.0, 2**22), dict(stages={})]
+    )
+    table.save(tmp_path / "calibration.json")
+    table = CalibrationTable.load(tmp_path / "calibration.json")
+
+    exact = table.predict_stage("trunk_recycle", size=512, work=1)
+    assert exact is not None
+    assert exact.seconds == pytest.approx(4.0)
+
+    extrapolated = table.predict_stage("trunk_recycle", size=1024, work=2)
+    assert extrapolated is not None
+    assert extrapolated.seconds == pytest.approx(32.0)
+    assert extrapolated.peak_memory_bytes == pytest.approx(2**24, rel=1e-6)
+
+    assert table.predict_stage("diffusion", size=512, work=1) is None
+
+
+def test_admission():
+    table = CalibrationTable.fit([_report(256, 1.0, 2**20)])
+    stage = table.predict_stage("trunk_recycle", size=256, work=1)
+    assert stage is not None
+    estimate = CostEstimate(
+        sizes=InputSizes(n_tokens=200, n_atoms=1000, n_chains=1),
+        stages=dict(trunk_recycle_0=stage),
+    )
+    raise_if_not_admissible(estimate, max_peak_memory_bytes=2**20, max_seconds=1.0)
+    with pytest.raises(UnsupportedInputError):
+        raise_if_not_admissible(estimate, max_peak_memory_bytes=2**19)
+    with pytest.raises(UnsupportedInputError):
+        raise_if_not_admissible(estimate, max_seconds=0.5)
+
+    too_large = CostEstimate(
+        sizes=InputSizes(n_tokens=100_000, n_atoms=1000, n_chains=1), stages={}
+    )
+    with pytest.raises(UnsupportedInputError):
+        raise_if_not_admissible(too_large)
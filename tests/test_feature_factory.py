@@ -0,0 +1,173 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+from torch import Tensor
+
+import chai_lab.chai1 as chai1
+from chai_lab.data.dataset.inference_dataset import Input, load_chains_from_raw
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+)
+from chai_lab.data.features.feature_factory import FeatureFactory
+from chai_lab.data.features.feature_type import FeatureType
+from chai_lab.data.features.generators.base import EncodingType, FeatureGenerator
+from chai_lab.data.features.memo import FeatureMemo, memoize
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+from chai_lab.utils.profiling import InferenceReport
+from chai_lab.utils.tensor_utils import set_seed
+
+
+class _Recording(FeatureGenerator):
+    """Records when it ran; returns the batch's values plus an offset."""
+
+    def __init__(self, offset: int, log: list[str], name: str):
+        super().__init__(ty=FeatureType.TOKEN, encoding_ty=EncodingType.IDENTITY)
+        self.offset = offset
+        self.log = log
+        self.name = name
+        self.lock = threading.Lock()
+
+    def get_input_kwargs_from_batch(self, batch) -> dict:
+        return dict(values=batch["inputs"]["values"])
+
+    def _generate(self, values: Tensor) -> Tensor:
+        time.sleep(0.01)
+        with self.lock:
+            self.log.append(self.name)
+        return values + self.offset
+
+
+def _factory(log: list[str], **kwargs) -> FeatureFactory:
+    return FeatureFactory(
+        {name: _Recording(i, log, name) for i, name in enumerate("abcd")}, **kwargs
+    )
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_dependencies_are_respected(max_workers: int):
+    log: list[str] = []
+    factory = _factory(
+        log, dependencies=dict(a=["c"], c=["d"]), max_workers=max_workers
+    )
+    batch = dict(inputs=dict(values=torch.arange(3)))
+    report = InferenceReport(torch.device("cpu"))
+    with report.activate():
+        features = factory.generate(batch)
+
+    assert list(features) == list("abcd")
+    for i, name in enumerate("abcd"):
+        assert torch.equal(features[name], torch.arange(3) + i)
+    assert log.index("d") < log.index("c") < log.index("a")
+    assert {f"features/{name}" for name in "abcd"} <= set(report.stages)
+
+
+def test_invalid_dependencies():
+    with pytest.raises(ValueError, match="Cyclic"):
+        _factory([], dependencies=dict(a=["b"], b=["a"]))
+    with pytest.raises(ValueError, match="Unknown"):
+        _factory([], dependencies=dict(a=["e"]))
+
+
+def test_memo_computes_once_per_arguments():
+    calls: list[Tensor] = []
+
+    def double(x: Tensor) -> Tensor:
+        calls.append(x)
+        return 2 * x
+
+    x, y = torch.arange(3), torch.arange(3)
+    memoize(double, x)
+    memoize(double, x)
+    assert len(calls) == 2  # no active memo
+
+    calls.clear()
+    with FeatureMemo().activate() as memo:
+        assert torch.equal(memoize(double, x), 2 * x)
+        assert memoize(double, x) is memoize(double, x)
+        # keyed by identity, not value
+        memoize(double, y)
+    assert calls == [x, y]
+    assert (memo.hits, memo.misses) == (2, 2)
+
+
+def test_input_keys_are_the_union_of_declared_keys():
+    log: list[str] = []
+    factory = _factory(log)
+    assert factory.input_keys is None  # _Recording does not declare its inputs
+
+    for gen in factory.generators.values():
+        gen.input_keys = ("values",)
+    factory.generators["d"].input_keys = ("values", "other")
+    assert factory.input_keys == frozenset(["values", "other"])
+
+
+class _Random(_Recording):
+    """Draws from the torch, numpy and Python random number generators."""
+
+    draws_random = True
+
+    def _generate(self, values: Tensor) -> Tensor:
+        noise = torch.rand(values.shape) + np.random.uniform() + random.random()
+        return super()._generate(values) + noise
+
+
+def _seeded_features(factory: FeatureFactory) -> dict[str, Tensor]:
+    set_seed([0])
+    features = factory.generate(dict(inputs=dict(values=torch.arange(3))))
+    # the state after generation is part of the result, e.g. for diffusion
+    features["after"] = torch.rand(1)
+    return features
+
+
+def test_random_draws_do_not_depend_on_workers():
+    def factory(max_workers: int) -> FeatureFactory:
+        log: list[str] = []
+        generators: dict[str, FeatureGenerator] = {
+            name: (_Random if name in "bdf" else _Recording)(i, log, name)
+            for i, name in enumerate("abcdef")
+        }
+        # b waits on the pool, the other generators drawing random numbers do not
+        return FeatureFactory(
+            generators, dependencies=dict(b=["a"]), max_workers=max_workers
+        )
+
+    serial = _seeded_features(factory(1))
+    for _ in range(3):
+        concurrent = _seeded_features(factory(4))
+        assert list(concurrent) == list(serial)
+        for name in serial:
+            assert torch.equal(concurrent[name], serial[name]), name
+
+
+def test_seeded_concurrent_collations_are_identical(monkeypatch):
+    chains = load_chains_from_raw(
+        [
+            Input("GAWGAKWC", entity_type=EntityType.PROTEIN.value, entity_name="p"),
+            Input("CCO", entity_type=EntityType.LIGAND.value, entity_name="l"),
+        ],
+        tokenizer=AllAtomResidueTokenizer(RefConformerGenerator()),
+    )
+    feature_context = chai1._make_feature_context(
+        chains, use_esm_embeddings=False, device=torch.device("cpu")
+    )
+
+    def collate() -> dict[str, Tensor]:
+        set_seed([0])
+        features = chai1._make_collator()([feature_context])["features"]
+        return {**features, "after": torch.rand(1)}
+
+    serial = collate()
+    monkeypatch.setattr(chai1.feature_factory, "max_workers", 4)
+    first, second = collate(), collate()
+    for name in serial:
+        assert torch.equal(first[name], second[name]), name
+        assert torch.equal(first[name], serial[name]), name
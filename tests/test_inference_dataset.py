@@ -6,9 +6,19 @@
 Tests for inference dataset.
 """
 
-from chai_lab.data.dataset.inference_dataset import Input, load_chains_from_raw
+from dataclasses import fields
+
+import torch
+
+from chai_lab.data.dataset.inference_dataset import (
+    Input,
+    load_chains_from_raw,
+    make_tokenizer_pool,
+    raw_inputs_to_entitites_data,
+)
 from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
     AllAtomResidueTokenizer,
+    TokenSpan,
 )
 from chai_lab.data.parsing.structure.entity_type import EntityType
 from chai_lab.data.sources.rdkit import RefConformerGenerator
@@ -35,3 +45,138 @@ def test_malformed_smiles():
         assert chain.structure_context.num_tokens == len(
             chain.entity_data.full_sequence
         )
+
+
+def test_standard_residue_templates_match_fresh_spans():
+    """Spans reused across standard residues equal freshly tokenized ones."""
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    inputs = [
+        Input("GAWGA", entity_type=EntityType.PROTEIN.value, entity_name="foo"),
+        Input("ACGAC", entity_type=EntityType.DNA.value, entity_name="bar"),
+    ]
+    for entity in raw_inputs_to_entitites_data(inputs, identifier="test"):
+        for residue in entity.residues:
+            reused = tokenizer.tokenize_residue(residue, entity.entity_type)
+            fresh = tokenizer._tokenize_residue(residue, entity.entity_type)
+            assert reused is not None and fresh is not None
+            for field in fields(fresh):
+                expected = getattr(fresh, field.name)
+                actual = getattr(reused, field.name)
+                if isinstance(expected, torch.Tensor):
+                    assert torch.equal(actual, expected), field.name
+                else:
+                    assert actual == expected, field.name
+
+
+def test_vectorized_chain_tokenization_matches_per_residue_spans():
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    inputs = [
+        Input("GAWGAKW", entity_type=EntityType.PROTEIN.value, entity_name="foo"),
+        Input("ACGUAC", entity_type=EntityType.RNA.value, entity_name="bar"),
+        # modified residues are tokenized per atom, not from templates
+        Input("AS(SEP)GA", entity_type=EntityType.PROTEIN.value, entity_name="baz"),
+    ]
+    standard, rna, modified = raw_inputs_to_entitites_data(inputs, identifier="test")
+    for entity in [standard, rna]:
+        vectorized = tokenizer._tokenize_standard_residues(
+            entity.residues, entity.entity_type
+        )
+        spans = [
+            tokenizer.tokenize_residue(residue, entity.entity_type)
+            for residue in entity.residues
+        ]
+        expected = TokenSpan.concatenate([s for s in spans if s is not None])
+        assert vectorized is not None
+        for field in fields(expected):
+            x, y = getattr(expected, field.name), getattr(vectorized, field.name)
+            if isinstance(x, torch.Tensor):
+                assert x.dtype == y.dtype and torch.equal(x, y), field.name
+            else:
+                assert x == y, field.name
+
+    assert (
+        tokenizer._tokenize_standard_residues(modified.residues, modified.entity_type)
+        is None
+    )
+
+
+def test_copies_of_an_entity_match_fresh_tokenization():
+    """Chains tokenized from a copy equal their own tokenization, up to augmentation."""
+    conformer_generator = RefConformerGenerator()
+    # cached conformers of modified residues are randomly augmented in each chain
+    conformer_generator.cached_conformers["SEP"] = conformer_generator.generate(
+        "C([C@@H](C(=O)O)N)OP(=O)(O)O"
+    )
+    tokenizer = AllAtomResidueTokenizer(conformer_generator)
+    inputs = [
+        Input(sequence, entity_type=entity_type.value, entity_name=name)
+        for sequence, entity_type, name in [
+            ("GAWGA", EntityType.PROTEIN, "foo"),
+            ("AS(SEP)GA", EntityType.PROTEIN, "bar"),
+            ("CC(=O)Oc1ccccc1C(=O)O", EntityType.LIGAND, "baz"),
+        ]
+        for _ in range(2)
+    ]
+    chains = load_chains_from_raw(inputs, tokenizer=tokenizer)
+    assert len(chains) == 6
+
+    for chain_id, chain in enumerate(chains, start=1):
+        copied = chain.structure_context
+        fresh = tokenizer._tokenize_entity(
+            chain.entity_data,
+            chain_id=chain_id,
+            sym_id=int(copied.token_sym_id[0]),
+        )
+        assert fresh is not None
+        for field in fields(fresh):
+            expected, actual = getattr(fresh, field.name), getattr(copied, field.name)
+            if field.name in ("atom_ref_pos", "atom_gt_coords"):
+                # residues are augmented independently, rigid within each residue
+                for uid in fresh.atom_ref_space_uid.unique():
+                    x, y = [
+                        p[fresh.atom_ref_space_uid == uid] for p in (expected, actual)
+                    ]
+                    assert torch.allclose(
+                        torch.cdist(x, x), torch.cdist(y, y), atol=1e-5
+                    )
+            elif isinstance(expected, torch.Tensor):
+                assert torch.equal(actual, expected), field.name
+            else:
+                assert actual == expected, field.name
+
+    standard, _, modified, modified_copy, _, _ = [c.structure_context for c in chains]
+    assert torch.equal(standard.atom_ref_pos, chains[1].structure_context.atom_ref_pos)
+    assert not torch.equal(modified.atom_ref_pos, modified_copy.atom_ref_pos)
+    assert torch.equal(modified_copy.atom_gt_coords, modified_copy.atom_ref_pos)
+
+
+def test_pooled_tokenization_matches_sequential():
+    """Chains are numbered in order and failed ones dropped, as without a pool."""
+    sequences = [
+        ("CCO", EntityType.LIGAND),
+        # malformed, fails to tokenize
+        ("Zn", EntityType.LIGAND),
+        ("GAWGA", EntityType.PROTEIN),
+        ("CC(=O)Oc1ccccc1C(=O)O", EntityType.LIGAND),
+        ("GAWGA", EntityType.PROTEIN),
+        ("CCO", EntityType.LIGAND),
+    ]
+    inputs = [
+        Input(sequence, entity_type=entity_type.value, entity_name=str(i))
+        for i, (sequence, entity_type) in enumerate(sequences)
+    ]
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    expected = load_chains_from_raw(inputs, tokenizer=tokenizer)
+    with make_tokenizer_pool(num_workers=2) as pool:
+        pooled = load_chains_from_raw(inputs, tokenizer=tokenizer, tokenizer_pool=pool)
+
+    assert [c.entity_data.entity_name for c in pooled] == ["0", "2", "3", "4", "5"]
+    assert len(pooled) == len(expected)
+    for chain, expected_chain in zip(pooled, expected):
+        for field in fields(expected_chain.structure_context):
+            x = getattr(expected_chain.structure_context, field.name)
+            y = getattr(chain.structure_context, field.name)
+            if isinstance(x, torch.Tensor):
+                assert x.dtype == y.dtype and torch.equal(x, y), field.name
+            else:
+                assert x == y, field.name
@@ -0,0 +1,102 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import dataclasses
+
+import pytest
+import torch
+
+from chai_lab.chai1 import _make_collator, _make_feature_context
+from chai_lab.data.dataset.inference_dataset import Input, load_chains_from_raw
+from chai_lab.data.dataset.msas.msa_context import MSAContext
+from chai_lab.data.dataset.structure.all_atom_residue_tokenizer import (
+    AllAtomResidueTokenizer,
+)
+from chai_lab.data.dataset.templates.context import TemplateContext
+from chai_lab.data.parsing.msas.data_source import MSADataSource
+from chai_lab.data.parsing.structure.entity_type import EntityType
+from chai_lab.data.sources.rdkit import RefConformerGenerator
+from chai_lab.utils.tensor_utils import PadSpec, max_pad_spec, pad_and_stack
+
+
+def _random_msa(depth: int, n_tokens: int) -> MSAContext:
+    return MSAContext(
+        dataset_source=MSADataSource.UNIREF90,
+        tokens=torch.randint(0, 20, (depth, n_tokens), dtype=torch.uint8),
+        species=torch.randint(0, 100, (depth, n_tokens), dtype=torch.int32),
+        deletion_matrix=torch.randint(0, 5, (depth, n_tokens), dtype=torch.uint8),
+        mask=torch.rand(depth, n_tokens) > 0.2,
+        sequence_source=torch.randint(0, 3, (depth, n_tokens), dtype=torch.uint8),
+        is_paired_mask=torch.rand(depth) > 0.5,
+    )
+
+
+def _random_templates(n_templates: int, n_tokens: int) -> TemplateContext:
+    return TemplateContext(
+        template_restype=torch.randint(0, 20, (n_templates, n_tokens)),
+        template_pseudo_beta_mask=torch.rand(n_templates, n_tokens) > 0.2,
+        template_backbone_frame_mask=torch.rand(n_templates, n_tokens) > 0.2,
+        template_distances=torch.rand(n_templates, n_tokens, n_tokens),
+        template_unit_vector=torch.rand(n_templates, n_tokens, n_tokens, 3),
+    )
+
+
+def test_pad_and_stack_matches_pad_then_stack():
+    torch.manual_seed(0)
+    msas = [_random_msa(5, 7), _random_msa(2, 10), _random_msa(8, 3)]
+    specs = msas[0].pad_spec(max_num_tokens=12, max_msa_depth=9)
+    padded = [msa.pad(max_num_tokens=12, max_msa_depth=9) for msa in msas]
+    for name, spec in specs.items():
+        expected = torch.stack([getattr(msa, name) for msa in padded])
+        actual = pad_and_stack([getattr(msa, name) for msa in msas], spec)
+        assert actual.dtype == expected.dtype
+        assert torch.equal(actual, expected), name
+
+    templates = [_random_templates(2, 6), _random_templates(4, 3)]
+    specs = templates[0].pad_spec(max_templates=4, max_tokens=8)
+    padded_dicts = [t.pad(max_templates=4, max_tokens=8).to_dict() for t in templates]
+    for name, spec in specs.items():
+        expected = torch.stack([d[name] for d in padded_dicts])
+        actual = pad_and_stack([t.to_dict()[name] for t in templates], spec)
+        assert torch.equal(actual, expected), name
+
+
+def test_max_pad_spec():
+    specs = [PadSpec((4, 7), 1), PadSpec((6, 3), 1)]
+    assert max_pad_spec(specs) == PadSpec((6, 7), 1)
+    with pytest.raises(AssertionError):
+        max_pad_spec([PadSpec((4, 7), 1), PadSpec((4, 7), 0)])
+
+
+def test_collate_pads_to_the_largest_spec_of_the_batch(monkeypatch):
+    # each context pads its MSA to its own depth, rather than to MAX_MSA_DEPTH
+    pad_spec = MSAContext.pad_spec
+    monkeypatch.setattr(
+        MSAContext,
+        "pad_spec",
+        lambda self, max_num_tokens=None, max_msa_depth=None: pad_spec(
+            self, max_num_tokens
+        ),
+    )
+    torch.manual_seed(0)
+    tokenizer = AllAtomResidueTokenizer(RefConformerGenerator())
+    contexts = []
+    for sequence, depth in [("GAWGAKWC", 3), ("GAWGAKWCGAWGAKWCGAWG", 6)]:
+        chains = load_chains_from_raw(
+            [Input(sequence, entity_type=EntityType.PROTEIN.value, entity_name="p")],
+            tokenizer=tokenizer,
+        )
+        context = _make_feature_context(
+            chains, use_esm_embeddings=False, device=torch.device("cpu")
+        )
+        msa = _random_msa(depth, context.structure_context.num_tokens)
+        contexts.append(dataclasses.replace(context, msa_context=msa))
+
+    inputs = _make_collator()._collate(contexts)["inputs"]
+    assert inputs["msa_tokens"].shape == (2, 6, 256)
+    monkeypatch.undo()
+    for i, context in enumerate(contexts):
+        expected = context.msa_context.pad(max_num_tokens=256, max_msa_depth=6)
+        assert torch.equal(inputs["msa_tokens"][i], expected.tokens)
+        assert torch.equal(inputs["msa_mask"][i], expected.mask)
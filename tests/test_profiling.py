@@ -0,0 +1,51 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import json
+from pathlib import Path
+
+import torch
+
+from chai_lab.utils.profiling import InferenceReport, active_report, record_stage
+
+
+def test_nested_and_repeated_stages(tmp_path: Path):
+    report = InferenceReport(torch.device("cpu"))
+    with report.activate():
+        assert active_report() is report
+        with report.stage("outer"):
+            for _ in range(3):
+                with record_stage("inner"):
+                    # touch some memory so the peak is above zero
+                    torch.ones(1024, 1024).sum()
+    assert active_report() is None
+
+    outer, inner = report.stages["outer"], report.stages["inner"]
+    assert (outer.calls, inner.calls) == (1, 3)
+    assert outer.seconds >= inner.seconds
+    assert inner.peak_memory_bytes is not None and outer.peak_memory_bytes is not None
+    assert outer.peak_memory_bytes >= inner.peak_memory_bytes > 0
+
+    report.write_json(tmp_path / "report.json")
+    loaded = json.loads((tmp_path / "report.json").read_text())
+    assert list(loaded["stages"]) == ["inner", "outer"]
+
+
+def test_record_stage_without_report():
+    with record_stage("nothing"):
+        pass
+    assert active_report() is None
+
+
+def test_new_report_keeps_peaks_of_open_stages():
+    report = InferenceReport(torch.device("cpu"))
+    nbytes = 256 * 1024 * 1024
+    with report.stage("job"):
+        start = report._read_peak_memory()
+        x = torch.ones(nbytes // 4)
+        del x
+        # e.g. the reports of later jobs, created up front
+        InferenceReport(torch.device("cpu"))
+    peak = report.stages["job"].peak_memory_bytes
+    assert peak is not None and peak >= start + nbytes // 2
@@ -0,0 +1,82 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import torch
+
+from chai_lab.ranking.frames import get_frames_and_mask
+from chai_lab.ranking.rank import get_scores, rank
+
+
+def _rank(atom_coords, inputs, lddt_logits, pae_logits):
+    num_samples = atom_coords.shape[0]
+    batched = {k: v.expand(num_samples, *v.shape[1:]) for k, v in inputs.items()}
+    _, valid_frames_mask = get_frames_and_mask(
+        atom_coords,
+        batched["token_asym_id"],
+        batched["token_residue_index"],
+        batched["token_backbone_frame_mask"],
+        batched["token_centre_atom_index"],
+        batched["token_exists_mask"],
+        batched["atom_exists_mask"],
+        batched["token_backbone_frame_index"],
+        batched["atom_token_index"],
+    )
+    return rank(
+        atom_coords,
+        atom_mask=batched["atom_exists_mask"],
+        atom_token_index=batched["atom_token_index"],
+        token_exists_mask=batched["token_exists_mask"],
+        token_asym_id=batched["token_asym_id"],
+        token_entity_type=batched["token_entity_type"],
+        token_valid_frames_mask=valid_frames_mask,
+        lddt_logits=lddt_logits,
+        lddt_bin_centers=torch.linspace(0, 1, 50),
+        pae_logits=pae_logits,
+        pae_bin_centers=torch.linspace(0, 32, 64),
+    )
+
+
+def test_batched_ranking_matches_per_sample_ranking():
+    torch.manual_seed(0)
+    # two chains of 3-atom tokens followed by a single-atom ligand and padding
+    n_tokens, n_atoms, num_samples = 10, 24, 4
+    token_asym_id = torch.tensor([[1, 1, 1, 1, 2, 2, 2, 2, 3, 0]])
+    token_exists_mask = token_asym_id > 0
+    # padding atoms point at the first token
+    atom_token_index = torch.tensor([[i // 3 for i in range(22)] + [8, 0]])
+    inputs = dict(
+        token_asym_id=token_asym_id,
+        token_residue_index=torch.tensor([[0, 1, 2, 3, 0, 1, 2, 3, 0, 0]]),
+        token_backbone_frame_mask=token_exists_mask.clone(),
+        token_centre_atom_index=torch.tensor([[1, 4, 7, 10, 13, 16, 19, 22, 22, 23]]),
+        token_exists_mask=token_exists_mask,
+        token_entity_type=torch.tensor([[0, 0, 0, 0, 0, 0, 0, 0, 3, 0]]),
+        token_backbone_frame_index=torch.stack(
+            [torch.arange(3 * i, 3 * i + 3) for i in range(n_tokens)]
+        )[None].clamp(max=n_atoms - 1),
+        atom_exists_mask=torch.tensor([[True] * 23 + [False]]),
+        atom_token_index=atom_token_index,
+    )
+    atom_coords = 3 * torch.randn(num_samples, n_atoms, 3)
+    lddt_logits = torch.randn(num_samples, n_atoms, 50)
+    pae_logits = torch.randn(num_samples, n_tokens, n_tokens, 64)
+
+    batched = _rank(atom_coords, inputs, lddt_logits, pae_logits).split_samples()
+    assert len(batched) == num_samples
+    for s, batched_ranking in enumerate(batched):
+        ranking = _rank(
+            atom_coords[s : s + 1],
+            inputs,
+            lddt_logits[s : s + 1],
+            pae_logits[s : s + 1],
+        )
+        expected, actual = get_scores(ranking), get_scores(batched_ranking)
+        for name, value in expected.items():
+            torch.testing.assert_close(
+                torch.from_numpy(actual[name]), torch.from_numpy(value)
+            )
+        torch.testing.assert_close(
+            batched_ranking.plddt_scores.per_chain_plddt,
+            ranking.plddt_scores.per_chain_plddt,
+        )
@@ -0,0 +1,67 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import pytest
+import torch
+
+from chai_lab.data.features.generators.base import FeatureGenerator
+from chai_lab.data.features.generators.relative_chain import RelativeChain
+from chai_lab.data.features.generators.relative_entity import RelativeEntity
+from chai_lab.data.features.generators.relative_position import (
+    FusedRelativePositions,
+)
+from chai_lab.data.features.generators.relative_sep import RelativeSequenceSeparation
+from chai_lab.data.features.generators.relative_token import RelativeTokenSeparation
+from chai_lab.data.features.memo import FeatureMemo
+
+
+def _random_tokens(n_chains: int = 6, n: int = 200) -> dict:
+    """Chains of residues spanning one or more tokens, some of them copies."""
+    chain_lengths = torch.multinomial(torch.ones(n), n_chains - 1).sort().values
+    asym_id = torch.zeros(n, dtype=torch.int32)
+    for start in chain_lengths.tolist():
+        asym_id[start:] += 1
+    entity_id = asym_id // 2  # pairs of chains share an entity
+    sym_id = asym_id % 2
+    # tokens of a residue share its index, residue indices are offset per chain
+    residue_index = (torch.arange(n) // torch.randint(1, 4, (n,))).to(torch.int32)
+    residue_index += 100 * asym_id
+    token_index = torch.arange(n, dtype=torch.int32)
+    # padding
+    for x in (asym_id, entity_id, sym_id, residue_index, token_index):
+        x[-10:] = 0
+    inputs = dict(
+        token_residue_index=residue_index,
+        token_index=token_index,
+        token_asym_id=asym_id,
+        token_entity_id=entity_id,
+        token_sym_id=sym_id,
+    )
+    return dict(inputs={k: v.unsqueeze(0) for k, v in inputs.items()})
+
+
+@pytest.mark.parametrize("tile_size", [7, 512])
+def test_fused_matches_separate_generators(tile_size: int):
+    torch.manual_seed(0)
+    sequence_separation = RelativeSequenceSeparation(sep_bins=None)
+    token_separation = RelativeTokenSeparation(r_max=32)
+    chain, entity = RelativeChain(), RelativeEntity()
+    fused = FusedRelativePositions(
+        sequence_separation, token_separation, chain, entity, tile_size=tile_size
+    )
+    separate: dict[str, FeatureGenerator] = dict(
+        sequence_separation=sequence_separation,
+        token_separation=token_separation,
+        chain=chain,
+        entity=entity,
+    )
+    batch = _random_tokens()
+
+    with FeatureMemo().activate() as memo:
+        for key, gen in separate.items():
+            expected = gen.generate(batch)
+            actual = getattr(fused, key).generate(batch)
+            assert actual.dtype == expected.dtype
+            assert torch.equal(actual, expected), key
+    assert memo.misses == 1
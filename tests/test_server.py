@@ -0,0 +1,175 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import json
+import threading
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+import pytest
+import torch
+
+import chai_lab.server
+from chai_lab.server import InferenceServer, JobRequest, _make_handler
+
+_FASTA = ">protein|name=A\nGAWGA\n>ligand|name=B\nCCO\n"
+
+
+@pytest.fixture(scope="module")
+def server():
+    # folding is stubbed per test, loading the conformer library is the slow part
+    server = InferenceServer(
+        device=torch.device("cpu"), max_finished_jobs=2, max_request_bytes=4096
+    )
+    yield server
+    server.shutdown()
+
+
+@contextmanager
+def _serving(server: InferenceServer) -> Iterator[str]:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(server))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _post(url: str, payload: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _stub_fold(monkeypatch, server: InferenceServer, fold):
+    def stub(request, fasta_file, output_dir):
+        fold(fasta_file)
+        return SimpleNamespace(
+            cif_paths=[output_dir / "pred.model_idx_0.cif"],
+            num_trunk_recycles=request.num_trunk_recycles,
+            ranking_data=[],
+        )
+
+    monkeypatch.setattr(server, "_fold", stub)
+
+
+def test_job_states(server: InferenceServer, monkeypatch, tmp_path: Path):
+    started, release = threading.Event(), threading.Event()
+
+    def fold(fasta_file: Path):
+        assert fasta_file.read_text() == _FASTA
+        started.set()
+        release.wait(timeout=10)
+
+    _stub_fold(monkeypatch, server, fold)
+    job_id = server.submit(JobRequest(output_dir=str(tmp_path), fasta=_FASTA))
+    assert started.wait(timeout=10)
+    job = server.get_job(job_id)
+    assert job is not None and job["state"] == "running"
+    assert "queued" in job["timings"]
+
+    release.set()
+    server._queue.join()
+    job = server.get_job(job_id)
+    assert job is not None and job["state"] == "done"
+    assert job["result"]["cif_paths"] == [str(tmp_path / "pred.model_idx_0.cif")]
+    assert job["error"] is None
+    # the snapshot is not updated by the worker
+    assert job["timings"] is not server._jobs[job_id].timings
+
+
+def test_failed_job_records_error(server: InferenceServer, monkeypatch, tmp_path: Path):
+    def fold(fasta_file: Path):
+        raise ValueError("boom")
+
+    _stub_fold(monkeypatch, server, fold)
+    job_id = server.submit(JobRequest(output_dir=str(tmp_path), fasta=_FASTA))
+    server._queue.join()
+    job = server.get_job(job_id)
+    assert job is not None
+    assert (job["state"], job["error"]) == ("failed", "ValueError('boom')")
+    assert job["result"] is None
+
+
+def test_old_finished_jobs_are_forgotten(
+    server: InferenceServer, monkeypatch, tmp_path: Path
+):
+    _stub_fold(monkeypatch, server, lambda fasta_file: None)
+    job_ids = [
+        server.submit(JobRequest(output_dir=str(tmp_path / str(i)), fasta=_FASTA))
+        for i in range(4)
+    ]
+    server._queue.join()
+    assert [server.get_job(job_id) is not None for job_id in job_ids] == [
+        False,
+        False,
+        True,
+        True,
+    ]
+
+
+def test_estimate_has_no_side_effects(server: InferenceServer, tmp_path: Path):
+    num_jobs = server.status()["num_jobs"]
+    output_dir = tmp_path / "out"
+    with _serving(server) as url:
+        status, estimate = _post(
+            f"{url}/estimate", dict(output_dir=str(output_dir), fasta=_FASTA)
+        )
+
+    assert status == 200
+    assert estimate["n_chains"] == 2
+    assert not output_dir.exists()
+    assert server.status()["num_jobs"] == num_jobs
+
+
+def test_bad_estimates_are_rejected(server: InferenceServer, tmp_path: Path):
+    output_dir = str(tmp_path / "out")
+    large_file = tmp_path / "large.fasta"
+    large_file.write_text(">protein|name=A\n" + "A" * 8192 + "\n")
+    with _serving(server) as url:
+        # too large to read
+        status, _ = _post(
+            f"{url}/estimate", dict(output_dir=output_dir, fasta=_FASTA * 200)
+        )
+        assert status == 413
+        status, body = _post(
+            f"{url}/estimate", dict(output_dir=output_dir, fasta_file=str(large_file))
+        )
+        assert status == 400 and "larger than" in body["error"]
+        # unreadable
+        status, body = _post(
+            f"{url}/estimate",
+            dict(output_dir=output_dir, fasta_file=str(tmp_path / "missing.fasta")),
+        )
+        assert status == 400 and "FileNotFoundError" in body["error"]
+        status, _ = _post(f"{url}/jobs", dict(output_dir=output_dir, fasta=">A\nGA\n"))
+        assert status == 400
+
+
+def test_estimates_run_off_the_request_thread(
+    server: InferenceServer, monkeypatch, tmp_path: Path
+):
+    threads = []
+    estimate_cost = chai_lab.server.estimate_cost
+
+    def recording_estimate_cost(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        assert server._tokenizer_lock.locked()
+        return estimate_cost(*args, **kwargs)
+
+    monkeypatch.setattr(chai_lab.server, "estimate_cost", recording_estimate_cost)
+    server.estimate(JobRequest(output_dir=str(tmp_path), fasta=_FASTA))
+    assert len(threads) == 1 and threads[0].startswith("estimate")
@@ -0,0 +1,43 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import torch
+
+from chai_lab.chai1 import _make_collator, default_diffusion_sampler
+from chai_lab.model.utils import get_qkv_indices_for_blocks
+from chai_lab.utils.static_cache import on_device, static_cached
+
+
+def test_static_cached_builds_once():
+    calls = []
+
+    def build(n: int, device: torch.device) -> torch.Tensor:
+        calls.append(n)
+        return torch.arange(n, device=device)
+
+    cpu = torch.device("cpu")
+    first = static_cached(build, 3, cpu)
+    assert static_cached(build, 3, cpu) is first
+    static_cached(build, 4, cpu)
+    assert calls == [3, 4]
+
+
+def test_tensor_arguments_are_keyed_by_identity():
+    x, y = torch.zeros(3), torch.zeros(3)
+    cpu = torch.device("cpu")
+    assert on_device(x, cpu) is x
+    assert static_cached(torch.clone, x) is static_cached(torch.clone, x)
+    assert static_cached(torch.clone, x) is not static_cached(torch.clone, y)
+
+
+def test_shared_tensors_match_uncached():
+    cpu = torch.device("cpu")
+    cached = _make_collator().block_atom_pair_indices(23 * 256, cpu)
+    for c, expected in zip(cached, get_qkv_indices_for_blocks(23 * 256, 32, 128, cpu)):
+        assert torch.equal(c, expected)
+
+    sampler = default_diffusion_sampler()
+    sigmas, gammas = sampler.get_sigmas_and_gammas(20, cpu)
+    assert sampler.get_sigmas_and_gammas(20, cpu)[0] is sigmas
+    assert torch.equal(sigmas, sampler.noise_schedule.get_schedule(cpu, 20))
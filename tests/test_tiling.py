@@ -0,0 +1,47 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+import torch
+
+from chai_lab.data.features.generators.missing_chain_contact import (
+    MissingChainContact,
+)
+from chai_lab.data.features.generators.token_pair_distance import (
+    TokenCenterDistance,
+)
+from chai_lab.data.features.tiling import row_tiles
+
+
+def _random_structure(n_tokens: int = 60, atoms_per_token: int = 3) -> dict:
+    """Three chains of atoms on a line, close enough for some contacts."""
+    n_atoms = n_tokens * atoms_per_token
+    token_asym_id = torch.arange(n_tokens, dtype=torch.int32) * 3 // n_tokens
+    inputs = dict(
+        atom_gt_coords=torch.randn(n_atoms, 3) * 10,
+        atom_exists_mask=torch.rand(n_atoms) > 0.1,
+        token_exists_mask=torch.arange(n_tokens) < n_tokens - 5,
+        token_asym_id=token_asym_id,
+        atom_token_index=torch.arange(n_atoms, dtype=torch.int32) // atoms_per_token,
+        token_centre_atom_index=torch.arange(n_tokens, dtype=torch.int32)
+        * atoms_per_token,
+    )
+    return dict(inputs={k: v.unsqueeze(0) for k, v in inputs.items()})
+
+
+def test_row_tiles_cover_rows():
+    assert list(row_tiles(5, 2)) == [slice(0, 2), slice(2, 4), slice(4, 5)]
+    assert list(row_tiles(0, 2)) == []
+
+
+def test_tiled_features_match_single_tile():
+    torch.manual_seed(0)
+    batch = _random_structure()
+    for make_gen in (
+        lambda tile_size: MissingChainContact(tile_size=tile_size),
+        lambda tile_size: TokenCenterDistance(tile_size=tile_size),
+    ):
+        expected = make_gen(tile_size=10_000).generate(batch)
+        actual = make_gen(tile_size=7).generate(batch)
+        assert actual.dtype == expected.dtype
+        assert torch.equal(actual, expected)
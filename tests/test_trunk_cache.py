@@ -0,0 +1,81 @@
+# Copyright (c) 2024 Chai Discovery, Inc.
+# This source code is licensed under the Chai Discovery Community License
+# Agreement (LICENSE.md) found in the root directory of this source tree.
+
+from dataclasses import fields
+from pathlib import Path
+
+import torch
+
+from chai_lab.model.trunk_cache import _TRUNK_INPUT_KEYS, TrunkCache, TrunkOutputs
+
+
+def _batch() -> dict:
+    torch.manual_seed(0)
+    return dict(
+        features=dict(
+            AtomRefPos=torch.rand(1, 32, 3),
+            ResidueType=torch.randint(0, 20, (1, 8, 1)),
+        ),
+        inputs={name: torch.rand(1, 8) > 0.5 for name in _TRUNK_INPUT_KEYS},
+    )
+
+
+def test_save_load_round_trip(tmp_path: Path):
+    cache = TrunkCache(tmp_path)
+    outputs = TrunkOutputs(
+        token_single_initial_repr=torch.rand(1, 8, 4),
+        token_single_structure_input=torch.rand(1, 8, 4),
+        token_pair_initial_repr=torch.rand(1, 8, 8, 2),
+        token_single_trunk_repr=torch.rand(1, 8, 4),
+        token_pair_trunk_repr=torch.rand(1, 8, 8, 2).bfloat16(),
+        token_pair_structure_input_feats=torch.rand(1, 8, 8, 2),
+        atom_single_structure_input_feats=torch.rand(1, 32, 4),
+        block_atom_pair_structure_input_feats=torch.rand(1, 1, 32, 128, 2),
+        num_trunk_recycles=2,
+    )
+    key = cache.key(
+        _batch(), model_size=256, num_trunk_recycles=3, trunk_convergence_tol=None
+    )
+    assert cache.load(key, torch.device("cpu")) is None
+    cache.save(key, outputs)
+
+    loaded = cache.load(key, torch.device("cpu"))
+    assert loaded is not None
+    for field in fields(outputs):
+        expected, actual = getattr(outputs, field.name), getattr(loaded, field.name)
+        if isinstance(expected, torch.Tensor):
+            assert actual.dtype == expected.dtype
+            assert torch.equal(actual, expected), field.name
+        else:
+            assert actual == expected, field.name
+
+
+def test_key_changes_with_settings_and_every_input(tmp_path: Path):
+    cache = TrunkCache(tmp_path)
+
+    def key(
+        batch: dict,
+        model_size: int = 256,
+        num_trunk_recycles: int = 3,
+        trunk_convergence_tol: float | None = None,
+    ) -> str:
+        return cache.key(
+            batch,
+            model_size=model_size,
+            num_trunk_recycles=num_trunk_recycles,
+            trunk_convergence_tol=trunk_convergence_tol,
+        )
+
+    base = key(_batch())
+    assert key(_batch()) == base
+    assert key(_batch(), model_size=384) != base
+    assert key(_batch(), num_trunk_recycles=4) != base
+    assert key(_batch(), trunk_convergence_tol=1e-3) != base
+
+    for group in ["features", "inputs"]:
+        for name in _batch()[group]:
+            batch = _batch()
+            x = batch[group][name].view(-1)
+            x[0] = ~x[0] if x.dtype == torch.bool else x[0] + 1
+            assert key(batch) != base, name